@@ -0,0 +1,55 @@
+"""
+Shows the I/O versus CPU trade-off of compressed CSV outputs: writes the same rows with
+CsvAppender plain and with every available compression and level, reads them back with
+read_from_csv, and estimates the read time on slower storage by adding the time to transfer the
+file at a given bandwidth to the measured (page-cached, CPU-bound) read time.
+
+Usage: python benchmarks/bench_compression.py [number of rows]
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+from toolkit.file import CsvAppender, read_from_csv
+
+HEADERS = ['domain', 'name', 'email', 'phone', 'address']
+BANDWIDTHS = (50, 200, 1000)  # MB/s: network volume, cloud disk, local SSD
+FORMATS = [('plain', '', None), ('gzip', '.gz', 1), ('gzip', '.gz', 6), ('bz2', '.bz2', 9), ('xz', '.xz', 1)]
+if importlib.util.find_spec('zstandard'):
+    FORMATS += [('zstd', '.zst', 3), ('zstd', '.zst', 10)]
+
+
+def get_rows(count):
+    return [{'domain': f'example{i % (count // 3)}.com', 'name': f'Company {i}',
+             'email': f'info@example{i}.com' if i % 3 else '', 'phone': f'+1 555 {i:07d}',
+             'address': f'{i} Main Street, Springfield'} for i in range(count)]
+
+
+def main(count=200000):
+    rows = get_rows(count)
+    header = f"{'format':<10} {'size (MiB)':>10} {'ratio':>6} {'write (s)':>10} {'read (s)':>9}"
+    print(header + ''.join(f" {f'read @{bandwidth}MB/s':>15}" for bandwidth in BANDWIDTHS))
+    plain_size = None
+    with tempfile.TemporaryDirectory() as directory:
+        for name, extension, level in FORMATS:
+            file_path = os.path.join(directory, f'contacts.csv{extension}')
+            start = time.perf_counter()
+            with CsvAppender(file_path, headers=HEADERS, mode='w', compression_level=level) as appender:
+                appender.write_rows(rows)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in read_from_csv(file_path, batches=True):
+                pass
+            read_time = time.perf_counter() - start
+            size = os.path.getsize(file_path)
+            plain_size = plain_size or size
+            label = name if level is None else f'{name}-{level}'
+            line = f"{label:<10} {size / 2 ** 20:>10.1f} {plain_size / size:>6.1f} {write_time:>10.2f}"
+            line += f" {read_time:>9.2f}"
+            print(line + ''.join(f" {read_time + size / (bandwidth * 10 ** 6):>15.2f}" for bandwidth in BANDWIDTHS))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
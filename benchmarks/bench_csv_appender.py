@@ -0,0 +1,63 @@
+"""
+Compares writing rows one by one with the previous, DataFrame-based write_to_csv, with the
+current write_to_csv wrapper and with a single long-lived CsvAppender.
+
+Usage: python benchmarks/bench_csv_appender.py [number of rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from toolkit.file import CsvAppender, write_to_csv
+
+HEADERS = ['name', 'email', 'phone', 'website', 'address']
+
+
+def dataframe_write_to_csv(file_path, input_dict, headers=None, mode='a'):
+    # write_to_csv before CsvAppender: one DataFrame and one open/close per row
+    if headers:
+        input_dict = {key: input_dict.get(key, None) for key in headers}
+    df = pd.DataFrame([input_dict])
+    df.to_csv(file_path, mode=mode, header=(mode == 'w'), index=False, columns=headers)
+
+
+def get_rows(count):
+    return [{'name': f'Company {i}', 'email': f'info{i}@example.com', 'phone': f'+1 555 {i:07d}',
+             'website': f'https://example{i}.com', 'address': f'{i} Main Street, Springfield'} for i in range(count)]
+
+
+def run(name, write_rows, rows, directory):
+    file_path = os.path.join(directory, f'{name}.csv')
+    start = time.perf_counter()
+    write_rows(file_path, rows)
+    elapsed = time.perf_counter() - start
+    written = len(pd.read_csv(file_path))
+    print(f"{name:<28} {len(rows) / elapsed:>12,.0f} rows/s ({written} rows written)")
+
+
+def main(count=20000):
+    rows = get_rows(count)
+
+    def write_one_by_one(write):
+        def write_rows(file_path, rows):
+            write(file_path, rows[0], headers=HEADERS, mode='w')
+            for row in rows[1:]:
+                write(file_path, row, headers=HEADERS)
+        return write_rows
+
+    def write_with_appender(file_path, rows):
+        with CsvAppender(file_path, headers=HEADERS, mode='w') as appender:
+            for row in rows:
+                appender.write(row)
+
+    with tempfile.TemporaryDirectory() as directory:
+        run('write_to_csv (DataFrame)', write_one_by_one(dataframe_write_to_csv), rows, directory)
+        run('write_to_csv (CsvAppender)', write_one_by_one(write_to_csv), rows, directory)
+        run('CsvAppender', write_with_appender, rows, directory)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,53 @@
+"""
+Compares merging crawl batches into an accumulated CSV by appending them and rerunning
+remove_duplicates(rewrite=True) with merging them through a CsvDedupIndex.
+
+Usage: python benchmarks/bench_dedup_index.py [number of batches] [rows per batch]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from toolkit.file import CsvAppender, CsvDedupIndex, remove_duplicates
+
+HEADERS = ['domain', 'name', 'email', 'phone']
+
+
+def get_batch(number, size):
+    # Half of every batch revisits domains of earlier batches
+    return [{'domain': f'example{(number * size + i) // 2}.com', 'name': f'Company {number}-{i}',
+             'email': f'info{i}@example.com' if (number + i) % 3 else '', 'phone': f'+1 555 {i:07d}'}
+            for i in range(size)]
+
+
+def merge_with_rewrite(file_path, batch):
+    with CsvAppender(file_path, headers=HEADERS) as appender:
+        appender.write_rows(batch)
+    remove_duplicates(file_path, unique_columns=['domain'], columns_to_prioritize=['email'], rewrite=True)
+
+
+def main(batches=20, size=20000):
+    with tempfile.TemporaryDirectory() as directory:
+        rewrite_path = os.path.join(directory, 'rewrite.csv')
+        index_path = os.path.join(directory, 'index.csv')
+        index = CsvDedupIndex(index_path, unique_columns=['domain'], columns_to_prioritize=['email'], headers=HEADERS)
+        print(f"{'batch':>5} {'rewrite (s)':>12} {'index (s)':>10}")
+        for number in range(batches):
+            batch = get_batch(number, size)
+            start = time.perf_counter()
+            merge_with_rewrite(rewrite_path, batch)
+            rewrite_time = time.perf_counter() - start
+            start = time.perf_counter()
+            index.merge_rows(batch)
+            index_time = time.perf_counter() - start
+            print(f"{number + 1:>5} {rewrite_time:>12.2f} {index_time:>10.2f}")
+        start = time.perf_counter()
+        removed = index.compact()
+        print(f"compaction: {removed} tombstoned rows removed in {time.perf_counter() - start:.2f} s, "
+              f"{index.snapshot()['rows']} rows kept")
+        index.close()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""
+Compares reading, looking up and appending to a list of seen URLs with the text list helpers
+and with LineStore and each of its membership indexes.
+
+Usage: python benchmarks/bench_line_store.py [number of lines]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from toolkit.file import LineStore, read_list_from_text_file, write_list_to_text_file
+
+
+def measure(label, function, memory=True):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    line = f"{label:<44} {elapsed:>8.3f} s"
+    if memory:
+        # Second run under tracemalloc, which slows Python code down
+        tracemalloc.start()
+        function()
+        line += f", peak allocated {tracemalloc.get_traced_memory()[1] / 2 ** 20:>7.1f} MiB"
+        tracemalloc.stop()
+    print(line)
+    return result
+
+
+def main(count=1000000):
+    urls = [f'https://example{i}.com/contact' for i in range(count)]
+    lookups = [f'https://example{i}.com/contact' for i in range(0, 2 * count, max(2 * count // 1000, 1))]
+    batch = [f'https://new{i}.com/' for i in range(1000)]
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'seen_urls.txt')
+        write_list_to_text_file(file_path, urls)
+        print(f"{count:,} lines, {os.path.getsize(file_path) / 2 ** 20:.0f} MiB, {len(lookups)} lookups, "
+              f"appending {len(batch)} lines")
+
+        measure('read_list_from_text_file', lambda: len(read_list_from_text_file(file_path)))
+        with LineStore(file_path) as store:
+            measure('LineStore iteration', lambda: sum(1 for _ in store))
+            measure('LineStore lookups, no index', lambda: sum(url in store for url in lookups))
+        store = measure('LineStore(index=set) open', lambda: LineStore(file_path, index='set'), memory=False)
+        measure('LineStore(index=set) lookups', lambda: sum(url in store for url in lookups))
+        store.close()
+        store = LineStore(file_path, index='sorted')
+        measure('LineStore(index=sorted) first build', lambda: 'x' in store, memory=False)
+        measure('LineStore(index=sorted) lookups', lambda: sum(url in store for url in lookups))
+        store.close()
+
+        measure('write_list_to_text_file append', lambda: write_list_to_text_file(file_path, batch, mode='a'),
+                memory=False)
+        with LineStore(file_path, index='sorted', dedupe=True) as store:
+            measure('LineStore(index=sorted, dedupe) extend', lambda: store.extend(batch + urls[:1000]), memory=False)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
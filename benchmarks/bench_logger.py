@@ -0,0 +1,81 @@
+"""
+Measures the cost of a logging call on the calling thread: written synchronously, queued to a
+listener thread (configure_logging(use_queue=True)), sampled to one call in 100 and at a disabled
+level. Records go to a file, or to a slow stream that blocks 100 µs per write, like a busy terminal
+or log collector pipe. Queueing pays off when writes block; with a fast file on a single CPU, the
+listener thread competes with the calling thread for the interpreter and costs about as much as it
+saves.
+
+Usage: python benchmarks/bench_logger.py [number of calls]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from toolkit.logger import LOGGING_DEFAULT, configure_logging, get_logger, stop_queue_logging
+
+
+class SlowStream:
+    def write(self, text):
+        time.sleep(0.0001)
+
+    def flush(self):
+        pass
+
+
+def get_config(file_path=None):
+    config = dict(LOGGING_DEFAULT)
+    if file_path:
+        handler = {'class': 'logging.FileHandler', 'filename': file_path}
+    else:
+        handler = {'class': 'logging.StreamHandler', 'stream': SlowStream()}
+    config['handlers'] = {'file': {'level': 'INFO', 'formatter': 'standard', **handler}}
+    config['loggers'] = {'': {'handlers': ['file'], 'level': 'INFO', 'propagate': False}}
+    return config
+
+
+def time_calls(count, log):
+    start = time.perf_counter()
+    for i in range(count):
+        log(i)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main(count=100000):
+    logger = get_logger()
+    suffixed_logger = get_logger(['job 1'])
+
+    def log(i):
+        logger.info("Handling failure for request: %s", i)
+
+    def log_suffixed(i):
+        suffixed_logger.info("Handling failure for request: %s", i, suffix=['example.com'])
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_config = get_config(os.path.join(directory, 'crawl.log'))
+        slow_config = get_config()
+        cases = [
+            ('slow stream', slow_config, False, log),
+            ('slow stream, queued', slow_config, True, log),
+            ('file', file_config, False, log),
+            ('file, queued', file_config, True, log),
+            ('file with suffix', file_config, False, log_suffixed),
+            ('file, sampled 1 in 100', file_config, False,
+             lambda i: logger.info("Handling failure for request: %s", i, every=100)),
+            ('disabled level', file_config, False, lambda i: suffixed_logger.debug("Found time zone: %s", i)),
+        ]
+        for label, config, use_queue, function in cases:
+            configure_logging(config, use_queue=use_queue, force=True)
+            # Slow stream writes take 100 µs each, fewer calls are enough
+            per_call = time_calls(count // 10 if config is slow_config else count, function)
+            start = time.perf_counter()
+            stop_queue_logging()
+            drain = time.perf_counter() - start
+            print(f"{label:<24} {per_call:6.2f} µs per call on the calling thread"
+                  + (f", then {drain:.2f} s to drain the queue" if use_queue else ''))
+    configure_logging(force=True)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""
+Compares the CSV output of CsvAppender with the Parquet dataset of ParquetAppender: file size,
+write time, and the time to reload two columns of the rows of one domain, with read_from_csv
+(which parses every column and date of every row) and with read_parquet (which reads only the
+requested columns of the matching partition). Requires pyarrow.
+
+Usage: python benchmarks/bench_parquet.py [number of rows]
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from toolkit.file import CsvAppender, ParquetAppender, read_from_csv, read_parquet
+
+SCHEMA = {'domain': 'string', 'url': 'string', 'status': 'int16', 'emails': 'string', 'title': 'string',
+          'crawled_at': 'timestamp[s]'}
+DOMAINS = 20
+
+
+def get_rows(count):
+    return [{'domain': f'example{i % DOMAINS}.com', 'url': f'https://example{i % DOMAINS}.com/page/{i}',
+             'status': 200 if i % 7 else 404, 'emails': f'info{i % 50}@example{i % DOMAINS}.com' if i % 3 else None,
+             'title': f'Page {i} of the example site', 'crawled_at': f'2024-01-{i % 28 + 1:02d}T{i % 24:02d}:00:00'}
+            for i in range(count)]
+
+
+def get_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main(count=500000):
+    if importlib.util.find_spec('pyarrow') is None:
+        sys.exit("pyarrow is not installed: pip install pyarrow")
+    rows = get_rows(count)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'items.csv')
+        parquet_path = os.path.join(directory, 'items')
+
+        start = time.perf_counter()
+        with CsvAppender(csv_path, headers=list(SCHEMA), mode='w') as appender:
+            appender.write_rows(rows)
+        csv_write = time.perf_counter() - start
+        start = time.perf_counter()
+        with ParquetAppender(parquet_path, schema=SCHEMA, partition_by=['domain'], batch_size=100000) as appender:
+            appender.write_rows(rows)
+        parquet_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df = pd.concat(read_from_csv(csv_path, chunk_size=100000, batches=True))
+        df['crawled_at'] = pd.to_datetime(df['crawled_at'])
+        csv_rows = len(df[df['domain'] == 'example1.com'][['url', 'crawled_at']])
+        csv_read = time.perf_counter() - start
+        start = time.perf_counter()
+        parquet_rows = len(read_parquet(parquet_path, columns=['url', 'crawled_at'],
+                                        filters=[('domain', '=', 'example1.com')]))
+        parquet_read = time.perf_counter() - start
+        assert csv_rows == parquet_rows
+
+        csv_size, parquet_size = get_size(csv_path), get_size(parquet_path)
+    print(f"{'format':<8} {'size (MiB)':>10} {'write (s)':>10} {'reload 2 columns of 1 domain (s)':>33}")
+    print(f"{'csv':<8} {csv_size / 2 ** 20:>10.1f} {csv_write:>10.2f} {csv_read:>33.3f}")
+    print(f"{'parquet':<8} {parquet_size / 2 ** 20:>10.1f} {parquet_write:>10.2f} {parquet_read:>33.3f}")
+    print(f"Parquet is {csv_size / parquet_size:.1f}x smaller and reloads {csv_read / parquet_read:.0f}x faster")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
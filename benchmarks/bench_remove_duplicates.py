@@ -0,0 +1,83 @@
+"""
+Compares the peak memory and the wall time of remove_duplicates with the 'sort' and 'argmax'
+engines, with categorical keys and out of core on a generated contact export with duplicated
+domains.
+
+Every run happens in a child process. In-memory runs start from the loaded DataFrame and the
+reported peak is the memory allocated by the call, measured with tracemalloc; times exclude
+loading the CSV and writing the output of in-memory runs.
+
+Usage: python benchmarks/bench_remove_duplicates.py [number of rows] [memory budget in MiB]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from toolkit.file import CsvAppender, remove_duplicates
+
+
+def write_contacts(file_path, count):
+    with CsvAppender(file_path, headers=['domain', 'name', 'email', 'phone', 'address'], mode='w') as appender:
+        for i in range(count):
+            appender.write({'domain': f'example{i % (count // 4)}.com', 'name': f'Company {i}',
+                            'email': f'info{i}@example.com' if i % 3 else '',
+                            'phone': f'+1 555 {i:07d}' if i % 2 else '', 'address': f'{i} Main Street, Springfield'})
+
+
+def run(input_path, output_path, options, connection):
+    df = None
+    if not options.get('out_of_core'):
+        # Categorical keys pay off when the key columns are loaded as categoricals
+        df = pd.read_csv(input_path, dtype={'domain': 'category'} if options.get('categorical_keys') else None)
+
+    def deduplicate():
+        return remove_duplicates(input_path, input_df=df, unique_columns=['domain'], columns_to_prioritize=['email'],
+                                 output_csv_path=output_path if df is None else None, **options)
+
+    start = time.perf_counter()
+    result = deduplicate()
+    elapsed = time.perf_counter() - start
+    if result is not None:
+        result.to_csv(output_path, index=False)
+    del result
+    # Second run under tracemalloc, which slows it down, for the memory allocated by the call
+    tracemalloc.start()
+    deduplicate()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    connection.send((elapsed, peak))
+
+
+def main(count=1000000, memory_budget=64):
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'contacts.csv')
+        write_contacts(input_path, count)
+        print(f"{count:,} rows, {os.path.getsize(input_path) / 2 ** 20:.0f} MiB CSV")
+        runs = (
+            ('sort engine', {'engine': 'sort'}),
+            ('argmax engine', {'engine': 'argmax'}),
+            ('argmax engine, categorical keys', {'engine': 'argmax', 'categorical_keys': True}),
+            (f'out of core ({memory_budget} MiB budget)',
+             {'out_of_core': True, 'memory_budget': memory_budget * 2 ** 20}),
+        )
+        outputs = []
+        for number, (label, options) in enumerate(runs):
+            output_path = os.path.join(directory, f'output_{number}.csv')
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=run, args=(input_path, output_path, options, sender))
+            process.start()
+            elapsed, peak = receiver.recv()
+            process.join()
+            print(f"{label:<34} {elapsed:>7.2f} s, peak allocated {peak:>6.0f} MiB")
+            with open(output_path, 'rb') as file:
+                outputs.append(file.read())
+        print(f"identical output: {all(output == outputs[0] for output in outputs)}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,135 @@
+"""
+Seeded generators of synthetic inputs for the benchmark suite: HTML pages of a given size, date
+strings, URL lists and CSV files of any number of rows. The same seed always gives the same
+corpus, so benchmark results of two commits are comparable.
+"""
+import csv
+import random
+
+FIRST_WORDS = ['Acme', 'Global', 'North', 'Blue', 'Prime', 'Metro', 'Bright', 'Summit', 'Pioneer', 'Green']
+SECOND_WORDS = ['Logistics', 'Dental', 'Consulting', 'Bakery', 'Motors', 'Studio', 'Labs', 'Partners']
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et '
+         'dolore magna aliqua contact us about our team services pricing support').split()
+PATHS = ['', 'contact', 'about', 'about-us', 'team', 'blog', 'products', 'services', 'careers', 'privacy']
+TIMEZONES = ['UTC', 'CET', 'PST', 'EST', 'GMT', 'IST', 'AEST', '']
+DATE_FORMATS = ['{month_name} {day}, {year} {hour}:{minute:02d} {tz}',
+                '{year}-{month:02d}-{day:02d}T{hour:02d}:{minute:02d}',
+                '{day:02d}/{month:02d}/{year} {hour:02d}:{minute:02d} {tz}',
+                'Today at {hour}:{minute:02d} {tz}', 'Yesterday at {hour}:{minute:02d}', '{day} {month_name} {year}']
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+               'November', 'December']
+CSV_HEADERS = ['domain', 'name', 'email', 'phone', 'address', 'website']
+
+
+def generate_domains(count, seed=0):
+    """
+    :param count: Number of domains
+    :param seed: Random seed
+    :return: List of distinct domains
+    """
+    rng = random.Random(seed)
+    return [f'{rng.choice(FIRST_WORDS)}-{rng.choice(SECOND_WORDS)}{i}.{rng.choice(["com", "org", "io"])}'.lower()
+            for i in range(count)]
+
+
+def generate_urls(count, domains=1000, seed=0):
+    """
+    :param count: Number of URLs
+    :param domains: Number of distinct domains
+    :param seed: Random seed
+    :return: List of URLs, with query strings and fragments on some of them
+    """
+    rng = random.Random(seed)
+    hosts = generate_domains(domains, seed)
+    urls = []
+    for i in range(count):
+        url = f'{rng.choice(["http", "https"])}://{rng.choice(["", "www."])}{rng.choice(hosts)}/{rng.choice(PATHS)}'
+        if i % 5 == 0:
+            url += f'?page={rng.randint(1, 50)}&utm_source=newsletter'
+        if i % 11 == 0:
+            url += '#top'
+        urls.append(url)
+    return urls
+
+
+def generate_date_strings(count, seed=0):
+    """
+    :param count: Number of date strings
+    :param seed: Random seed
+    :return: List of date strings in the formats found on scraped pages, half of them with a time zone
+    """
+    rng = random.Random(seed)
+    dates = []
+    for _ in range(count):
+        month = rng.randint(1, 12)
+        dates.append(rng.choice(DATE_FORMATS).format(
+            year=rng.randint(2015, 2025), month=month, month_name=MONTH_NAMES[month - 1], day=rng.randint(1, 28),
+            hour=rng.randint(1, 12), minute=rng.randint(0, 59), tz=rng.choice(TIMEZONES)).strip())
+    return dates
+
+
+def generate_html_page(size, domain='example.com', seed=0):
+    """
+    :param size: Approximate size of the page in bytes
+    :param domain: Domain of the page, used by its links and emails
+    :param seed: Random seed
+    :return: HTML page with navigation, paragraphs, internal and external links, emails, scripts and styles
+    """
+    rng = random.Random(seed)
+    parts = ['<html><head><title>Example page</title><style>body { font-family: sans-serif; }</style>'
+             '<script>var tracking = {"id": 1};</script></head><body><nav>']
+    parts.extend(f'<a href="/{path}">{path or "home"}</a>' for path in PATHS)
+    parts.append('</nav><div class="content">')
+    length = sum(map(len, parts))
+    i = 0
+    while length < size:
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))
+        if i % 4 == 0:
+            words += f' Write to {rng.choice(["info", "sales", "support", "jobs"])}{i}@{domain} for details.'
+        if i % 7 == 0:
+            words += ' &amp; more &#39;quoted&#39; <b>bold</b> text'
+        link = f'/{rng.choice(PATHS)}/{i}' if i % 3 else f'https://other{i % 50}.org/{rng.choice(PATHS)}'
+        part = f'<div class="row"><p>{words} <a href="{link}">read more</a></p></div>\n'
+        parts.append(part)
+        length += len(part)
+        i += 1
+    parts.append('</div><footer><p>Contact: info@' + domain + '</p></footer></body></html>')
+    return ''.join(parts)
+
+
+def generate_rows(count, duplicate_ratio=0.3, seed=0):
+    """
+    Yields contact rows of which about duplicate_ratio repeat the domain of an earlier row, with
+    some values missing, as scraped contact lists look.
+
+    :param count: Number of rows
+    :param duplicate_ratio: Share of rows repeating an earlier domain
+    :param seed: Random seed
+    :return: Generator of row dictionaries with CSV_HEADERS keys
+    """
+    rng = random.Random(seed)
+    unique = max(1, int(count * (1 - duplicate_ratio)))
+    for i in range(count):
+        key = i if i < unique else rng.randrange(unique)
+        yield {'domain': f'example{key}.com', 'name': f'Company {key}',
+               'email': f'info@example{key}.com' if rng.random() < 0.7 else '',
+               'phone': f'+1 555 {rng.randrange(10 ** 7):07d}' if rng.random() < 0.5 else '',
+               'address': f'{rng.randint(1, 9999)} Main Street, Springfield' if rng.random() < 0.4 else '',
+               'website': f'https://example{key}.com/'}
+
+
+def generate_csv(file_path, rows, duplicate_ratio=0.3, seed=0):
+    """
+    Writes a CSV file of generated rows, in constant memory whatever the number of rows.
+
+    :param file_path: Path to the CSV file
+    :param rows: Number of rows
+    :param duplicate_ratio: Share of rows repeating an earlier domain
+    :param seed: Random seed
+    :return: The file path
+    """
+    with open(file_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
+        writer.writeheader()
+        writer.writerows(generate_rows(rows, duplicate_ratio, seed))
+    return file_path
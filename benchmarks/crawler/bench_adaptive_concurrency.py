@@ -0,0 +1,150 @@
+"""
+Compares static per-domain concurrency with the AdaptiveConcurrencyMiddleware against a local
+server that injects latency and errors per host.
+
+Every 127.0.0.x host served by the benchmark server has its own profile: a base latency and a
+tolerance (number of parallel requests it handles before it slows down and answers 503). Each
+crawl runs for a fixed time budget and the number of successful responses per second is reported.
+
+Usage: python benchmarks/crawler/bench_adaptive_concurrency.py [seconds]
+"""
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import scrapy
+from scrapy.crawler import CrawlerProcess
+
+from toolkit.crawler.scrapy.spider import BaseSpider
+
+
+# host: (base latency in seconds, parallel requests tolerated)
+HOST_PROFILES = {
+    '127.0.0.2': (0.2, 64),
+    '127.0.0.3': (0.5, 16),
+    '127.0.0.4': (2.0, 2),
+}
+STATIC_CONCURRENCY = 8
+OUTSTANDING_PER_HOST = 64
+
+
+class BenchmarkServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class LatencyHandler(BaseHTTPRequestHandler):
+    in_flight = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        host = self.headers.get('Host', '').split(':')[0]
+        latency, tolerance = HOST_PROFILES.get(host, (0.01, 8))
+        with self.lock:
+            in_flight = self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        try:
+            overload = max(0, in_flight - tolerance)
+            time.sleep(latency * (1 + overload / tolerance))
+            status = 503 if overload and random.random() < 0.5 else 200
+            body = b'<html><body>ok</body></html>'
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.lock:
+                self.in_flight[host] -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class BenchmarkSpider(BaseSpider):
+    """
+    Keeps a fixed number of requests outstanding per host: every response, good or bad, is
+    followed by the next request to the same host.
+    """
+    name = 'adaptive_concurrency_benchmark'
+
+    async def start(self):
+        for host in HOST_PROFILES:
+            for _ in range(OUTSTANDING_PER_HOST):
+                yield self.get_request(host)
+
+    def get_request(self, host):
+        return scrapy.Request(f'http://{host}:{self.port}/', errback=self.handle_failure, dont_filter=True)
+
+    def parse(self, response):
+        host = urlparse(response.url).hostname
+        if not self.is_bad_status(response):
+            self.crawler.stats.inc_value(f'benchmark/ok/{host}')
+        yield self.get_request(host)
+
+
+def run_crawl(adaptive, seconds, port, connection):
+    logging.getLogger().setLevel(logging.ERROR)
+    settings = {
+        'LOG_LEVEL': 'ERROR',
+        'RETRY_ENABLED': False,
+        'FAILURE_RETRY_TIMES': 0,
+        'TELNETCONSOLE_ENABLED': False,
+        # Under the asyncio reactor a download slot was seen starting more transfers than its
+        # concurrency allows, which would make the settings compared here meaningless
+        'TWISTED_REACTOR': 'twisted.internet.epollreactor.EPollReactor',
+        # Room for every outstanding request, so that a slow host never holds back the others
+        'CONCURRENT_REQUESTS': OUTSTANDING_PER_HOST * len(HOST_PROFILES),
+        'CONCURRENT_REQUESTS_PER_DOMAIN': STATIC_CONCURRENCY,
+    }
+    if adaptive:
+        settings['DOWNLOADER_MIDDLEWARES'] = {
+            'toolkit.crawler.scrapy.middlewares.adaptive_concurrency_middleware.AdaptiveConcurrencyMiddleware': 560,
+        }
+        settings['ADAPTIVE_CONCURRENCY_MAX'] = OUTSTANDING_PER_HOST
+        settings['ADAPTIVE_CONCURRENCY_TARGET_LATENCY'] = 10.0
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(BenchmarkSpider)
+    process.crawl(crawler, port=port)
+
+    def report():
+        stats = crawler.stats.get_stats()
+        throughput = {host: stats.get(f'benchmark/ok/{host}', 0) / seconds for host in HOST_PROFILES}
+        connection.send((throughput, crawler.spider.get_concurrency_stats()))
+        # Exit without draining the requests still queued for the slow hosts
+        os._exit(0)
+
+    from twisted.internet import reactor
+    reactor.callLater(seconds, report)
+    process.start()
+
+
+def main(seconds=30):
+    server = BenchmarkServer(('0.0.0.0', 0), LatencyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {}
+    for adaptive in (False, True):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=run_crawl, args=(adaptive, seconds, server.server_port, sender))
+        process.start()
+        results[adaptive] = receiver.recv()
+        process.join()
+    server.shutdown()
+
+    for adaptive, label in ((False, f'static (CONCURRENT_REQUESTS_PER_DOMAIN={STATIC_CONCURRENCY})'),
+                            (True, 'adaptive (AdaptiveConcurrencyMiddleware)')):
+        throughput, controller = results[adaptive]
+        print(f"{label}: {sum(throughput.values()):.1f} ok responses/s")
+        for host, host_throughput in throughput.items():
+            tuned = f" (concurrency={controller[host]['concurrency']}, delay={controller[host]['delay']:.2f}s)" \
+                if host in controller else ""
+            print(f"  {host}: {host_throughput:.1f} ok responses/s{tuned}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,81 @@
+"""
+Compares the memory use and speed of Scrapy's set-based RFPDupeFilter with the BloomDupeFilter.
+
+Each dupefilter is fed the fingerprints of N distinct URLs followed by the same N URLs again.
+The memory allocated while inserting (traced with tracemalloc) is reported per million URLs,
+together with the number of lookups per second and the share of new URLs wrongly reported as
+duplicates.
+
+Usage: python benchmarks/crawler/bench_dupefilter.py [number of URLs]
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+
+from toolkit.crawler.scrapy.dupefilter import BloomDupeFilter
+
+
+def get_fingerprints(count):
+    fingerprinter = get_crawler().request_fingerprinter
+    return [fingerprinter.fingerprint(Request(f"https://example{i % 1000}.com/item/{i}?page={i % 7}"))
+            for i in range(count)]
+
+
+def run(name, factory, fingerprints):
+    tracemalloc.start()
+    dupefilter = factory()
+    for fingerprint in fingerprints:
+        dupefilter(fingerprint)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    dupefilter = factory()
+    start = time.perf_counter()
+    wrong = sum(dupefilter(fingerprint) for fingerprint in fingerprints)
+    insert_time = time.perf_counter() - start
+    start = time.perf_counter()
+    missed = sum(not dupefilter(fingerprint) for fingerprint in fingerprints)
+    lookup_time = time.perf_counter() - start
+
+    count = len(fingerprints)
+    print(f"{name:<22} {memory / count * 1e6 / 2 ** 20:>8.1f} MiB/M URLs "
+          f"{count / insert_time:>10,.0f} inserts/s {count / lookup_time:>10,.0f} lookups/s "
+          f"false positives {wrong / count:.4%} missed {missed}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    fingerprints = get_fingerprints(count)
+
+    def set_dupefilter():
+        seen = RFPDupeFilter()._fingerprints
+
+        def request_seen(fingerprint):
+            # RFPDupeFilter keeps hex fingerprints
+            fingerprint = fingerprint.hex()
+            if fingerprint in seen:
+                return True
+            seen.add(fingerprint)
+            return False
+        return request_seen
+
+    run('set (RFPDupeFilter)', set_dupefilter, fingerprints)
+    run('bloom', lambda: BloomDupeFilter(capacity=count).fingerprint_seen, fingerprints)
+    with tempfile.TemporaryDirectory() as path:
+        dupefilters = []
+
+        def exact_dupefilter():
+            dupefilters.append(BloomDupeFilter(f"{path}/{len(dupefilters)}", capacity=count, exact=True))
+            return dupefilters[-1].fingerprint_seen
+        run('bloom + exact store', exact_dupefilter, fingerprints)
+        for dupefilter in dupefilters:
+            dupefilter.close('finished')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Compares the number of pages downloaded before the first contact page is found, with Scrapy's
+default scheduling and with the FocusedCrawlMiddleware, on synthetic company sites.
+
+Every site served by the local benchmark server has a home page, a paginated blog with tags,
+a product catalog, a services page and an about page. The contact page is only linked from
+the about page or the services page, and the links of every page are shuffled. Each crawl
+stops at the first contact page.
+
+Usage: python benchmarks/crawler/bench_focused_crawl.py [number of sites]
+"""
+import logging
+import random
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import mean
+
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import CloseSpider
+
+from toolkit.crawler.scrapy.spider import BaseSpider
+from toolkit.url import is_contact_page
+
+
+POSTS = 200
+BLOG_PAGES = 20
+PRODUCTS = 50
+TAGS = 15
+MAX_PAGES = 2000
+
+
+def get_links(site, path):
+    """
+    Returns the links of a page of a synthetic site, or None if the page does not exist.
+    """
+    rng = random.Random(f"{site}{path}")
+    posts = [f"blog/post-{i}" for i in rng.sample(range(POSTS), 8)]
+    tags = [f"tag/tag-{i}" for i in rng.sample(range(TAGS), 3)]
+    contact_on_about = site % 2 == 0
+    if path == '':
+        links = ['blog/', 'products/', 'services', 'about-us'] + posts + tags
+    elif path == 'about-us':
+        links = ['', 'blog/'] + posts[:3] + (['contact'] if contact_on_about else [])
+    elif path == 'services':
+        links = ['', 'products/'] + posts[:3] + ([] if contact_on_about else ['contact'])
+    elif path == 'contact':
+        links = ['']
+    elif path == 'blog/' or path.startswith('blog/page/'):
+        page = int(path.rsplit('/', 1)[-1]) if path.startswith('blog/page/') else 1
+        links = posts + tags + ([f"blog/page/{page + 1}"] if page < BLOG_PAGES else [])
+    elif path.startswith('blog/post-') or path.startswith('tag/'):
+        links = [''] + posts + tags
+    elif path == 'products/':
+        links = [''] + [f"products/item-{i}" for i in rng.sample(range(PRODUCTS), 10)]
+    elif path.startswith('products/item-'):
+        links = ['products/'] + [f"products/item-{i}" for i in rng.sample(range(PRODUCTS), 5)]
+    else:
+        return None
+    rng.shuffle(links)
+    return [f"/site-{site}/{link}" for link in links]
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        _, site, path = self.path.split('/', 2)
+        links = get_links(int(site.split('-')[1]), path)
+        if links is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = '<html><body>' + ''.join(f'<a href="{link}">{link}</a>' for link in links) + '</body></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ContactSpider(BaseSpider):
+    name = 'contact'
+    results = {}
+
+    def __init__(self, port, site, mode, **kwargs):
+        super().__init__(**kwargs)
+        self.port, self.site, self.mode = port, site, mode
+        self.pages = 0
+
+    async def start(self):
+        yield scrapy.Request(f"http://127.0.0.1:{self.port}/site-{self.site}/")
+
+    def parse(self, response):
+        self.pages += 1
+        if is_contact_page(response.url):
+            self.results[(self.mode, self.site)] = self.pages
+            raise CloseSpider('contact_found')
+        for link in response.css('a::attr(href)').getall():
+            yield response.follow(link)
+
+    def closed(self, reason):
+        self.results.setdefault((self.mode, self.site), None)
+
+
+def main():
+    sites = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SiteHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    logging.getLogger('scrapy').setLevel(logging.WARNING)
+    process = CrawlerProcess({'LOG_LEVEL': 'WARNING', 'CONCURRENT_REQUESTS': 1, 'CLOSESPIDER_PAGECOUNT': MAX_PAGES,
+                              'TELNETCONSOLE_ENABLED': False, 'STATS_DUMP': False}, install_root_handler=False)
+    modes = {
+        'default': {},
+        'focused': {'SPIDER_MIDDLEWARES': {
+            'toolkit.crawler.scrapy.middlewares.focused_crawl_middleware.FocusedCrawlMiddleware': 950,
+        }},
+    }
+    for mode, settings in modes.items():
+        spider_cls = type(f"{mode.title()}ContactSpider", (ContactSpider,), {'custom_settings': settings})
+        for site in range(sites):
+            process.crawl(spider_cls, port=port, site=site, mode=mode)
+    process.start()
+
+    print(f"{'mode':<10} {'found':>6} {'mean pages':>11} {'max pages':>10}")
+    for mode in modes:
+        pages = [ContactSpider.results.get((mode, site)) for site in range(sites)]
+        found = [count for count in pages if count is not None]
+        print(f"{mode:<10} {len(found):>3}/{sites:<2} {mean(found) if found else 0:>11.1f} "
+              f"{max(found) if found else 0:>10}")
+
+
+if __name__ == '__main__':
+    main()
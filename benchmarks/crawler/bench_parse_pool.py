@@ -0,0 +1,143 @@
+"""
+Compares parsing CPU-heavy pages in the spider callback with offloading them to the ParsePool.
+
+A local server serves big pages from 127.0.0.2, parsed with ``extract_emails`` (BeautifulSoup
+text cleaning and email extraction), and small pages with a fixed latency from 127.0.0.3, which
+need no parsing. With inline parsing, every heavy page blocks the reactor thread and stalls the
+light downloads; with the pool, the light downloads keep flowing. Each crawl runs for a fixed
+time budget and reports the pages per second of both kinds and the longest pause of the reactor.
+
+Usage: python benchmarks/crawler/bench_parse_pool.py [seconds] [workers]
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.defer import maybe_deferred_to_future
+
+from toolkit.crawler.scrapy.parse_pool import extract_emails
+from toolkit.crawler.scrapy.spider import BaseSpider
+
+
+HEAVY_HOST = '127.0.0.2'
+LIGHT_HOST = '127.0.0.3'
+LIGHT_LATENCY = 0.02
+OUTSTANDING = {HEAVY_HOST: 4, LIGHT_HOST: 16}
+HEAVY_BODY = ('<html><body>' + ''.join(
+    f'<div class="row"><p>Item {i} &amp; more <b>text</b> <a href="/p/{i}">link</a> contact{i}@example.com</p></div>'
+    for i in range(3000)) + '</body></html>').encode()
+
+
+class BenchmarkServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        host = self.headers.get('Host', '').split(':')[0]
+        if host == HEAVY_HOST:
+            body = HEAVY_BODY
+        else:
+            time.sleep(LIGHT_LATENCY)
+            body = b'<html><body>ok</body></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class BenchmarkSpider(BaseSpider):
+    """
+    Keeps a fixed number of requests outstanding per host.
+    """
+    name = 'parse_pool_benchmark'
+
+    async def start(self):
+        for host, outstanding in OUTSTANDING.items():
+            for _ in range(outstanding):
+                yield self.get_request(host)
+
+    def get_request(self, host):
+        return scrapy.Request(f'http://{host}:{self.port}/', dont_filter=True)
+
+    async def parse(self, response):
+        host = response.url.split('/')[2].split(':')[0]
+        if host == HEAVY_HOST:
+            if self.offload:
+                items = await maybe_deferred_to_future(self.parse_in_pool(extract_emails, response))
+            else:
+                items = extract_emails(response.body, response.url, response.encoding)
+            self.crawler.stats.inc_value('benchmark/emails', len(items[0]['emails']))
+        self.crawler.stats.inc_value(f'benchmark/pages/{host}')
+        yield self.get_request(host)
+
+
+def run_crawl(offload, workers, seconds, port, connection):
+    logging.getLogger().setLevel(logging.ERROR)
+    process = CrawlerProcess({
+        'LOG_LEVEL': 'ERROR',
+        'TELNETCONSOLE_ENABLED': False,
+        'CONCURRENT_REQUESTS': sum(OUTSTANDING.values()),
+        'CONCURRENT_REQUESTS_PER_DOMAIN': max(OUTSTANDING.values()),
+        'PARSE_POOL_WORKERS': workers,
+    })
+    crawler = process.create_crawler(BenchmarkSpider)
+    process.crawl(crawler, port=port, offload=offload)
+
+    from twisted.internet import reactor
+    from twisted.internet.task import LoopingCall
+
+    # Measures how long the reactor thread goes without running its timers
+    ticks = {'last': time.monotonic(), 'max_gap': 0.0}
+
+    def tick():
+        now = time.monotonic()
+        ticks['max_gap'] = max(ticks['max_gap'], now - ticks['last'])
+        ticks['last'] = now
+
+    def report():
+        stats = crawler.stats.get_stats()
+        pages = {host: stats.get(f'benchmark/pages/{host}', 0) / seconds for host in OUTSTANDING}
+        connection.send((pages, ticks['max_gap']))
+        if crawler.spider.parse_pool:
+            crawler.spider.parse_pool.close()
+        os._exit(0)
+
+    reactor.callWhenRunning(lambda: LoopingCall(tick).start(0.01))
+    reactor.callLater(seconds, report)
+    process.start()
+
+
+def main(seconds=20, workers=None):
+    workers = workers or os.cpu_count()
+    server = BenchmarkServer(('0.0.0.0', 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {}
+    for offload in (False, True):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=run_crawl, args=(offload, workers, seconds, server.server_port, sender))
+        process.start()
+        results[offload] = receiver.recv()
+        process.join()
+    server.shutdown()
+
+    for offload, label in ((False, 'inline parsing'), (True, f'ParsePool ({workers} workers)')):
+        pages, max_gap = results[offload]
+        print(f"{label}: light {pages[LIGHT_HOST]:.1f} pages/s, heavy {pages[HEAVY_HOST]:.1f} pages/s, "
+              f"longest reactor pause {max_gap * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,255 @@
+"""
+Benchmark suite of the toolkit's hot paths, on seeded synthetic inputs (see corpus.py), with
+JSON results and a comparison that flags regressions.
+
+Every benchmark prepares its input once, runs once to warm up, then is timed ``repeat`` times;
+the median time is compared. A timed sample loops over the benchmark until it lasted at least
+``--min-time`` seconds, so that fast benchmarks (e.g. at a small scale) are not compared on timer
+noise. ``--scale`` multiplies every input size: 0.1 for a quick check, 10 for multi-million-row CSVs.
+
+Usage, from the repository root (the toolkit package must be importable):
+    PYTHONPATH=. python benchmarks/suite.py run [--output results.json] [--scale 1] [--repeat 5]
+                                               [--min-time 0.2] [--filter name ...]
+    PYTHONPATH=. python benchmarks/suite.py compare baseline.json results.json [--threshold 0.1]
+
+compare exits with status 1 when a benchmark got slower than the baseline by more than the
+threshold (10% by default), or when a benchmark of the baseline is missing from the results,
+so it can gate a CI job.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from corpus import CSV_HEADERS, generate_csv, generate_date_strings, generate_html_page, generate_rows
+from toolkit.date import format_date, remove_timezone
+from toolkit.file import read_from_csv, remove_duplicates, write_to_csv
+from toolkit.parsers.text import parse_emails
+from toolkit.parsers.web.attr import parse_attr
+from toolkit.parsers.web.text import parse_text, remove_html_from_text, text_to_html_response
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark: a function taking the scale and a temporary directory, preparing its
+    input and returning the function to time and the number of items it processes.
+    """
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def scaled(size, scale):
+    return max(1, int(size * scale))
+
+
+@benchmark('parse_emails')
+def bench_parse_emails(scale, directory):
+    text = remove_html_from_text(generate_html_page(scaled(500000, scale)))
+    return lambda: parse_emails(text), 1
+
+
+@benchmark('remove_timezone')
+def bench_remove_timezone(scale, directory):
+    dates = generate_date_strings(scaled(20000, scale))
+    return lambda: [remove_timezone(date) for date in dates], len(dates)
+
+
+@benchmark('format_date')
+def bench_format_date(scale, directory):
+    dates = generate_date_strings(scaled(5000, scale))
+    return lambda: [format_date(date) for date in dates], len(dates)
+
+
+@benchmark('parse_text')
+def bench_parse_text(scale, directory):
+    response = text_to_html_response(generate_html_page(scaled(500000, scale)))
+
+    def run():
+        parse_text(response, ['//div[@class="content"]//p'], extract_all=True, join_with=' ')
+        parse_text(response, extract_all=True, filtered_tags=('script', 'style'))
+    return run, 1
+
+
+@benchmark('parse_attr')
+def bench_parse_attr(scale, directory):
+    response = text_to_html_response(generate_html_page(scaled(500000, scale)), url='https://example.com/')
+
+    def run():
+        parse_attr(response, extract_all=False)
+        parse_attr(response, ['//div[@class="content"]//a'], same_domain=True)
+    return run, 1
+
+
+@benchmark('remove_html_from_text')
+def bench_remove_html_from_text(scale, directory):
+    page = generate_html_page(scaled(500000, scale))
+    return lambda: remove_html_from_text(page), 1
+
+
+@benchmark('remove_html_from_text[bs]')
+def bench_remove_html_from_text_with_bs(scale, directory):
+    page = generate_html_page(scaled(500000, scale))
+    return lambda: remove_html_from_text(page, parse_with_bs=True), 1
+
+
+@benchmark('remove_duplicates')
+def bench_remove_duplicates(scale, directory):
+    rows = scaled(1000000, scale)
+    input_path = generate_csv(os.path.join(directory, 'contacts.csv'), rows)
+    output_path = os.path.join(directory, 'contacts_unique.csv')
+    return lambda: remove_duplicates(input_path, unique_columns=['domain'], columns_to_prioritize=['email', 'phone'],
+                                     output_csv_path=output_path), rows
+
+
+@benchmark('write_to_csv')
+def bench_write_to_csv(scale, directory):
+    rows = list(generate_rows(scaled(20000, scale)))
+    file_path = os.path.join(directory, 'written.csv')
+
+    def run():
+        write_to_csv(file_path, rows[0], headers=CSV_HEADERS, mode='w')
+        for row in rows[1:]:
+            write_to_csv(file_path, row, headers=CSV_HEADERS)
+    return run, len(rows)
+
+
+@benchmark('read_from_csv')
+def bench_read_from_csv(scale, directory):
+    rows = scaled(1000000, scale)
+    file_path = generate_csv(os.path.join(directory, 'contacts.csv'), rows)
+    return lambda: sum(1 for _ in read_from_csv(file_path, chunk_size=100000)), rows
+
+
+def get_environment():
+    """
+    :return: The versions and machine the results were measured with
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    versions = {}
+    for package in ('pandas', 'numpy', 'scrapy', 'lxml', 'bs4', 'w3lib'):
+        try:
+            versions[package] = __import__(package).__version__
+        except (ImportError, AttributeError):
+            versions[package] = None
+    return {'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'packages': versions}
+
+
+def run_benchmarks(names=None, scale=1.0, repeat=5, min_time=0.2):
+    """
+    Runs benchmarks and prints their timings.
+
+    :param names: Names of the benchmarks to run, all of them by default
+    :param scale: Multiplier of every input size
+    :param repeat: Number of timed runs per benchmark
+    :param min_time: Minimum duration in seconds of a timed run, reached by looping over fast benchmarks
+    :return: Dictionary of the environment, parameters and results per benchmark, times being per loop
+    """
+    results = {}
+    for name, prepare in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        directory = tempfile.mkdtemp(prefix='toolkit-bench-')
+        try:
+            function, items = prepare(scale, directory)
+            start = time.perf_counter()
+            function()
+            loops = max(1, math.ceil(min_time / max(time.perf_counter() - start, 1e-9)))
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for _ in range(loops):
+                    function()
+                times.append((time.perf_counter() - start) / loops)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        median = statistics.median(times)
+        results[name] = {'median': median, 'min': min(times), 'max': max(times), 'times': times, 'loops': loops,
+                         'items': items, 'items_per_second': items / median if median else None}
+        print(f"{name:<28} median {median * 1000:10.3f} ms  min {min(times) * 1000:10.3f} ms  "
+              f"({items / max(median, 1e-9):,.0f} items/s)")
+    return {'environment': get_environment(), 'scale': scale, 'repeat': repeat, 'min_time': min_time,
+            'results': results}
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compares the median times of two result files.
+
+    :param baseline: Results of the reference run
+    :param current: Results of the run to check
+    :param threshold: Relative slowdown above which a benchmark is a regression
+    :return: List of (name, baseline median, current median, relative change, is regression) tuples,
+             and the names of the baseline benchmarks missing from the current results
+    """
+    if baseline.get('scale') != current.get('scale'):
+        print(f"Warning: comparing results of different scales ({baseline.get('scale')} and {current.get('scale')})")
+    rows = []
+    for name, result in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        change = result['median'] / reference['median'] - 1
+        rows.append((name, reference['median'], result['median'], change, change > threshold))
+    missing = [name for name in baseline['results'] if name not in current['results']]
+    return rows, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite of the toolkit's hot paths")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--output', help='JSON file to save the results to')
+    run_parser.add_argument('--scale', type=float, default=1.0, help='multiplier of every input size')
+    run_parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    run_parser.add_argument('--min-time', type=float, default=0.2,
+                            help='minimum seconds per timed run, looping over fast benchmarks')
+    run_parser.add_argument('--filter', nargs='*', choices=list(BENCHMARKS), help='benchmarks to run')
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown flagged (0.1 = 10%%)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run_benchmarks(args.filter, args.scale, args.repeat, args.min_time)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(results, file, indent=2)
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    rows, missing = compare_results(baseline, current, args.threshold)
+    for name, before, after, change, is_regression in rows:
+        flag = '  REGRESSION' if is_regression else ''
+        print(f"{name:<28} {before * 1000:10.3f} ms -> {after * 1000:10.3f} ms  {change:+7.1%}{flag}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+    if missing:
+        print(f"{len(missing)} benchmark(s) of the baseline missing from the results: {', '.join(missing)}")
+    return 1 if regressions or missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+from toolkit.crawler.scrapy.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_opens_after_threshold_consecutive_failures():
+    breaker = CircuitBreaker(threshold=3, cooldown=10, clock=FakeClock())
+    for _ in range(2):
+        assert breaker.record_failure("example.com") is False
+    assert breaker.allow_request("example.com")
+    assert breaker.record_failure("example.com") is True
+    assert breaker.get_state("example.com") == CircuitBreaker.OPEN
+    assert not breaker.allow_request("example.com")
+    assert breaker.snapshot("example.com")["short_circuited"] == 1
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker(threshold=2, cooldown=10, clock=FakeClock())
+    breaker.record_failure("example.com")
+    breaker.record_success("example.com")
+    breaker.record_failure("example.com")
+    assert breaker.get_state("example.com") == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_a_single_probe_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=1, cooldown=10, clock=clock)
+    breaker.record_failure("example.com")
+    clock.now = 10
+    assert breaker.get_state("example.com") == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request("example.com")
+    assert not breaker.allow_request("example.com")
+
+    # A failed probe re-opens the circuit for another cool-down
+    breaker.record_failure("example.com")
+    assert breaker.get_state("example.com") == CircuitBreaker.OPEN
+    assert breaker.snapshot("example.com")["trips"] == 2
+
+    clock.now = 20
+    assert breaker.allow_request("example.com")
+    breaker.record_success("example.com")
+    assert breaker.get_state("example.com") == CircuitBreaker.CLOSED
+
+
+def test_hosts_are_tracked_independently():
+    breaker = CircuitBreaker(threshold=1, cooldown=10, clock=FakeClock())
+    breaker.record_failure("down.com")
+    assert not breaker.allow_request("down.com")
+    assert breaker.allow_request("up.com")
+    assert set(breaker.snapshot()) == {"down.com", "up.com"}
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+from scrapy.core.downloader import Slot
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+from twisted.internet.error import DNSLookupError, TimeoutError
+
+from toolkit.crawler.scrapy.concurrency import AimdController
+from toolkit.crawler.scrapy.middlewares.adaptive_concurrency_middleware import AdaptiveConcurrencyMiddleware
+
+
+def test_healthy_domain_grows_by_one_per_window():
+    controller = AimdController(start_concurrency=4, max_concurrency=8)
+    for _ in range(4):
+        controller.observe("example.com", 0.1, False)
+    assert controller.get_concurrency("example.com") == 4
+    for _ in range(2):
+        controller.observe("example.com", 0.1, False)
+    assert controller.get_concurrency("example.com") == 5
+
+
+def test_bad_status_halves_concurrency_once_per_window():
+    controller = AimdController(start_concurrency=8)
+    for _ in range(8):
+        controller.observe("example.com", 0.1, False)
+    controller.observe("example.com", 0.1, True)
+    assert controller.get_concurrency("example.com") == 4
+    controller.observe("example.com", 0.1, True)
+    assert controller.get_concurrency("example.com") == 4
+    assert controller.snapshot("example.com")["decreases"] == 1
+
+
+def test_latency_above_baseline_counts_as_congestion():
+    controller = AimdController(start_concurrency=2, latency_factor=2.0, smoothing=1.0)
+    controller.observe("example.com", 0.1, False)
+    controller.observe("example.com", 0.1, False)
+    controller.observe("example.com", 0.5, False)
+    assert controller.get_concurrency("example.com") == 1
+
+
+def test_delay_only_grows_at_minimum_concurrency_and_shrinks_first():
+    controller = AimdController(start_concurrency=1, min_concurrency=1, delay_step=0.25, smoothing=1.0)
+    controller.observe("example.com", None, True)
+    assert controller.get_delay("example.com") == 0.25
+    assert controller.get_concurrency("example.com") == 1
+    controller.observe("example.com", None, True)
+    assert controller.get_delay("example.com") == 0.5
+    controller.observe("example.com", 0.1, False)
+    assert controller.get_delay("example.com") == 0.25
+    assert controller.snapshot("example.com")["increases"] == 0
+
+
+def test_one_fast_response_does_not_pin_the_baseline():
+    controller = AimdController(start_concurrency=4, latency_factor=2.0, smoothing=1.0)
+    controller.observe("example.com", 0.01, False)
+    for _ in range(30):
+        controller.observe("example.com", 0.5, False)
+    assert controller.snapshot("example.com")["baseline_latency"] > 0.25
+    for _ in range(10):
+        controller.observe("example.com", 0.5, False)
+    assert controller.get_concurrency("example.com") > 1
+
+
+def get_middleware(slots):
+    crawler = get_crawler(settings_dict={'CONCURRENT_REQUESTS_PER_DOMAIN': 4})
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots=slots))
+    return AdaptiveConcurrencyMiddleware(crawler)
+
+
+def test_middleware_applies_limits_to_the_download_slot():
+    slot = Slot(concurrency=4, delay=0)
+    middleware = get_middleware({"example.com": slot})
+    request = Request("https://example.com/", meta={"download_slot": "example.com", "download_latency": 0.1})
+    for _ in range(8):
+        middleware.process_response(request, Response(request.url, status=200, request=request))
+    assert slot.concurrency == 5
+
+    # Missing pages and DNS errors are not congestion, a 503 and a timeout are
+    middleware.process_response(request, Response(request.url, status=404, request=request))
+    middleware.process_exception(request, DNSLookupError())
+    assert slot.concurrency == 5
+    middleware.process_response(request, Response(request.url, status=503, request=request))
+    assert slot.concurrency == 2
+    # At most one decrease per window of responses
+    for _ in range(3):
+        middleware.process_exception(request, TimeoutError())
+    assert slot.concurrency == 1
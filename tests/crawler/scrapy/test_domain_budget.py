@@ -0,0 +1,64 @@
+import pytest
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from toolkit.crawler.scrapy.domain_budget import DomainBudget, EmailsFoundGoal
+from toolkit.crawler.scrapy.failure import BudgetExhaustedError
+from toolkit.crawler.scrapy.middlewares.domain_budget_middleware import DomainBudgetMiddleware
+from toolkit.crawler.scrapy.spider import BaseSpider
+
+
+class Spider(BaseSpider):
+    name = 'budget'
+
+
+def get_response(url, body=b'<html></html>'):
+    return HtmlResponse(url, body=body, request=Request(url))
+
+
+def test_max_pages_per_domain():
+    budget = DomainBudget(max_pages=2)
+    assert not budget.record_page('example.com')
+    assert budget.record_page('example.com')
+    assert not budget.allow_request('example.com')
+    assert budget.allow_request('example.org')
+    assert budget.snapshot()['example.com'] == {'pages': 2, 'pages_saved': 1, 'done': 'max_pages'}
+
+
+def test_emails_found_goal():
+    budget = DomainBudget(goal=EmailsFoundGoal(count=2))
+    # Pages are not parsed by the goal, only the emails reported by the spider count
+    assert not budget.record_page('example.com', get_response('https://example.com/', b'info@example.com'))
+    assert not budget.record_emails('example.com', ['info@example.com'])
+    assert not budget.record_emails('example.com', ['info@example.com', 'x@other.com'])
+    assert budget.record_emails('example.com', ['sales@example.com'])
+    assert budget.is_done('example.com')
+
+
+def test_spider_reports_emails_to_the_budget():
+    crawler = get_crawler(Spider, settings_dict={
+        'DOMAIN_BUDGET_GOAL': 'toolkit.crawler.scrapy.domain_budget.EmailsFoundGoal'})
+    spider = crawler.spider = Spider.from_crawler(crawler)
+    middleware = DomainBudgetMiddleware.from_crawler(crawler)
+    middleware.spider_opened(spider)
+    response = get_response('https://www.example.com/contact')
+    middleware.process_response(response.request, response)
+
+    assert spider.record_emails(response, ['info@example.com'])
+    assert crawler.stats.get_value('domain_budget/goal_reached') == 1
+    with pytest.raises(BudgetExhaustedError):
+        middleware.process_request(Request('https://example.com/about'))
+
+
+def test_middleware_drops_requests_once_goal_is_reached():
+    crawler = get_crawler(settings_dict={
+        'DOMAIN_BUDGET_GOAL': 'toolkit.crawler.scrapy.domain_budget.ContactPageGoal'})
+    middleware = DomainBudgetMiddleware.from_crawler(crawler)
+    request = Request('https://www.example.com/contact')
+    middleware.process_request(request)
+    middleware.process_response(request, get_response(request.url))
+
+    with pytest.raises(BudgetExhaustedError):
+        middleware.process_request(Request('https://example.com/blog'))
+    middleware.process_request(Request('https://example.org/blog'))
+    assert crawler.stats.get_value('domain_budget/pages_saved') == 1
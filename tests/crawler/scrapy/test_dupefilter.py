@@ -0,0 +1,77 @@
+import logging
+
+import pytest
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+
+from toolkit.crawler.scrapy.dupefilter import BloomDupeFilter, BloomFilter
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    for i in range(10_000):
+        bloom.add(f"https://example.com/{i}".encode())
+    assert all(f"https://example.com/{i}".encode() in bloom for i in range(10_000))
+    false_positives = sum(f"https://example.org/{i}".encode() in bloom for i in range(10_000))
+    assert false_positives < 300
+
+
+def test_canonicalized_urls_are_duplicates():
+    dupefilter = BloomDupeFilter.from_crawler(get_crawler())
+    assert not dupefilter.request_seen(Request("https://example.com/page?b=2&a=1"))
+    assert dupefilter.request_seen(Request("https://example.com/page?a=1&b=2"))
+    assert not dupefilter.request_seen(Request("https://example.com/other"))
+
+
+def test_exact_store_overrides_false_positives(tmp_path):
+    dupefilter = BloomDupeFilter(str(tmp_path), capacity=1, error_rate=0.5, exact=True)
+    for i in range(100):
+        assert not dupefilter.fingerprint_seen(f"fingerprint-{i}".encode())
+    assert dupefilter.fingerprint_seen(b"fingerprint-0")
+
+
+def test_exact_store_needs_a_path():
+    with pytest.raises(ValueError):
+        BloomDupeFilter(exact=True)
+
+
+def test_state_persists_across_runs(tmp_path):
+    crawler = get_crawler(settings_dict={'JOBDIR': str(tmp_path), 'DUPEFILTER_EXACT': True})
+    dupefilter = BloomDupeFilter.from_crawler(crawler)
+    assert not dupefilter.request_seen(Request("https://example.com/a"))
+    dupefilter.close('finished')
+
+    dupefilter = BloomDupeFilter.from_crawler(crawler)
+    assert dupefilter.request_seen(Request("https://example.com/a"))
+    assert not dupefilter.request_seen(Request("https://example.com/b"))
+    dupefilter.close('finished')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_killed_crawl_resumes_from_periodic_save(tmp_path):
+    clock = FakeClock()
+    dupefilter = BloomDupeFilter(str(tmp_path), capacity=1000, exact=True, save_interval=60, clock=clock)
+    assert not dupefilter.fingerprint_seen(b"saved")
+    clock.now = 60
+    assert not dupefilter.fingerprint_seen(b"committed only")
+    dupefilter.db.commit()
+    # Killed without close: the filter on disk lacks the last fingerprint, the exact store has it
+    dupefilter = BloomDupeFilter(str(tmp_path), capacity=1000, exact=True)
+    assert dupefilter.fingerprint_seen(b"saved")
+    assert dupefilter.fingerprint_seen(b"committed only")
+    assert not dupefilter.fingerprint_seen(b"new")
+
+
+def test_resized_filter_is_reported(tmp_path, caplog):
+    BloomDupeFilter(str(tmp_path), capacity=1000).close('finished')
+    with caplog.at_level(logging.WARNING):
+        dupefilter = BloomDupeFilter(str(tmp_path), capacity=2000)
+    assert dupefilter.bloom.capacity == 1000
+    assert "not the configured 2000" in caplog.text
@@ -0,0 +1,117 @@
+import pytest
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+from twisted.internet import reactor, task
+from twisted.python.failure import Failure
+
+from toolkit.crawler.scrapy.circuit_breaker import CircuitBreaker
+from toolkit.crawler.scrapy.failure import (BackoffDelayedError, BudgetExhaustedError, CircuitOpenError,
+                                            FailureHandler)
+from toolkit.crawler.scrapy.middlewares.circuit_breaker_middleware import CircuitBreakerMiddleware
+from toolkit.crawler.scrapy.spider import BaseSpider
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeEngine:
+    def __init__(self):
+        self.requests = []
+
+    def crawl(self, request):
+        self.requests.append(request)
+
+
+class EchoSpider(BaseSpider):
+    name = 'echo'
+
+    def parse(self, response, **kwargs):
+        return response
+
+
+def get_spider(settings=None):
+    crawler = get_crawler(EchoSpider, settings_dict=settings)
+    crawler.spider = EchoSpider.from_crawler(crawler)
+    return crawler.spider
+
+
+def test_retry_backoff_grows_and_is_capped():
+    spider = get_spider({'FAILURE_RETRY_TIMES': 5, 'FAILURE_RETRY_BACKOFF_BASE': 1.0, 'FAILURE_RETRY_BACKOFF_MAX': 3.0})
+    request = Request('https://example.com/')
+    delays = []
+    for _ in range(4):
+        request = FailureHandler._get_retry_request(request, spider)
+        delays.append(request.meta['backoff_delay'])
+    assert 0.5 <= delays[0] <= 1 and 1 <= delays[1] <= 2 and all(1.5 <= delay <= 3 for delay in delays[2:])
+    assert request.meta['failure_retry_times'] == 4 and request.dont_filter
+    assert spider.crawler.stats.get_value('failure_retry/count') == 4
+
+
+def test_retries_give_up_and_share_the_retry_middleware_budget():
+    spider = get_spider({'RETRY_TIMES': 2})
+    request = FailureHandler._get_retry_request(Request('https://example.com/'), spider)
+    request = FailureHandler._get_retry_request(request, spider)
+    assert FailureHandler._get_retry_request(request, spider) is None
+
+    # Two retries already made by Scrapy's RetryMiddleware exhaust the budget
+    assert FailureHandler._get_retry_request(Request('https://example.com/', meta={'retry_times': 2}), spider) is None
+
+
+def test_middleware_delays_retries_outside_the_downloader(monkeypatch):
+    clock = task.Clock()
+    monkeypatch.setattr(reactor, 'callLater', clock.callLater)
+    spider = get_spider()
+    spider.crawler.engine = engine = FakeEngine()
+    middleware = CircuitBreakerMiddleware(spider.crawler)
+    request = Request('https://example.com/', meta={'backoff_delay': 1.5})
+    with pytest.raises(BackoffDelayedError) as error:
+        middleware.process_request(request)
+    failure = Failure(error.value)
+    failure.request = request
+    assert FailureHandler.handle_failure(failure, spider) is None
+
+    # The spider stays open until the delayed retry is handed back to the engine
+    with pytest.raises(DontCloseSpider):
+        middleware.spider_idle(spider)
+    clock.advance(1.5)
+    assert engine.requests == [request]
+    middleware.spider_idle(spider)
+    middleware.process_request(request)
+
+
+def test_open_circuit_short_circuits_to_status_601():
+    spider = get_spider({'CIRCUIT_BREAKER_THRESHOLD': 1})
+    middleware = CircuitBreakerMiddleware(spider.crawler)
+    request = Request('https://example.com/')
+    middleware.process_response(request, Response(request.url, status=503, request=request))
+    with pytest.raises(CircuitOpenError) as error:
+        middleware.process_request(request)
+    failure = Failure(error.value)
+    failure.request = request
+    assert FailureHandler.handle_failure(failure, spider).status == 601
+    assert spider.crawler.stats.get_value('circuit_breaker/short_circuited') == 1
+
+
+def test_half_open_probe_closes_the_circuit_or_is_released():
+    middleware = CircuitBreakerMiddleware(get_crawler(settings_dict={'CIRCUIT_BREAKER_THRESHOLD': 1,
+                                                                      'CIRCUIT_BREAKER_COOLDOWN': 10}))
+    middleware.breaker.clock = clock = FakeClock()
+    request = Request('https://example.com/')
+    middleware.process_exception(request, TimeoutError())
+    clock.now = 10
+
+    # A probe dropped by another middleware lets the next request probe again
+    middleware.process_request(request)
+    middleware.process_exception(request, BudgetExhaustedError())
+    assert middleware.breaker.get_state('example.com') == CircuitBreaker.HALF_OPEN
+
+    probe = Request('https://example.com/next')
+    middleware.process_request(probe)
+    middleware.process_response(probe, Response(probe.url, status=200, request=probe))
+    assert middleware.breaker.get_state('example.com') == CircuitBreaker.CLOSED
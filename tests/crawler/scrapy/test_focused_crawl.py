@@ -0,0 +1,35 @@
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from toolkit.crawler.scrapy.middlewares.focused_crawl_middleware import FocusedCrawlMiddleware
+from toolkit.url import get_page_category
+
+
+def get_response(url, meta=None):
+    return HtmlResponse(url, body=b'<html></html>', request=Request(url, meta=meta or {}))
+
+
+def test_page_categories():
+    assert get_page_category('https://example.com/contact-us') == 'contact'
+    assert get_page_category('https://example.com/about') == 'about'
+    assert get_page_category('https://example.com/blog/2024/some-post') == 'low'
+    assert get_page_category('https://example.com/services') == 'other'
+
+
+def test_requests_are_prioritized_by_category():
+    middleware = FocusedCrawlMiddleware.from_crawler(get_crawler(settings_dict={'FOCUSED_CRAWL_SCORES': {'about': 10}}))
+    response = get_response('https://example.com/')
+    requests = [Request(f'https://example.com/{path}') for path in ('blog/post', 'services', 'about', 'contact')]
+    output = list(middleware.process_spider_output(response, requests))
+    assert [request.priority for request in output] == [-50, 0, 10, 100]
+
+
+def test_low_score_chains_are_capped():
+    crawler = get_crawler(settings_dict={'FOCUSED_CRAWL_MAX_LOW_SCORE_DEPTH': 2})
+    middleware = FocusedCrawlMiddleware.from_crawler(crawler)
+    response = get_response('https://example.com/blog/page/2', meta={'focused_crawl_low_score_depth': 2})
+    output = list(middleware.process_spider_output(response, [
+        Request('https://example.com/blog/page/3'), Request('https://example.com/contact'),
+    ]))
+    assert [request.url for request in output] == ['https://example.com/contact']
+    assert output[0].meta['focused_crawl_low_score_depth'] == 0
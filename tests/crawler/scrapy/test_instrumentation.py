@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from twisted.internet.error import TimeoutError
+
+from toolkit.crawler.scrapy.instrumentation import CrawlMetrics, Histogram
+from toolkit.crawler.scrapy.middlewares.instrumentation_middleware import InstrumentationMiddleware
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((1, 2, 5, 10))
+    for value in (0.5, 1.5, 1.5, 3, 20):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 0, 1]
+    assert histogram.get_quantile(0.5) == 2
+    assert histogram.get_quantile(1.0) == 20
+
+
+def test_prometheus_histograms_are_cumulative():
+    metrics = CrawlMetrics()
+    metrics.record_response('example.com', 200, 2000, latency=0.2)
+    metrics.record_response('example.com', 503, 100, latency=20)
+    text = metrics.to_prometheus()
+    assert 'crawl_latency_seconds_bucket{domain="example.com",le="+Inf"} 2' in text
+    assert 'crawl_latency_seconds_bucket{domain="example.com",le="0.25"} 1' in text
+    assert 'crawl_responses_total{domain="example.com",status="503"} 1' in text
+
+
+def test_snapshots_do_not_reset_the_interval_rate():
+    clock = FakeClock()
+    metrics = CrawlMetrics(clock)
+    for _ in range(10):
+        metrics.record_item()
+    clock.now = 5
+    assert metrics.snapshot()['interval_items_per_second'] == 2
+    assert metrics.snapshot()['interval_items_per_second'] == 2
+
+    metrics.start_interval()
+    metrics.record_item()
+    clock.now = 10
+    assert metrics.snapshot()['interval_items_per_second'] == 0.2
+
+
+def test_middleware_is_disabled_by_default():
+    with pytest.raises(NotConfigured):
+        InstrumentationMiddleware.from_crawler(get_crawler())
+
+
+def test_middleware_records_and_exports(tmp_path):
+    export_path = tmp_path / 'metrics.jsonl'
+    crawler = get_crawler(settings_dict={'INSTRUMENTATION_ENABLED': True,
+                                         'INSTRUMENTATION_EXPORT_PATH': str(export_path)})
+    middleware = InstrumentationMiddleware.from_crawler(crawler)
+    request = Request('https://example.com/a', meta={'download_latency': 0.3})
+    middleware.process_response(request, HtmlResponse(request.url, body=b'<html></html>', request=request))
+    middleware.process_exception(Request('https://example.com/b'), TimeoutError())
+    middleware.item_scraped({}, None)
+    middleware.export()
+
+    snapshot = json.loads(export_path.read_text().splitlines()[-1])
+    domain = snapshot['domains']['example.com']
+    assert domain['statuses'] == {'200': 1}
+    assert domain['failures'] == {'TimeoutError': 1}
+    assert domain['latency']['count'] == 1
+    assert snapshot['items'] == 1
@@ -0,0 +1,55 @@
+import random
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from toolkit.crawler.scrapy.near_duplicates import NearDuplicateIndex, get_hamming_distance, get_simhash
+from toolkit.crawler.scrapy.spider import BaseSpider
+
+WORDS = [f"word{i}" for i in range(500)]
+
+
+def get_text(seed, length=400):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def test_similar_texts_have_close_simhashes():
+    text = get_text(1)
+    variant = text.replace(text.split()[200], 'changed', 1) + ' printed on 2024-01-01'
+    assert get_hamming_distance(get_simhash(text), get_simhash(variant)) <= 3
+    assert get_hamming_distance(get_simhash(text), get_simhash(get_text(2))) > 10
+
+
+def test_index_is_per_domain():
+    index = NearDuplicateIndex(max_distance=3)
+    simhash = get_simhash(get_text(1))
+    assert index.add('example.com', simhash, 'https://example.com/a') is None
+    assert index.add('example.com', simhash ^ 0b101, 'https://example.com/a?print=1') == 'https://example.com/a'
+    assert index.add('example.org', simhash, 'https://example.org/a') is None
+    assert index.add('example.com', get_simhash(get_text(2)), 'https://example.com/b') is None
+    assert index.stats == {'checked': 4, 'duplicates': 1}
+
+
+def test_spider_counts_near_duplicates():
+    crawler = get_crawler(BaseSpider)
+    spider = BaseSpider.from_crawler(crawler, name='test')
+    body = f"<html><body><p>{get_text(1)}</p></body></html>"
+    for url in ('https://example.com/a', 'https://example.com/a?utm_source=x'):
+        response = HtmlResponse(url, body=body.encode(), request=Request(url))
+        duplicate_of = spider.get_near_duplicate(response)
+    assert duplicate_of == 'https://example.com/a'
+    assert crawler.stats.get_value('near_duplicates/found') == 1
+
+
+def test_short_pages_are_not_near_duplicates():
+    assert get_simhash('') is None
+    assert get_simhash('   \n ') is None
+    assert get_simhash('Page not found') is None
+    crawler = get_crawler(BaseSpider)
+    spider = BaseSpider.from_crawler(crawler, name='test')
+    for url in ('https://example.com/a', 'https://example.com/b'):
+        response = HtmlResponse(url, body=b'<html><body><script>app()</script></body></html>', request=Request(url))
+        assert spider.get_near_duplicate(response) is None
+    assert crawler.stats.get_value('near_duplicates/too_short') == 2
+    assert not spider.near_duplicate_index.buckets
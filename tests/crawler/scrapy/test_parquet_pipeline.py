@@ -0,0 +1,31 @@
+import datetime
+import os
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from toolkit.crawler.scrapy.pipelines.parquet_pipeline import ParquetPipeline
+from toolkit.file import read_parquet
+
+
+def test_pipeline_requires_path():
+    with pytest.raises(NotConfigured):
+        ParquetPipeline.from_crawler(get_crawler())
+
+
+def test_pipeline_writes_partitioned_items(tmp_path):
+    pytest.importorskip('pyarrow')
+    directory_path = str(tmp_path / 'items')
+    crawler = get_crawler(settings_dict={'PARQUET_PATH': directory_path,
+                                         'PARQUET_PARTITION_BY': ['domain', 'crawl_date']})
+    pipeline = ParquetPipeline.from_crawler(crawler)
+    for domain in ('example.com', 'example.org', 'example.com'):
+        pipeline.process_item({'domain': domain, 'email': f'info@{domain}'})
+    pipeline.spider_closed(None)
+
+    today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+    df = read_parquet(directory_path, columns=['email'], filters=[('domain', '=', 'example.com')])
+    assert df['email'].tolist() == ['info@example.com', 'info@example.com']
+    assert os.path.isdir(os.path.join(directory_path, 'domain=example.com', f'crawl_date={today}'))
+    assert crawler.stats.get_value('parquet/items') == 3
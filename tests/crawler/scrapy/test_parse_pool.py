@@ -0,0 +1,60 @@
+import pickle
+from concurrent.futures import Future
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from toolkit.crawler.scrapy.parse_pool import ParsePool, _run_extractor, extract_emails
+
+
+def test_extract_emails():
+    body = b'<html><body>\n<p>Write to <b>info@example.com</b></p>\n<p>or sales@example.com</p>\n</body></html>'
+    assert _run_extractor(extract_emails, body, 'https://example.com/contact', 'utf-8') == [
+        {'url': 'https://example.com/contact', 'emails': ['info@example.com', 'sales@example.com']},
+    ]
+
+
+def test_extractors_are_sent_to_workers_by_reference():
+    assert pickle.loads(pickle.dumps(extract_emails)) is extract_emails
+
+
+def test_pending_extractions_are_bounded():
+    pool = ParsePool(max_workers=3)
+    assert pool.max_pending == 6
+    assert pool.semaphore.limit == 6
+
+
+def uppercase(body, url, encoding):
+    return [{'url': url, 'text': body.decode(encoding).upper()}]
+
+
+class ParsePoolTest(unittest.TestCase):
+    @defer.inlineCallbacks
+    def test_submitted_extractions_fire_within_the_bound(self):
+        pool = ParsePool(max_workers=1, max_pending=2)
+        self.addCleanup(pool.close)
+        deferreds = [pool.submit(uppercase, f'page {i}'.encode(), f'https://example.com/{i}') for i in range(5)]
+        assert pool.semaphore.tokens == 0
+        assert len(pool.semaphore.waiting) == 3
+        assert pool.stats['submitted'] == 2
+
+        results = yield defer.gatherResults(deferreds)
+        assert [items[0]['text'] for items in results] == [f'PAGE {i}' for i in range(5)]
+        assert pool.stats['completed'] == 5
+        assert pool.stats['waited'] == 3
+
+    @defer.inlineCallbacks
+    def test_close_cancels_pending_extractions(self):
+        pool = ParsePool(max_workers=1, max_pending=1)
+        first = pool.submit(uppercase, b'page', 'https://example.com/1')
+        second = pool.submit(uppercase, b'page', 'https://example.com/2')
+        pool.close()
+        yield first
+        yield self.assertFailure(second, defer.CancelledError)
+
+        future = Future()
+        future.cancel()
+        cancelled = defer.Deferred()
+        pool._on_done(future, cancelled, 'https://example.com/3')
+        yield self.assertFailure(cancelled, defer.CancelledError)
+        assert pool.stats['cancelled'] == 2
@@ -0,0 +1,60 @@
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.utils.test import get_crawler
+
+from toolkit.crawler.scrapy.middlewares.response_cache_middleware import ResponseCacheMiddleware
+from toolkit.crawler.scrapy.response_cache import ResponseCache
+from toolkit.crawler.scrapy.spider import BaseSpider
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    body = b"<html>" + b"same content " * 100 + b"</html>"
+    first = cache.store("a", "https://example.com/a", 200, {}, body)
+    second = cache.store("b", "https://example.com/b?utm=1", 200, {}, body)
+    assert first == second
+    assert len(cache) == 2
+    assert cache.get_size() < len(body)
+    assert cache.get_body("b", second) == body
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=1000, compression_level=0)
+    for name in "abc":
+        cache.store(name, f"https://example.com/{name}", 200, {}, name.encode() * 400)
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    assert cache.get_size() <= 1000
+    assert cache.stats["evictions"] >= 1
+
+
+def test_not_modified_response_is_served_from_cache(tmp_path):
+    crawler = get_crawler(settings_dict={"RESPONSE_CACHE_DIR": str(tmp_path)})
+    middleware = ResponseCacheMiddleware(crawler)
+    body = b"<html><body>contact@example.com</body></html>"
+
+    request = Request("https://example.com/contact")
+    middleware.process_request(request)
+    response = HtmlResponse(request.url, status=200, body=body, request=request,
+                            headers={"ETag": '"v1"', "Content-Type": "text/html"})
+    assert not BaseSpider.is_unchanged(middleware.process_response(request, response))
+
+    recrawl = Request("https://example.com/contact")
+    middleware.process_request(recrawl)
+    assert recrawl.headers[b"If-None-Match"] == b'"v1"'
+
+    cached = middleware.process_response(recrawl, Response(recrawl.url, status=304, request=recrawl))
+    assert cached.status == 200
+    assert cached.body == body
+    assert BaseSpider.is_unchanged(cached)
+    assert middleware.cache.stats["hits"] == 1
+    assert middleware.cache.stats["bytes_saved"] == len(body)
+
+
+def test_identical_body_without_validators_is_flagged_unchanged(tmp_path):
+    crawler = get_crawler(settings_dict={"RESPONSE_CACHE_DIR": str(tmp_path)})
+    middleware = ResponseCacheMiddleware(crawler)
+    for expected in (False, True):
+        request = Request("https://example.com/about")
+        middleware.process_request(request)
+        response = HtmlResponse(request.url, status=200, body=b"<html>about</html>", request=request)
+        assert BaseSpider.is_unchanged(middleware.process_response(request, response)) is expected
@@ -0,0 +1,95 @@
+import asyncio
+import gzip
+
+from scrapy.http import HtmlResponse, Request, Response, TextResponse
+from scrapy.utils.test import get_crawler
+
+from toolkit.crawler.scrapy.sitemap import SitemapDiscoverySpider, iter_sitemap_body
+
+SITEMAP_INDEX = b'''<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://example.com/page-sitemap.xml.gz</loc></sitemap>
+</sitemapindex>'''
+
+
+def get_urlset(paths):
+    entries = ''.join(f'<url><loc>https://example.com/{path}</loc><lastmod>2024-01-01</lastmod></url>'
+                      for path in paths)
+    return f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'.encode()
+
+
+def test_large_gzipped_sitemap_is_streamed():
+    body = gzip.compress(get_urlset([f'blog/post-{i}' for i in range(50000)] + ['contact-us']))
+    entries = list(iter_sitemap_body(body))
+    assert len(entries) == 50001
+    assert entries[-1] == ('url', 'https://example.com/contact-us')
+
+
+def test_sitemap_index_entries():
+    assert list(iter_sitemap_body(SITEMAP_INDEX)) == [('sitemap', 'https://example.com/page-sitemap.xml.gz')]
+
+
+class ContactSpider(SitemapDiscoverySpider):
+    name = 'contact'
+    start_urls = ['https://example.com/']
+
+    def parse(self, response, **kwargs):
+        yield {'url': response.url}
+
+
+def get_spider():
+    crawler = get_crawler(ContactSpider)
+    crawler.spider = ContactSpider.from_crawler(crawler)
+    return crawler.spider
+
+
+def get_response(request, body, cls=Response, status=200):
+    return cls(request.url, body=body, status=status, request=request)
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_sitemaps_seed_high_value_pages():
+    spider = get_spider()
+    [robots_request] = asyncio.run(collect(spider.start()))
+    assert robots_request.url == 'https://example.com/robots.txt'
+
+    robots = get_response(robots_request, b'User-agent: *\nSitemap: https://example.com/sitemap_index.xml\n',
+                          TextResponse)
+    [index_request] = list(spider.parse_robots(robots))
+    [sitemap_request] = list(spider.parse_sitemap(get_response(index_request, SITEMAP_INDEX)))
+    body = gzip.compress(get_urlset(['blog/post-1', 'about-us', 'contact']))
+    page_requests = list(spider.parse_sitemap(get_response(sitemap_request, body)))
+    assert [request.url for request in page_requests] == ['https://example.com/contact', 'https://example.com/about-us']
+
+
+def test_home_page_is_crawled_without_sitemap():
+    spider = get_spider()
+    spider.sites['example.com'] = {'home_url': 'https://example.com/', 'pending': 1, 'sitemaps': 1,
+                                   'seen_sitemaps': set(), 'urls': {}}
+    robots_request = Request('https://example.com/robots.txt', meta={'sitemap_site': 'example.com'})
+    [sitemap_request] = list(spider.parse_robots(get_response(robots_request, b'', TextResponse, status=404)))
+    assert sitemap_request.url == 'https://example.com/sitemap.xml'
+
+    [home_request] = list(spider.parse_sitemap(get_response(sitemap_request, b'Not found', status=404)))
+    assert home_request.url == 'https://example.com/'
+    home = get_response(home_request, b'<a href="/blog">Blog</a><a href="/contact">Contact</a>', HtmlResponse)
+    output = list(spider.parse_home(home))
+    assert output[0] == {'url': 'https://example.com/'}
+    assert [request.url for request in output[1:]] == ['https://example.com/contact']
+
+
+def test_repeated_sitemaps_are_requested_once():
+    spider = get_spider()
+    [robots_request] = asyncio.run(collect(spider.start()))
+    robots = get_response(robots_request, b'Sitemap: https://example.com/sitemap_index.xml\n'
+                                          b'Sitemap: https://example.com/sitemap_index.xml\n', TextResponse)
+    [index_request] = list(spider.parse_robots(robots))
+    assert index_request.dont_filter and index_request.meta['allow_offsite']
+
+    # An index listing itself must not leave the site pending forever
+    looping_index = SITEMAP_INDEX.replace(b'page-sitemap.xml.gz', b'sitemap_index.xml')
+    [home_request] = list(spider.parse_sitemap(get_response(index_request, looping_index)))
+    assert home_request.url == 'https://example.com/'
@@ -0,0 +1,398 @@
+import gzip
+import importlib.util
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from toolkit.file import (CsvAppender, CsvCatalog, CsvDedupIndex, LineStore, ParquetAppender, _find_record_offsets,
+                          _read_csv_file, get_compression, open_file, read_column_names_from_csv, read_csv_range,
+                          read_csvs_from_directory, read_from_csv, read_list_from_text_file, read_parquet,
+                          remove_duplicates, write_list_to_text_file, write_to_csv)
+
+
+def test_write_to_csv_keeps_its_behavior(tmp_path):
+    file_path = str(tmp_path / 'items.csv')
+    write_to_csv(file_path, {'name': 'a', 'email': 'a@example.com'}, headers=['name', 'email'], mode='w')
+    write_to_csv(file_path, {'email': 'b@example.com', 'name': 'b', 'extra': 1}, headers=['name', 'email'])
+    write_to_csv(file_path, {'name': 'c', 'email': None})
+    with open(file_path) as file:
+        assert file.read() == 'name,email\na,a@example.com\nb,b@example.com\nc,\n'
+
+
+def test_write_to_csv_round_trips_missing_values(tmp_path):
+    file_path = str(tmp_path / 'items.csv')
+    with open(file_path, 'w') as file:
+        file.write('name,email,phone\na,,+1 555\nb,b@example.com,\n')
+    copy_path = str(tmp_path / 'copy.csv')
+    for i, row in enumerate(read_from_csv(file_path)):
+        write_to_csv(copy_path, row, mode='w' if i == 0 else 'a')
+    with open(file_path) as file, open(copy_path) as copy:
+        assert copy.read() == file.read()
+
+
+def test_appender_reads_header_with_byte_order_mark(tmp_path):
+    file_path = str(tmp_path / 'items.csv')
+    with open(file_path, 'w', encoding='utf-8-sig') as file:
+        file.write('name,email\na,a@example.com\n')
+    with CsvAppender(file_path) as appender:
+        assert appender.headers == ['name', 'email']
+        appender.write({'name': 'b', 'email': 'b@example.com'})
+    assert list(read_from_csv(file_path, dtype=str))[-1] == {'name': 'b', 'email': 'b@example.com'}
+
+
+def test_read_column_names_strips_byte_order_mark(tmp_path):
+    file_path = str(tmp_path / 'excel.csv')
+    with open(file_path, 'w', encoding='utf-8-sig') as file:
+        file.write('name,email\na,a@example.com\n')
+    assert read_column_names_from_csv(file_path) == ['name', 'email']
+
+
+def test_appender_fixes_header_from_first_row(tmp_path):
+    file_path = str(tmp_path / 'items.csv')
+    with CsvAppender(file_path, buffer_size=2) as appender:
+        appender.write({'name': 'a', 'email': 'a@example.com'})
+        appender.write({'email': 'b@example.com', 'name': 'b', 'phone': '123'})
+        appender.write({'name': 'c'})
+    df = pd.read_csv(file_path)
+    assert df.columns.tolist() == ['name', 'email']
+    assert df['name'].tolist() == ['a', 'b', 'c']
+
+
+def test_appender_reuses_existing_header(tmp_path):
+    file_path = str(tmp_path / 'items.csv')
+    with CsvAppender(file_path, headers=['name', 'email']) as appender:
+        appender.write({'name': 'a'})
+    with CsvAppender(file_path) as appender:
+        assert appender.headers == ['name', 'email']
+        appender.write({'email': 'b@example.com', 'name': 'b'})
+    assert pd.read_csv(file_path)['email'].tolist()[1] == 'b@example.com'
+
+
+def test_appender_is_thread_safe(tmp_path):
+    file_path = str(tmp_path / 'items.csv')
+    with CsvAppender(file_path, headers=['thread', 'index'], buffer_size=7) as appender:
+        threads = [threading.Thread(target=appender.write_rows,
+                                    args=([{'thread': t, 'index': i} for i in range(1000)],)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    df = pd.read_csv(file_path)
+    assert len(df) == 4000
+    assert df.groupby('thread')['index'].nunique().tolist() == [1000] * 4
+
+
+def test_read_from_csv_streams_rows(tmp_path):
+    file_path = str(tmp_path / 'items.csv')
+    pd.DataFrame({'name': [f'n{i}' for i in range(25)], 'phone': ['0123'] * 25, 'count': range(25)}).to_csv(
+        file_path, index=False)
+
+    rows = list(read_from_csv(file_path, chunk_size=10))
+    assert len(rows) == 25
+    assert rows[3] == {'name': 'n3', 'phone': 123, 'count': 3}
+
+    rows = list(read_from_csv(file_path, chunk_size=10, usecols=['name', 'phone'], dtype={'phone': str}, skip_rows=20))
+    assert rows[0] == {'name': 'n20', 'phone': '0123'}
+    assert len(rows) == 5
+
+    batches = list(read_from_csv(file_path, chunk_size=10, batches=True))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+
+    batches = list(read_from_csv(file_path, chunk_size=10, skip_rows=7, batches=True))
+    assert [len(batch) for batch in batches] == [10, 8]
+    assert batches[0]['count'].tolist() == list(range(7, 17))
+    assert batches[1]['count'].tolist() == list(range(17, 25))
+
+
+def test_read_csvs_from_directory(tmp_path):
+    (tmp_path / 'shards').mkdir()
+    pd.DataFrame({'name': ['a', 'b'], 'email': ['a@x.com', 'b@x.com']}).to_csv(tmp_path / '1.csv', index=False)
+    pd.DataFrame({'name': ['c'], 'phone': ['123']}).to_csv(tmp_path / 'shards' / '2.csv', index=False)
+    (tmp_path / 'empty.csv').write_text('')
+    (tmp_path / 'notes.txt').write_text('name\nz\n')
+
+    df = read_csvs_from_directory(str(tmp_path))
+    assert df['name'].tolist() == ['a', 'b']
+
+    df = read_csvs_from_directory(str(tmp_path), recursive=True, usecols=['name', 'phone'], max_workers=2)
+    assert sorted(df.columns) == ['name', 'phone']
+    assert df['name'].tolist() == ['a', 'b', 'c']
+
+    frames = read_csvs_from_directory(str(tmp_path), recursive=True, lazy=True)
+    assert sorted(len(frame) for frame in frames) == [1, 2]
+    assert read_csvs_from_directory(str(tmp_path), pattern='*.tsv').empty
+    with pytest.raises(FileNotFoundError):
+        read_csvs_from_directory(str(tmp_path / 'missing'))
+
+
+def test_lazy_directory_reads_are_windowed(tmp_path, monkeypatch):
+    for i in range(10):
+        pd.DataFrame({'name': [str(i)]}).to_csv(tmp_path / f'{i}.csv', index=False)
+    read_paths = []
+
+    def read_csv_file(path, *args):
+        read_paths.append(path)
+        return _read_csv_file(path, *args)
+
+    monkeypatch.setattr('toolkit.file._read_csv_file', read_csv_file)
+
+    frames = read_csvs_from_directory(str(tmp_path), lazy=True, max_workers=1)
+    next(frames)
+    frames.close()
+    # Two reads in flight per worker, plus the one submitted when the first frame was yielded
+    assert len(read_paths) <= 3
+
+    assert sorted(read_csvs_from_directory(str(tmp_path), max_workers=1)['name']) == list(range(10))
+
+
+def _write_contacts(file_path, count=3000):
+    rows = []
+    for i in range(count):
+        rows.append({
+            'domain': f'example{i % 700}.com',
+            # Integers in the first chunks, floats once empty values show up
+            'zip': '' if i > count // 2 and i % 7 == 0 else str(i % 40),
+            'email': f'info{i}@example.com' if i % 3 == 0 else '',
+            'phone': str(i % 9) if i % 5 == 0 else '',
+        })
+    pd.DataFrame(rows).to_csv(file_path, index=False)
+
+
+@pytest.mark.parametrize('unique_columns', [['domain'], ['domain', 'zip']])
+@pytest.mark.parametrize('columns_to_prioritize', [None, ['email'], ['phone', 'email']])
+def test_remove_duplicates_out_of_core_matches_in_memory(tmp_path, unique_columns, columns_to_prioritize):
+    input_path = str(tmp_path / 'contacts.csv')
+    _write_contacts(input_path)
+    remove_duplicates(input_path, unique_columns=unique_columns, columns_to_prioritize=columns_to_prioritize,
+                      output_csv_path=str(tmp_path / 'in_memory.csv'))
+    remove_duplicates(input_path, unique_columns=unique_columns, columns_to_prioritize=columns_to_prioritize,
+                      output_csv_path=str(tmp_path / 'out_of_core.csv'), out_of_core=True, memory_budget=200000,
+                      spill_dir=str(tmp_path))
+    with open(tmp_path / 'in_memory.csv') as expected, open(tmp_path / 'out_of_core.csv') as result:
+        assert result.read() == expected.read()
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('remove_duplicates_')]
+
+
+def test_remove_duplicates_out_of_core_rewrite(tmp_path):
+    input_path = str(tmp_path / 'contacts.csv')
+    pd.DataFrame({'domain': ['a.com', 'b.com', 'a.com'], 'email': [None, 'b@b.com', 'a@a.com']}).to_csv(
+        input_path, index=False)
+    assert remove_duplicates(input_path, unique_columns=['domain'], rewrite=True, out_of_core=True) is None
+    assert pd.read_csv(input_path).values.tolist() == [['b.com', 'b@b.com'], ['a.com', 'a@a.com']]
+    with pytest.raises(ValueError):
+        remove_duplicates(input_path, unique_columns=['domain'], out_of_core=True)
+
+
+def test_dedup_index_merges_batches(tmp_path):
+    file_path = str(tmp_path / 'contacts.csv')
+    with CsvDedupIndex(file_path, unique_columns=['domain'], columns_to_prioritize=['email']) as index:
+        assert index.merge_rows([{'domain': 'a.com', 'email': None}, {'domain': 'b.com', 'email': 'b@b.com'}]) == \
+            {'inserted': 2, 'replaced': 0, 'dropped': 0}
+        assert index.merge_rows([{'domain': 'a.com', 'email': 'a@a.com'}, {'domain': 'b.com', 'email': None},
+                                 {'domain': 'c.com', 'email': 'c@c.com\nsecond line'}]) == \
+            {'inserted': 1, 'replaced': 1, 'dropped': 1}
+        assert index.snapshot() == {'rows': 3, 'tombstones': 1}
+
+    # Reopening reuses the index, until the file is changed by another writer
+    with CsvDedupIndex(file_path, unique_columns=['domain'], columns_to_prioritize=['email']) as index:
+        assert index.merge_rows([{'domain': 'c.com', 'email': 'a@c.com'}])['dropped'] == 1
+    write_to_csv(file_path, {'domain': 'b.com', 'email': 'z@b.com'})
+    with CsvDedupIndex(file_path, unique_columns=['domain'], columns_to_prioritize=['email']) as index:
+        assert index.snapshot() == {'rows': 3, 'tombstones': 2}
+        assert index.compact() == 2
+        assert index.snapshot() == {'rows': 3, 'tombstones': 0}
+    df = pd.read_csv(file_path)
+    assert df.values.tolist() == [['a.com', 'a@a.com'], ['c.com', 'c@c.com\nsecond line'], ['b.com', 'z@b.com']]
+
+
+def test_dedup_index_compaction_matches_remove_duplicates(tmp_path):
+    file_path = str(tmp_path / 'contacts.csv')
+    _write_contacts(file_path, count=1000)
+    expected = remove_duplicates(file_path, unique_columns=['domain', 'zip'], columns_to_prioritize=['phone', 'email'])
+    with CsvDedupIndex(file_path, unique_columns=['domain', 'zip'], columns_to_prioritize=['phone', 'email']) as index:
+        index.compact()
+    result = pd.read_csv(file_path)
+    pd.testing.assert_frame_equal(result, expected.sort_index().reset_index(drop=True))
+
+
+@pytest.mark.parametrize('columns_to_prioritize', [None, ['email'], ['score', 'email'], ['a', 'b', 'c', 'd', 'e']])
+@pytest.mark.parametrize('categorical_keys', [False, True])
+def test_remove_duplicates_argmax_engine_matches_sort_engine(columns_to_prioritize, categorical_keys):
+    rng = np.random.default_rng(1)
+    count = 20000
+    df = pd.DataFrame({
+        'domain': rng.choice(['a.com', 'b.com', 'c.com', None], count),
+        'zip': rng.choice([1.0, 2.0, np.nan], count),
+        'email': rng.choice(['x@a.com', 'y@a.com', None], count),
+        'score': rng.integers(0, 3, count),
+        # Many distinct values, whose combined ranks overflow a single int64
+        **{column: rng.integers(0, 100000, count) for column in 'abcde'},
+    }, index=rng.permutation(count))
+    df.loc[df.index[::5], 'zip'] = np.nan
+    for unique_columns in (['domain'], ['domain', 'zip']):
+        expected = remove_duplicates(input_df=df, unique_columns=unique_columns,
+                                     columns_to_prioritize=columns_to_prioritize, engine='sort')
+        result = remove_duplicates(input_df=df, unique_columns=unique_columns,
+                                   columns_to_prioritize=columns_to_prioritize, categorical_keys=categorical_keys)
+        pd.testing.assert_frame_equal(result, expected)
+
+
+def test_csv_catalog(tmp_path):
+    file_path = str(tmp_path / 'contacts.csv')
+    df = pd.DataFrame({'domain': [f'example{i}.com' for i in range(1000)],
+                       'address': [f'{i} Main Street\nSpringfield, "IL"' if i % 3 else '' for i in range(1000)]})
+    df.to_csv(file_path, index=False)
+    df = pd.read_csv(file_path)
+    catalog = CsvCatalog(file_path)
+    assert catalog.columns == read_column_names_from_csv(file_path) == ['domain', 'address']
+    assert len(catalog) == 1000
+    assert catalog[4] == {'domain': 'example4.com', 'address': '4 Main Street\nSpringfield, "IL"'}
+    assert catalog[-1]['domain'] == 'example999.com'
+    pd.testing.assert_frame_equal(catalog.read_rows(10, 20), df.iloc[10:20])
+
+    splits = catalog.split(3)
+    assert len(splits) == 3
+    parts = [read_csv_range(file_path, start, end, catalog.columns) for start, end in splits]
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), df)
+
+    # The sidecar index is reused, and rebuilt once the file changes
+    assert len(CsvCatalog(file_path)) == 1000
+    with open(file_path, 'a') as file:
+        file.write('\nexample1000.com,\n')
+    assert len(catalog) == 1001
+    assert catalog[1000] == {'domain': 'example1000.com', 'address': ''}
+
+
+def test_find_record_offsets_across_blocks():
+    data = b'a,b\n1,"x\n\ny"\n\n2,z\r\n\r\n3,"""q"""'
+    offsets = _find_record_offsets(io.BytesIO(data), block_size=3)
+    assert [data[start:start + 3] for start in offsets] == [b'a,b', b'1,"', b'2,z', b'3,"']
+
+
+def test_text_list_helpers_do_not_mutate(tmp_path):
+    file_path = str(tmp_path / 'domains.txt')
+    data = ['a.com', 'b.com']
+    write_list_to_text_file(file_path, data)
+    write_list_to_text_file(file_path, data, mode='a')
+    assert data == ['a.com', 'b.com']
+    assert read_list_from_text_file(file_path) == ['a.com\n', 'b.com\n', 'a.com\n', 'b.com']
+    assert read_list_from_text_file(file_path, strip_newlines=True) == ['a.com', 'b.com', 'a.com', 'b.com']
+
+
+def test_appending_text_lists_adds_no_blank_lines(tmp_path):
+    file_path = str(tmp_path / 'domains.txt')
+    write_list_to_text_file(file_path, ['a', 'b'])
+    write_list_to_text_file(file_path, [], mode='a')
+    write_list_to_text_file(file_path, ['c'], mode='a')
+    with open(file_path) as file:
+        assert file.read() == 'a\nb\nc'
+
+    with LineStore(file_path) as store:
+        store.append('d')
+    write_list_to_text_file(file_path, ['e'], mode='a')
+    assert read_list_from_text_file(file_path, strip_newlines=True) == ['a', 'b', 'c', 'd', 'e']
+
+
+@pytest.mark.parametrize('index', [None, 'set', 'sorted'])
+def test_line_store(tmp_path, index):
+    file_path = str(tmp_path / 'seen_urls.txt')
+    # Files written by write_list_to_text_file have no final newline
+    write_list_to_text_file(file_path, ['https://a.com', 'https://b.com'])
+    with LineStore(file_path, index=index, dedupe=True) as store:
+        assert list(store) == ['https://a.com', 'https://b.com']
+        assert 'https://a.com' in store and 'https://a.co' not in store and 'https://b.com/' not in store
+        assert store.extend(['https://c.com', 'https://a.com', 'https://c.com', 'https://d.com']) == 2
+        assert not store.append('https://d.com')
+        assert 'https://c.com' in store
+
+        # Lines appended by another writer are picked up
+        with LineStore(file_path) as other:
+            assert other.append('https://e.com')
+        assert 'https://e.com' in store
+
+    with LineStore(file_path, index=index) as store:
+        assert list(store) == ['https://a.com', 'https://b.com', 'https://c.com', 'https://d.com', 'https://e.com']
+        assert 'https://d.com' in store
+    with LineStore(file_path) as store:
+        assert read_list_from_text_file(file_path, strip_newlines=True) == list(store)
+
+
+COMPRESSIONS = ['gz', 'bz2', 'xz'] + (['zst'] if importlib.util.find_spec('zstandard') else [])
+
+
+@pytest.mark.parametrize('extension', COMPRESSIONS)
+def test_compressed_csv_io(tmp_path, extension):
+    file_path = str(tmp_path / f'contacts.csv.{extension}')
+    write_to_csv(file_path, {'domain': 'a.com', 'email': ''}, mode='w', compression_level=1)
+    with CsvAppender(file_path) as appender:
+        appender.write_rows([{'domain': 'b.com', 'email': 'b@b.com'}, {'domain': 'a.com', 'email': 'a@a.com'}])
+    assert get_compression(file_path) == {'gz': 'gzip', 'zst': 'zstd'}.get(extension, extension)
+    assert read_column_names_from_csv(file_path) == ['domain', 'email']
+    assert [row['domain'] for row in read_from_csv(file_path)] == ['a.com', 'b.com', 'a.com']
+    assert len(read_csvs_from_directory(str(tmp_path))) == 3
+
+    remove_duplicates(file_path, unique_columns=['domain'], columns_to_prioritize=['email'], rewrite=True)
+    assert get_compression(file_path) is not None
+    assert pd.read_csv(file_path)['email'].tolist() == ['b@b.com', 'a@a.com']
+    output_path = str(tmp_path / f'output.csv.{extension}')
+    remove_duplicates(file_path, unique_columns=['domain'], output_csv_path=output_path, out_of_core=True)
+    with open_file(output_path) as file:
+        assert file.read() == 'domain,email\nb.com,b@b.com\na.com,a@a.com\n'
+
+    list_path = str(tmp_path / f'domains.txt.{extension}')
+    write_list_to_text_file(list_path, ['a.com', 'b.com'])
+    write_list_to_text_file(list_path, ['c.com'], mode='a')
+    assert read_list_from_text_file(list_path, strip_newlines=True) == ['a.com', 'b.com', 'c.com']
+
+
+def test_compression_is_detected_from_magic_bytes(tmp_path):
+    file_path = str(tmp_path / 'contacts.csv')
+    with gzip.open(file_path, 'wt') as file:
+        file.write('domain\na.com\n')
+    assert get_compression(file_path) == 'gzip'
+    assert get_compression(file_path, 'w') is None
+    assert read_from_csv(file_path).__next__() == {'domain': 'a.com'}
+    write_to_csv(file_path, {'domain': 'b.com'})
+    assert read_list_from_text_file(file_path, strip_newlines=True) == ['domain', 'a.com', 'b.com']
+    with pytest.raises(ValueError):
+        LineStore(file_path)
+
+
+def test_parquet_appender_writes_partitioned_typed_dataset(tmp_path):
+    pytest.importorskip('pyarrow')
+    directory_path = str(tmp_path / 'items')
+    schema = {'domain': 'string', 'url': 'string', 'status': 'int32', 'crawled_at': 'timestamp[s]'}
+    with ParquetAppender(directory_path, schema=schema, partition_by=['domain'], batch_size=3) as appender:
+        for i in range(10):
+            appender.write({'domain': f'example{i % 2}.com', 'url': f'https://example{i % 2}.com/{i}',
+                            'status': 200 if i % 3 else 404, 'crawled_at': f'2024-01-0{i % 9 + 1}T12:00:00'})
+    assert appender.rows_written == 10
+    assert sorted(os.listdir(directory_path)) == ['domain=example0.com', 'domain=example1.com']
+
+    df = read_parquet(directory_path)
+    assert len(df) == 10
+    assert df['status'].dtype == np.int32
+    assert pd.api.types.is_datetime64_any_dtype(df['crawled_at'])
+
+    df = read_parquet(directory_path, columns=['url', 'status'],
+                      filters=[('domain', '=', 'example1.com'), ('status', '=', 404)])
+    assert list(df.columns) == ['url', 'status']
+    assert sorted(df['url']) == ['https://example1.com/3', 'https://example1.com/9']
+    batches = list(read_parquet(directory_path, columns=['url'], batch_size=2))
+    assert sum(len(batch) for batch in batches) == 10
+
+
+def test_parquet_appender_infers_schema(tmp_path):
+    pytest.importorskip('pyarrow')
+    directory_path = str(tmp_path / 'items')
+    with ParquetAppender(directory_path) as appender:
+        appender.write_rows([{'url': 'https://example.com/', 'emails': None, 'pages': 3}])
+        appender.flush()
+        appender.write({'url': 'https://example.org/', 'emails': 'info@example.org', 'pages': 4})
+    df = read_parquet(directory_path).sort_values('url')
+    assert df['emails'].tolist()[1] == 'info@example.org'
+    assert df['pages'].tolist() == [3, 4]
@@ -0,0 +1,63 @@
+import os
+
+from toolkit.google_search import (SerpCache, _unwrap_google_url, format_google_search_queries, get_google_search_url,
+                                   get_google_search_urls, parse_google_results, run_google_searches)
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'google_serp.html')
+
+
+def load_fixture():
+    with open(FIXTURE_PATH, encoding='utf-8') as file:
+        return file.read()
+
+
+def test_search_urls_with_pagination_and_site():
+    assert get_google_search_url('acme contact') == 'https://www.google.com/search?q=acme+contact'
+    queries = format_google_search_queries('"{company}" contact', [{'company': 'ACME'}, {'company': 'Globex'}])
+    urls = get_google_search_urls(queries, pages=2, site='linkedin.com')
+    assert [(query, page) for query, page, _ in urls] == [
+        ('site:linkedin.com "ACME" contact', 0), ('site:linkedin.com "ACME" contact', 1),
+        ('site:linkedin.com "Globex" contact', 0), ('site:linkedin.com "Globex" contact', 1),
+    ]
+    assert urls[1][2].endswith('&start=10')
+
+
+def test_parse_results_from_fixture():
+    results = parse_google_results(load_fixture())
+    assert [result['url'] for result in results] == [
+        'https://www.acme.com/contact',
+        'https://www.linkedin.com/company/acme',
+        'https://en.wikipedia.org/wiki/Acme_Corporation',
+    ]
+    assert [result['rank'] for result in results] == [1, 2, 3]
+    assert results[0]['title'] == 'Contact Us | ACME Corporation'
+    assert 'sales@acme.com' in results[0]['snippet']
+    assert results[2]['snippet'].startswith('The Acme Corporation is a fictional')
+
+
+def test_repeated_queries_are_served_from_cache(tmp_path):
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return load_fixture()
+
+    cache = SerpCache(str(tmp_path / 'serp.sqlite3'))
+    first = run_google_searches(['ACME  contact'], cache=cache, fetch=fetch)
+    second = run_google_searches(['acme contact'], cache=cache, fetch=fetch)
+    assert len(fetched) == 1
+    assert first['ACME  contact'] == second['acme contact']
+
+    # Ranks depend on the page size, so other page sizes are fetched again
+    run_google_searches(['acme contact'], results_per_page=20, cache=cache, fetch=fetch)
+    assert len(fetched) == 2
+
+    cache.ttl = -1
+    run_google_searches(['acme contact'], cache=cache, fetch=fetch)
+    assert len(fetched) == 3
+
+
+def test_links_to_google_are_skipped():
+    assert _unwrap_google_url('https://www.google.co.uk/maps') is None
+    assert _unwrap_google_url('/url?q=https://maps.google.com/place') is None
+    assert _unwrap_google_url('https://notgoogle.com/') == 'https://notgoogle.com/'
@@ -0,0 +1,61 @@
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies that only the functions needing them may import
+HEAVY_MODULES = {'bs4', 'dateutil', 'lxml', 'numpy', 'pandas', 'pyarrow', 'scrapy', 'tldextract', 'twisted', 'w3lib'}
+
+# Cumulative import time budgets in milliseconds, generous for slow machines and missing bytecode caches
+IMPORT_BUDGETS = {
+    'toolkit.cleaning': 150,
+    'toolkit.date': 150,
+    'toolkit.file': 150,
+    'toolkit.google_search': 400,
+    'toolkit.helpers': 150,
+    'toolkit.logger': 150,
+    'toolkit.parsers.text': 150,
+    'toolkit.parsers.web.attr': 150,
+    'toolkit.parsers.web.text': 150,
+    'toolkit.url': 150,
+}
+ALLOWED_MODULES = {'toolkit.google_search': {'lxml'}}
+
+
+def run_python(code, *options):
+    return subprocess.run([sys.executable, *options, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def get_import_times(module):
+    """
+    Imports a module in a new interpreter.
+
+    :param module: the module name
+    :returns: dictionary of the modules it imported to their cumulative import time in microseconds
+    """
+    times = {}
+    for line in run_python(f'import {module}', '-X', 'importtime').stderr.splitlines():
+        if line.startswith('import time:') and 'imported package' not in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize('module', sorted(IMPORT_BUDGETS))
+def test_import_time(module):
+    times = get_import_times(module)
+    heavy_modules = {name.split('.')[0] for name in times} & HEAVY_MODULES - ALLOWED_MODULES.get(module, set())
+    assert not heavy_modules, f"importing {module} imports {sorted(heavy_modules)}"
+    assert times[module] / 1000 <= IMPORT_BUDGETS[module]
+
+
+def test_imports_have_no_logging_side_effects():
+    code = ('import logging\n'
+            f'import {", ".join(IMPORT_BUDGETS)}\n'
+            'root = logging.getLogger()\n'
+            'print(len(root.handlers), root.level)')
+    assert run_python(code).stdout.split() == ['0', str(logging.WARNING)]
@@ -0,0 +1,94 @@
+import logging
+import logging.handlers
+import warnings
+
+import pytest
+
+from toolkit.logger import LOGGING_DEFAULT, configure_logging, get_logger, stop_queue_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.module, record.getMessage()))
+
+
+@pytest.fixture
+def handler():
+    handler = ListHandler()
+    logging.getLogger().addHandler(handler)
+    yield handler
+    stop_queue_logging()
+    logging.getLogger().removeHandler(handler)
+
+
+def test_logging_is_configured_once():
+    get_logger()
+    handlers = logging.getLogger().handlers[:]
+    get_logger()
+    assert logging.getLogger().handlers == handlers
+
+
+def test_suffixes_are_joined_lazily(handler):
+    get_logger(['job 1']).info("Saved %d items", 3, suffix=['example.com'])
+    get_logger().debug("Disabled %s", object(), suffix=['never formatted'])
+    assert handler.records == [('test_logger', 'Saved 3 items | job 1 | example.com')]
+
+
+def test_suffixed_messages_stay_strings(handler):
+    records = []
+    handler.addFilter(lambda record: records.append(record) or True)
+    get_logger().info("Saved %d%%", 100, suffix=['100% done'])
+    get_logger().info("Saved all", suffix=['100% done'])
+    assert all(isinstance(record.msg, str) for record in records)
+    assert [message for _, message in handler.records] == ['Saved 100% | 100% done', 'Saved all | 100% done']
+
+
+def test_sampled_logs(handler, monkeypatch):
+    logger = get_logger()
+    for i in range(7):
+        logger.info("Item %d", i, every=3)
+    now = [100.0]
+    monkeypatch.setattr('toolkit.logger.time.monotonic', lambda: now[0])
+    for i in range(5):
+        logger.warning("Failure %d", i, per_second=2)
+    now[0] += 1
+    logger.warning("Failure %d", 5, per_second=2)
+    assert [message for _, message in handler.records] == [
+        'Item 0', 'Item 3 | 2 similar messages skipped', 'Item 6 | 2 similar messages skipped',
+        'Failure 0', 'Failure 1', 'Failure 5 | 3 similar messages skipped']
+
+
+def test_queue_logging(handler):
+    config = {'version': 1, 'disable_existing_loggers': False, 'handlers': {'list': {'()': lambda: handler}},
+              'root': {'handlers': ['list'], 'level': 'INFO'}}
+    configure_logging(config, use_queue=True, force=True)
+    try:
+        root = logging.getLogger()
+        assert all(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers)
+        get_logger().info("Queued %d", 1)
+        stop_queue_logging()
+        assert handler.records == [('test_logger', 'Queued 1')]
+        assert root.handlers == [handler]
+    finally:
+        configure_logging(force=True)
+
+
+def test_options_replace_the_configuration_applied_on_first_use(monkeypatch):
+    monkeypatch.setattr('toolkit.logger._configured', False)
+    get_logger()
+    try:
+        configure_logging(use_queue=True)
+        assert all(isinstance(h, logging.handlers.QueueHandler) for h in logging.getLogger().handlers)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            configure_logging(use_queue=True)
+            configure_logging()
+        with pytest.warns(RuntimeWarning):
+            configure_logging(LOGGING_DEFAULT)
+        assert all(isinstance(h, logging.handlers.QueueHandler) for h in logging.getLogger().handlers)
+    finally:
+        configure_logging(force=True)
@@ -0,0 +1,152 @@
+import time
+from typing import Dict, Optional
+
+from toolkit.logger import logger
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures per host and short-circuits requests to hosts that look dead.
+
+    A host starts ``closed``. After ``threshold`` consecutive failures it becomes ``open`` and
+    requests are refused for ``cooldown`` seconds. Once the cool-down elapses the host is
+    ``half_open``: a single probe request is let through, and its outcome either closes the
+    circuit again or re-opens it for another cool-down period.
+
+    :param threshold: number of consecutive failures that trips the circuit for a host
+    :param cooldown: seconds to keep the circuit open before probing the host again
+    :param clock: callable returning the current time in seconds (overridable for tests)
+    :param get_name: callable returning the name of a host to log, e.g. to hide credentials
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold: int = 5, cooldown: float = 300.0, clock=time.monotonic, get_name=None):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.get_name = get_name or str
+        self.hosts: Dict[str, dict] = {}
+
+    def _get_host(self, host: str) -> dict:
+        """
+        Returns the state record for a host, creating it on first use.
+
+        :param host: the host name
+        :returns: the mutable state record of the host
+        """
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = {
+                'state': self.CLOSED,
+                'consecutive_failures': 0,
+                'failures': 0,
+                'successes': 0,
+                'short_circuited': 0,
+                'trips': 0,
+                'opened_at': None,
+                'probe_in_flight': False,
+            }
+        return state
+
+    def get_state(self, host: str) -> str:
+        """
+        Returns the current circuit state of a host, moving open circuits to half-open once
+        their cool-down has elapsed.
+
+        :param host: the host name
+        :returns: one of 'closed', 'open' or 'half_open'
+        """
+        state = self._get_host(host)
+        if state['state'] == self.OPEN and self.clock() - state['opened_at'] >= self.cooldown:
+            state['state'] = self.HALF_OPEN
+            state['probe_in_flight'] = False
+        return state['state']
+
+    def allow_request(self, host: str) -> bool:
+        """
+        Checks whether a request to the host may be sent. Refused requests are counted as
+        short-circuited.
+
+        :param host: the host name
+        :returns: True if the request may go through, False if it should be short-circuited
+        """
+        current_state = self.get_state(host)
+        state = self.hosts[host]
+        if current_state == self.CLOSED:
+            return True
+        if current_state == self.HALF_OPEN and not state['probe_in_flight']:
+            state['probe_in_flight'] = True
+            return True
+        state['short_circuited'] += 1
+        return False
+
+    def record_success(self, host: str) -> None:
+        """
+        Records a successful response from the host and closes its circuit.
+
+        :param host: the host name
+        """
+        state = self._get_host(host)
+        state['successes'] += 1
+        state['consecutive_failures'] = 0
+        if state['state'] != self.CLOSED:
+            logger.info("Circuit closed for host: %s", self.get_name(host))
+        state['state'] = self.CLOSED
+        state['probe_in_flight'] = False
+
+    def release_probe(self, host: str) -> None:
+        """
+        Lets another probe through a half-open circuit when the probe in flight ended without an
+        outcome, e.g. it was dropped by a middleware. It counts as neither a success nor a failure.
+
+        :param host: the host name
+        """
+        state = self._get_host(host)
+        if state['state'] == self.HALF_OPEN:
+            state['probe_in_flight'] = False
+
+    def record_failure(self, host: str) -> bool:
+        """
+        Records a failed request to the host, opening its circuit once the threshold is reached
+        or when a half-open probe fails.
+
+        :param host: the host name
+        :returns: True if this failure tripped the circuit, False otherwise
+        """
+        state = self._get_host(host)
+        state['failures'] += 1
+        state['consecutive_failures'] += 1
+        probe_failed = self.get_state(host) == self.HALF_OPEN and state['probe_in_flight']
+        if probe_failed or (state['state'] == self.CLOSED and state['consecutive_failures'] >= self.threshold):
+            self._trip(host, state)
+            return True
+        return False
+
+    def _trip(self, host: str, state: dict) -> None:
+        """
+        Opens the circuit of a host for a cool-down period.
+
+        :param host: the host name
+        :param state: the state record of the host
+        """
+        state['state'] = self.OPEN
+        state['opened_at'] = self.clock()
+        state['probe_in_flight'] = False
+        state['trips'] += 1
+        logger.warning("Circuit opened for host: %s after %d consecutive failures",
+                       self.get_name(host), state['consecutive_failures'])
+
+    def snapshot(self, host: Optional[str] = None) -> dict:
+        """
+        Returns the state and counters of one host, or of every known host.
+
+        :param host: the host name, or None for all hosts
+        :returns: a dictionary of counters for the host, or a dictionary of those keyed by host
+        """
+        if host is not None:
+            self.get_state(host)
+            return {key: value for key, value in self.hosts[host].items() if key != 'probe_in_flight'}
+        return {known_host: self.snapshot(known_host) for known_host in list(self.hosts)}
@@ -0,0 +1,167 @@
+from typing import Dict, Optional
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease controller for per-domain concurrency and delay.
+
+    Every observed response updates an exponentially weighted moving average of the latency and
+    of the bad-status rate of its domain. A domain is congested when a response is bad, when its
+    average bad-status rate exceeds ``error_threshold``, or when its average latency exceeds either
+    ``target_latency`` or ``latency_factor`` times its baseline latency. The baseline is a decaying
+    minimum: it drops to any lower latency at once and drifts back up towards the latencies seen
+    since by ``baseline_smoothing`` per response, so that one unusually fast response (a tiny,
+    cached or redirected page) does not make every later response look congested.
+
+    While the domain is healthy its delay shrinks by ``delay_step`` per response and, once the
+    delay is back to ``min_delay``, its concurrency grows by ``increase`` per window of responses
+    (a window being as many responses as the current concurrency). On congestion the concurrency
+    is multiplied by ``decrease_factor``; only a domain already at ``min_concurrency`` gets its
+    delay doubled, since any delay serialises the requests of a download slot. Decreases happen at
+    most once per window so that a burst of errors counts as one signal.
+
+    :param min_concurrency: lower bound of the per-domain concurrency
+    :param max_concurrency: upper bound of the per-domain concurrency
+    :param start_concurrency: concurrency given to a domain on first sight
+    :param target_latency: average latency in seconds above which a domain is considered congested
+    :param latency_factor: ratio to the baseline latency of a domain above which it is considered congested
+    :param error_threshold: average bad-status rate above which a domain is considered congested
+    :param increase: concurrency added per healthy window
+    :param decrease_factor: factor applied to the concurrency on congestion
+    :param min_delay: lower bound of the per-domain download delay in seconds
+    :param max_delay: upper bound of the per-domain download delay in seconds
+    :param delay_step: delay in seconds set on first congestion at minimum concurrency and removed per healthy response
+    :param smoothing: weight of the newest observation in the moving averages
+    :param baseline_smoothing: weight of a latency above the baseline in the decaying minimum
+    """
+
+    def __init__(self, min_concurrency: int = 1, max_concurrency: int = 32, start_concurrency: int = 8,
+                 target_latency: float = 5.0, latency_factor: float = 2.0, error_threshold: float = 0.2,
+                 increase: float = 1.0, decrease_factor: float = 0.5, min_delay: float = 0.0, max_delay: float = 30.0,
+                 delay_step: float = 0.25, smoothing: float = 0.2, baseline_smoothing: float = 0.05):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.start_concurrency = start_concurrency
+        self.target_latency = target_latency
+        self.latency_factor = latency_factor
+        self.error_threshold = error_threshold
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay_step = delay_step
+        self.smoothing = smoothing
+        self.baseline_smoothing = baseline_smoothing
+        self.domains: Dict[str, dict] = {}
+
+    def _get_domain(self, domain: str) -> dict:
+        """
+        Returns the state record for a domain, creating it on first use.
+
+        :param domain: the domain (download slot key)
+        :returns: the mutable state record of the domain
+        """
+        state = self.domains.get(domain)
+        if state is None:
+            state = self.domains[domain] = {
+                'concurrency': float(self.start_concurrency),
+                'delay': self.min_delay,
+                'latency': None,
+                'baseline_latency': None,
+                'error_rate': 0.0,
+                'responses': 0,
+                'bad_responses': 0,
+                'increases': 0,
+                'decreases': 0,
+                'since_decrease': 0,
+            }
+        return state
+
+    def get_concurrency(self, domain: str) -> int:
+        """
+        Returns the concurrency currently allowed for a domain.
+
+        :param domain: the domain (download slot key)
+        :returns: the number of parallel requests allowed for the domain
+        """
+        return int(self._get_domain(domain)['concurrency'])
+
+    def get_delay(self, domain: str) -> float:
+        """
+        Returns the download delay currently applied to a domain.
+
+        :param domain: the domain (download slot key)
+        :returns: the delay in seconds between requests to the domain
+        """
+        return self._get_domain(domain)['delay']
+
+    def observe(self, domain: str, latency: Optional[float], bad: bool) -> None:
+        """
+        Records the outcome of one request to a domain and adjusts its concurrency and delay.
+
+        :param domain: the domain (download slot key)
+        :param latency: the download latency in seconds, or None if unknown (e.g. the request failed)
+        :param bad: True if the outcome signals congestion, e.g. a 429 or 503 status or a timeout
+        """
+        state = self._get_domain(domain)
+        state['responses'] += 1
+        state['since_decrease'] += 1
+        if bad:
+            state['bad_responses'] += 1
+        state['error_rate'] += self.smoothing * (float(bad) - state['error_rate'])
+        if latency is not None:
+            state['latency'] = latency if state['latency'] is None else \
+                state['latency'] + self.smoothing * (latency - state['latency'])
+            baseline = state['baseline_latency']
+            state['baseline_latency'] = latency if baseline is None or latency < baseline else \
+                baseline + self.baseline_smoothing * (latency - baseline)
+
+        congested = bad or state['error_rate'] > self.error_threshold or self._is_slow(state)
+        if congested:
+            if state['since_decrease'] >= state['concurrency']:
+                self._decrease(state)
+        elif state['delay'] > self.min_delay:
+            state['delay'] = max(self.min_delay, state['delay'] - self.delay_step)
+        else:
+            state['concurrency'] = min(self.max_concurrency,
+                                       state['concurrency'] + self.increase / state['concurrency'])
+            state['increases'] += 1
+
+    def _is_slow(self, state: dict) -> bool:
+        """
+        Checks if the average latency of a domain indicates congestion.
+
+        :param state: the state record of the domain
+        :returns: True if the domain answers slower than the target or than its own baseline allows
+        """
+        if state['latency'] is None:
+            return False
+        return state['latency'] > self.target_latency or \
+            state['latency'] > self.latency_factor * state['baseline_latency']
+
+    def _decrease(self, state: dict) -> None:
+        """
+        Applies the multiplicative decrease to a congested domain.
+
+        :param state: the state record of the domain
+        """
+        if state['concurrency'] > self.min_concurrency:
+            state['concurrency'] = max(self.min_concurrency, state['concurrency'] * self.decrease_factor)
+        else:
+            state['delay'] = min(self.max_delay, max(state['delay'] * 2, self.delay_step))
+        state['decreases'] += 1
+        state['since_decrease'] = 0
+
+    def snapshot(self, domain: Optional[str] = None) -> dict:
+        """
+        Returns the controller state of one domain, or of every known domain.
+
+        :param domain: the domain, or None for all domains
+        :returns: a dictionary of values for the domain, or a dictionary of those keyed by domain
+        """
+        if domain is not None:
+            state = self._get_domain(domain)
+            snapshot = {key: value for key, value in state.items() if key != 'since_decrease'}
+            snapshot['concurrency'] = int(state['concurrency'])
+            return snapshot
+        return {known_domain: self.snapshot(known_domain) for known_domain in list(self.domains)}
@@ -0,0 +1,152 @@
+from typing import Callable, Iterable, Optional
+
+from toolkit.url import is_contact_page, parse_domain
+
+
+class DomainBudget:
+    """
+    Per-domain page budget with a pluggable "goal reached" predicate.
+
+    A domain is done once ``max_pages`` of its pages were downloaded, or once ``goal`` returned
+    True for one of its responses (or ``mark_goal_reached`` was called). Requests to a done
+    domain are refused and counted as pages saved.
+
+    :param max_pages: maximum number of pages downloaded per domain, 0 for no limit
+    :param goal: callable ``goal(response, state)`` returning True when the crawl of the
+                 domain of the response can stop; ``state`` is a per-domain dictionary the
+                 goal can use to accumulate data across pages
+    """
+
+    def __init__(self, max_pages: int = 0, goal: Optional[Callable] = None):
+        self.max_pages = max_pages
+        self.goal = goal
+        self.domains = {}
+
+    def _get_domain(self, domain: str) -> dict:
+        state = self.domains.get(domain)
+        if state is None:
+            state = self.domains[domain] = {'pages': 0, 'pages_saved': 0, 'done': None, 'goal_state': {}}
+        return state
+
+    def is_done(self, domain: str) -> bool:
+        """
+        Checks if the crawl of a domain is over.
+
+        :param domain: the domain
+        :returns: True if the domain reached its goal or exhausted its page budget
+        """
+        state = self.domains.get(domain)
+        return state is not None and state['done'] is not None
+
+    def allow_request(self, domain: str) -> bool:
+        """
+        Checks if a request to a domain may be downloaded, counting it as a page saved if not.
+
+        :param domain: the domain of the request
+        :returns: True if the request may be downloaded, False otherwise
+        """
+        if not self.is_done(domain):
+            return True
+        self.domains[domain]['pages_saved'] += 1
+        return False
+
+    def record_page(self, domain: str, response=None) -> bool:
+        """
+        Records a downloaded page and evaluates the goal on it.
+
+        :param domain: the domain of the page
+        :param response: the response, passed to the goal
+        :returns: True if this page ended the crawl of the domain, False otherwise
+        """
+        state = self._get_domain(domain)
+        if state['done'] is not None:
+            return False
+        state['pages'] += 1
+        if self.goal is not None and response is not None and self.goal(response, state['goal_state']):
+            state['done'] = 'goal_reached'
+        elif self.max_pages and state['pages'] >= self.max_pages:
+            state['done'] = 'max_pages'
+        return state['done'] is not None
+
+    def record_emails(self, domain: str, emails: Iterable[str]) -> bool:
+        """
+        Records the emails a spider extracted from a page of a domain and evaluates goals counting
+        them (see EmailsFoundGoal). Emails of other domains are ignored.
+
+        :param domain: the domain of the page
+        :param emails: the emails found on the page
+        :returns: True if these emails ended the crawl of the domain, False otherwise
+        """
+        state = self._get_domain(domain)
+        if state['done'] is not None:
+            return False
+        found = state['goal_state'].setdefault('emails', set())
+        found.update(email for email in emails if email.split('@')[-1] == domain)
+        is_reached = getattr(self.goal, 'is_reached', None)
+        if is_reached is not None and is_reached(state['goal_state']):
+            state['done'] = 'goal_reached'
+        return state['done'] is not None
+
+    def mark_goal_reached(self, domain: str) -> None:
+        """
+        Ends the crawl of a domain, e.g. from a spider callback that found what it was looking for.
+
+        :param domain: the domain
+        """
+        state = self._get_domain(domain)
+        if state['done'] is None:
+            state['done'] = 'goal_reached'
+
+    def snapshot(self) -> dict:
+        """
+        Returns the pages downloaded, the pages saved and the end reason of every domain.
+
+        :returns: dictionary of per-domain counters
+        """
+        return {domain: {'pages': state['pages'], 'pages_saved': state['pages_saved'], 'done': state['done']}
+                for domain, state in self.domains.items()}
+
+
+class EmailsFoundGoal:
+    """
+    Goal reached once ``count`` distinct emails of the domain itself were found on its pages.
+
+    Pages are not parsed again on the reactor thread: the goal counts the emails the spider
+    extracted itself and reported with ``BaseSpider.record_emails`` (or
+    ``DomainBudget.record_emails``), e.g. from the items of ``parse_in_pool``.
+
+    :param count: number of same-domain emails to find
+    """
+
+    def __init__(self, count: int = 1):
+        self.count = count
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.getint('DOMAIN_BUDGET_GOAL_EMAILS', 1))
+
+    def __call__(self, response, state):
+        return self.is_reached(state)
+
+    def is_reached(self, state):
+        return len(state.get('emails', ())) >= self.count
+
+
+class ContactPageGoal:
+    """
+    Goal reached once a contact page of the domain was downloaded (see ``toolkit.url.is_contact_page``).
+    """
+
+    def __call__(self, response, state):
+        return response.status == 200 and is_contact_page(response.url)
+
+
+def get_budget_domain(url: str) -> str:
+    """
+    Returns the domain a URL is budgeted under: its registered domain, so that subdomains share
+    a budget, or the host itself for IP addresses and local hosts.
+
+    :param url: the URL
+    :returns: the domain
+    """
+    return parse_domain(url).rstrip('.')
@@ -0,0 +1,236 @@
+import hashlib
+import math
+import os
+import sqlite3
+import struct
+import time
+from typing import Optional
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+from toolkit.logger import logger
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over byte strings.
+
+    The bit array is sized for ``capacity`` items at a false-positive rate of ``error_rate``
+    (m = -n ln p / ln(2)^2 bits and k = m / n ln 2 hash functions). The k bit positions are
+    derived from a single 128-bit BLAKE2b digest by double hashing.
+
+    :param capacity: number of items the filter is sized for
+    :param error_rate: false-positive rate expected once ``capacity`` items were added
+    """
+
+    HEADER = struct.Struct('>QdQIQ')
+
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _get_positions(self, item: bytes):
+        """
+        Yields the bit positions of an item.
+
+        :param item: the item
+        :returns: generator of bit positions
+        """
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, item: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._get_positions(item))
+
+    def add(self, item: bytes) -> bool:
+        """
+        Adds an item to the filter.
+
+        :param item: the item
+        :returns: True if the item was (probably) already present, False if it is new
+        """
+        bits = self.bits
+        present = True
+        for position in self._get_positions(item):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                present = False
+                bits[position >> 3] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    def save(self, file_path: str) -> None:
+        """
+        Writes the filter to a file, atomically replacing any previous version.
+
+        :param file_path: path of the file
+        """
+        temp_path = f"{file_path}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(self.HEADER.pack(self.capacity, self.error_rate, self.num_bits, self.num_hashes, self.count))
+            file.write(self.bits)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'BloomFilter':
+        """
+        Reads a filter written by ``save``.
+
+        :param file_path: path of the file
+        :returns: the Bloom filter
+        """
+        with open(file_path, 'rb') as file:
+            capacity, error_rate, num_bits, num_hashes, count = cls.HEADER.unpack(file.read(cls.HEADER.size))
+            bloom = cls.__new__(cls)
+            bloom.capacity, bloom.error_rate, bloom.num_bits, bloom.num_hashes, bloom.count = \
+                capacity, error_rate, num_bits, num_hashes, count
+            bloom.bits = bytearray(file.read())
+        if len(bloom.bits) != (num_bits + 7) // 8:
+            raise ValueError(f"Truncated Bloom filter file: {file_path}")
+        return bloom
+
+
+class BloomDupeFilter(RFPDupeFilter):
+    """
+    Request dupefilter backed by a Bloom filter instead of an in-memory set of fingerprints.
+
+    Requests are identified by the crawler's request fingerprinter, which hashes the method, the
+    body and the canonicalized URL (see ``w3lib.url.canonicalize_url``). On its own the Bloom
+    filter uses about 1.8 bytes per URL at a 0.1% false-positive rate, a false positive meaning
+    a new URL is wrongly dropped as a duplicate. With ``DUPEFILTER_EXACT`` enabled, every hit of
+    the Bloom filter is confirmed against an on-disk SQLite store of the exact fingerprints, so no
+    URL is ever wrongly dropped while memory stays bounded by the Bloom filter.
+
+    With a ``DUPEFILTER_PATH`` (or a ``JOBDIR``), the filter and the exact store are kept in that
+    directory and reloaded on the next run, which makes long crawls resumable. The exact store
+    requires such a directory. The filter is saved every ``DUPEFILTER_SAVE_INTERVAL`` seconds and
+    on close, so a killed crawl loses at most that much of it; with the exact store, fingerprints
+    missing from a stale filter are still found in the store and are not crawled again.
+
+    Settings: ``DUPEFILTER_BLOOM_CAPACITY`` (10,000,000), ``DUPEFILTER_BLOOM_ERROR_RATE`` (0.001),
+    ``DUPEFILTER_EXACT`` (False), ``DUPEFILTER_PATH`` (``JOBDIR`` by default),
+    ``DUPEFILTER_SAVE_INTERVAL`` (300 seconds).
+
+    :param path: directory in which the filter is persisted, or None to keep it in memory only
+    :param capacity: number of requests the Bloom filter is sized for
+    :param error_rate: false-positive rate of the Bloom filter at capacity
+    :param exact: if True, confirm Bloom filter hits against the exact on-disk fingerprint store
+    :param debug: if True, log every filtered request
+    :param fingerprinter: the request fingerprinter
+    :param save_interval: seconds between two saves of the filter
+    :param clock: callable returning the current time in seconds (overridable for tests)
+    """
+
+    BLOOM_FILE = 'requests.bloom'
+    EXACT_FILE = 'requests.sqlite3'
+    COMMIT_EVERY = 1000
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 10_000_000, error_rate: float = 0.001,
+                 exact: bool = False, debug: bool = False, fingerprinter=None, save_interval: float = 300.0,
+                 clock=time.monotonic):
+        if exact and not path:
+            raise ValueError("The exact dupefilter store needs a DUPEFILTER_PATH or a JOBDIR")
+        super().__init__(None, debug, fingerprinter=fingerprinter)
+        self.path = path
+        self.save_interval = save_interval
+        self.clock = clock
+        self.saved_at = clock()
+        self.bloom = None
+        if path:
+            os.makedirs(path, exist_ok=True)
+            bloom_path = os.path.join(path, self.BLOOM_FILE)
+            if os.path.exists(bloom_path):
+                self.bloom = BloomFilter.load(bloom_path)
+                logger.info("Loaded Bloom dupefilter with %d fingerprints from %s", self.bloom.count, bloom_path)
+                if (self.bloom.capacity, self.bloom.error_rate) != (capacity, error_rate):
+                    logger.warning("Loaded Bloom dupefilter has a capacity of %d and an error rate of %s, "
+                                   "not the configured %d and %s: delete %s to resize it",
+                                   self.bloom.capacity, self.bloom.error_rate, capacity, error_rate, bloom_path)
+        if self.bloom is None:
+            self.bloom = BloomFilter(capacity, error_rate)
+
+        self.db = None
+        self.pending = 0
+        if exact:
+            self.db = sqlite3.connect(os.path.join(path, self.EXACT_FILE))
+            self.db.execute('CREATE TABLE IF NOT EXISTS fingerprints (fingerprint BLOB PRIMARY KEY) WITHOUT ROWID')
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            settings.get('DUPEFILTER_PATH') or job_dir(settings),
+            capacity=settings.getint('DUPEFILTER_BLOOM_CAPACITY', 10_000_000),
+            error_rate=settings.getfloat('DUPEFILTER_BLOOM_ERROR_RATE', 0.001),
+            exact=settings.getbool('DUPEFILTER_EXACT', False),
+            debug=settings.getbool('DUPEFILTER_DEBUG'),
+            fingerprinter=crawler.request_fingerprinter,
+            save_interval=settings.getfloat('DUPEFILTER_SAVE_INTERVAL', 300.0),
+        )
+
+    def request_seen(self, request) -> bool:
+        return self.fingerprint_seen(self._fingerprint(request))
+
+    def fingerprint_seen(self, fingerprint: bytes) -> bool:
+        """
+        Checks a request fingerprint and records it.
+
+        :param fingerprint: the request fingerprint
+        :returns: True if the fingerprint was seen before, False otherwise
+        """
+        if self.path and self.clock() - self.saved_at >= self.save_interval:
+            self._save()
+        if not self.bloom.add(fingerprint):
+            # A Bloom filter miss is certain, unless the filter was saved before a crash and lacks
+            # fingerprints that the exact store already has
+            return self.db is not None and not self._store(fingerprint)
+        if self.db is None:
+            return True
+        # Bloom filter hit: confirm it against the exact store
+        if self.db.execute('SELECT 1 FROM fingerprints WHERE fingerprint = ?', (fingerprint,)).fetchone():
+            return True
+        self._store(fingerprint)
+        return False
+
+    def _store(self, fingerprint: bytes) -> bool:
+        """
+        Adds a fingerprint to the exact store, committing in batches.
+
+        :param fingerprint: the request fingerprint
+        :returns: True if the fingerprint was added, False if it was already stored
+        """
+        added = self.db.execute('INSERT OR IGNORE INTO fingerprints VALUES (?)', (fingerprint,)).rowcount > 0
+        self.pending += 1
+        if self.pending >= self.COMMIT_EVERY:
+            self.db.commit()
+            self.pending = 0
+        return added
+
+    def _save(self) -> None:
+        """
+        Commits the exact store, then saves the Bloom filter, so that the store is never behind it.
+        """
+        if self.db is not None:
+            self.db.commit()
+            self.pending = 0
+        self.bloom.save(os.path.join(self.path, self.BLOOM_FILE))
+        self.saved_at = self.clock()
+
+    def close(self, reason: str) -> None:
+        if self.path:
+            self._save()
+        if self.db is not None:
+            self.db.close()
+        if self.bloom.count > self.bloom.capacity:
+            logger.warning("Bloom dupefilter holds %d fingerprints, above its capacity of %d: "
+                           "its false-positive rate is now above %s",
+                           self.bloom.count, self.bloom.capacity, self.bloom.error_rate)
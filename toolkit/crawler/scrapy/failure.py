@@ -1,15 +1,51 @@
+import random
 
 import scrapy
+from scrapy.exceptions import IgnoreRequest
 from scrapy.spidermiddlewares.httperror import HttpError
 from twisted.internet.error import TCPTimedOutError, TimeoutError
 
 from toolkit.logger import logger
 
 
+RETRY_HTTP_CODES = [408, 429, 500, 502, 503, 504, 522, 524]
+
+
+class CircuitOpenError(IgnoreRequest):
+    """
+    Raised for requests that are short-circuited because the circuit of their host is open.
+    """
+
+
+class BudgetExhaustedError(IgnoreRequest):
+    """
+    Raised for requests dropped because the crawl of their domain reached its goal or page budget.
+    """
+
+
+class BackoffDelayedError(IgnoreRequest):
+    """
+    Raised for retry requests taken out of the downloader until their backoff delay elapsed; the
+    same request is scheduled again once it did.
+    """
+
+
 class FailureHandler:
     """
     Handles various types of request failures and creates appropriate responses.
 
+    Retryable failures (timeouts, connection errors and HTTP errors with a status in
+    ``FAILURE_RETRY_HTTP_CODES``) are retried up to ``FAILURE_RETRY_TIMES`` times with an
+    exponential, jittered backoff of ``FAILURE_RETRY_BACKOFF_BASE`` seconds, capped at
+    ``FAILURE_RETRY_BACKOFF_MAX`` seconds. The delay itself is applied by the
+    ``CircuitBreakerMiddleware``, which schedules the retried request again once it elapsed.
+
+    ``FAILURE_RETRY_TIMES`` defaults to ``RETRY_TIMES``, and the retries already made by Scrapy's
+    RetryMiddleware count against it: with both enabled, a request is attempted at most
+    ``1 + FAILURE_RETRY_TIMES`` times, not their product. As the RetryMiddleware retries at once
+    and errbacks only run once it gave up, disable it (``RETRY_ENABLED = False``) to get the
+    backoff on every retry.
+
     :param failure: the failure object containing error details
     :returns: a response object after handling the failure
     """
@@ -21,9 +57,24 @@ class FailureHandler:
 
         :param failure: the failure object containing error details
         :param spider: the spider instance calling this handler
-        :returns: a response object or calls spider's parse method with the appropriate response
+        :returns: a retry request, or a response object or calls spider's parse method with the appropriate response
         """
-        logger.info("Handling failure for request: %s", failure.request.url)
+        logger.info("Handling failure for request: %s", failure.request.url, per_second=10)
+
+        if failure.check(CircuitOpenError):
+            return FailureHandler._handle_circuit_open(failure.request, spider)
+
+        if failure.check(BudgetExhaustedError):
+            logger.debug("Domain budget exhausted, dropped %s", failure.request.url)
+            return None
+
+        if failure.check(BackoffDelayedError):
+            return None
+
+        if FailureHandler._is_retryable(failure, spider):
+            retry_request = FailureHandler._get_retry_request(failure.request, spider)
+            if retry_request is not None:
+                return retry_request
 
         if failure.check(HttpError):
             return FailureHandler._handle_http_error(failure, spider)
@@ -32,6 +83,53 @@ class FailureHandler:
         else:
             return FailureHandler._handle_generic_failure(failure, spider)
 
+    @staticmethod
+    def _is_retryable(failure, spider):
+        """
+        Checks if the failure is worth retrying.
+
+        :param failure: the failure object containing error details
+        :param spider: the spider instance calling this handler
+        :returns: True if the request should be retried, False otherwise
+        """
+        if failure.check(HttpError):
+            retry_http_codes = spider.settings.getlist('FAILURE_RETRY_HTTP_CODES', RETRY_HTTP_CODES)
+            return failure.value.response.status in [int(code) for code in retry_http_codes]
+        return not failure.check(IgnoreRequest)
+
+    @staticmethod
+    def _get_retry_request(request, spider):
+        """
+        Builds a copy of the failed request scheduled for another attempt after a backoff delay.
+
+        :param request: the original request object that failed
+        :param spider: the spider instance calling this handler
+        :returns: the retry request, or None if the retries are exhausted
+        """
+        settings = spider.settings
+        # Retries of Scrapy's RetryMiddleware count against the same limit, so the two never stack
+        retry_times = request.meta.get('failure_retry_times', 0) + request.meta.get('retry_times', 0)
+        max_retry_times = request.meta.get(
+            'max_failure_retry_times', settings.getint('FAILURE_RETRY_TIMES', settings.getint('RETRY_TIMES', 2)))
+        if retry_times >= max_retry_times:
+            logger.info("Gave up retrying %s after %d retries", request.url, retry_times)
+            return None
+
+        backoff = min(
+            settings.getfloat('FAILURE_RETRY_BACKOFF_MAX', 60.0),
+            settings.getfloat('FAILURE_RETRY_BACKOFF_BASE', 1.0) * 2 ** retry_times,
+        )
+        delay = random.uniform(backoff / 2, backoff)
+
+        retry_request = request.copy()
+        retry_request.meta['failure_retry_times'] = request.meta.get('failure_retry_times', 0) + 1
+        retry_request.meta['backoff_delay'] = delay
+        retry_request.dont_filter = True
+        spider.crawler.stats.inc_value('failure_retry/count')
+        logger.info("Retrying %s (retry %d of %d) in %.2f seconds",
+                    request.url, retry_times + 1, max_retry_times, delay)
+        return retry_request
+
     @staticmethod
     def _handle_http_error(failure, spider):
         """
@@ -60,6 +158,21 @@ class FailureHandler:
         )
         return spider.parse(fake_response)
 
+    @staticmethod
+    def _handle_circuit_open(request, spider):
+        """
+        Handles requests short-circuited by an open circuit breaker by creating a fake response.
+
+        :param request: the original request object that was short-circuited
+        :param spider: the spider instance calling this handler
+        :returns: a fake response with a 601 status indicating the host is considered down
+        """
+        logger.warning("Circuit open, skipped %s", request.url)
+        fake_response = scrapy.http.HtmlResponse(
+            url=request.url, status=601, body=b"Circuit open", request=request
+        )
+        return spider.parse(fake_response)
+
     @staticmethod
     def _handle_generic_failure(failure, spider):
         """
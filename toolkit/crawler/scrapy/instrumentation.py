@@ -0,0 +1,208 @@
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Optional, Sequence
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CPU_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with Prometheus semantics: bucket i counts the values <= bounds[i],
+    and the last, implicit bucket counts the values above every bound.
+
+    :param bounds: sorted upper bounds of the buckets
+    """
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Adds a value to the histogram.
+
+        :param value: the value
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def get_quantile(self, quantile: float) -> Optional[float]:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in.
+
+        :param quantile: the quantile, between 0 and 1
+        :returns: the estimated value, or None if the histogram is empty
+        """
+        if not self.count:
+            return None
+        rank = quantile * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        """
+        Returns the histogram as a dictionary.
+
+        :returns: dictionary with count, sum, mean, p50, p95, max and the per-bucket counts
+        """
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.get_quantile(0.5),
+            'p95': self.get_quantile(0.95),
+            'max': self.max,
+            'buckets': dict(zip([str(bound) for bound in self.bounds] + ['+Inf'], self.counts)),
+        }
+
+
+class DomainMetrics:
+    """
+    Download and parse metrics of a single domain.
+    """
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.callback_cpu_time = Histogram(CPU_TIME_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.statuses = Counter()
+        self.failures = Counter()
+
+    def snapshot(self) -> dict:
+        return {
+            'latency': self.latency.snapshot(),
+            'callback_cpu_time': self.callback_cpu_time.snapshot(),
+            'response_size': self.response_size.snapshot(),
+            'statuses': {str(status): count for status, count in self.statuses.items()},
+            'failures': dict(self.failures),
+        }
+
+
+class CrawlMetrics:
+    """
+    Per-domain crawl metrics: download latency, parse-callback CPU time and response size
+    histograms, status and failure class counters, plus the number of scraped items.
+
+    Comparing the latency with the callback CPU time and the item rate tells whether a crawl is
+    bound by downloads, by parsing, or by the item pipelines.
+
+    :param clock: time source used for the item rate
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started_at = clock()
+        self.domains = {}
+        self.items = 0
+        self.last_items = 0
+        self.last_time = self.started_at
+
+    def _get_domain(self, domain: str) -> DomainMetrics:
+        metrics = self.domains.get(domain)
+        if metrics is None:
+            metrics = self.domains[domain] = DomainMetrics()
+        return metrics
+
+    def record_response(self, domain: str, status: int, size: int, latency: Optional[float] = None) -> None:
+        """
+        Records a downloaded response.
+
+        :param domain: the domain of the request
+        :param status: the response status
+        :param size: the response body size in bytes
+        :param latency: the download latency in seconds, if known
+        """
+        metrics = self._get_domain(domain)
+        metrics.statuses[status] += 1
+        metrics.response_size.observe(size)
+        if latency is not None:
+            metrics.latency.observe(latency)
+
+    def record_failure(self, domain: str, exception: BaseException) -> None:
+        """
+        Records a failed download by exception class.
+
+        :param domain: the domain of the request
+        :param exception: the exception raised by the download
+        """
+        self._get_domain(domain).failures[type(exception).__name__] += 1
+
+    def record_callback(self, domain: str, cpu_time: float) -> None:
+        """
+        Records the CPU time spent in a parse callback.
+
+        :param domain: the domain of the response
+        :param cpu_time: the CPU time in seconds
+        """
+        self._get_domain(domain).callback_cpu_time.observe(cpu_time)
+
+    def record_item(self) -> None:
+        """
+        Records a scraped item.
+        """
+        self.items += 1
+
+    def snapshot(self) -> dict:
+        """
+        Returns all metrics, without side effects. The interval item rate covers the time since
+        the last call to ``start_interval``.
+
+        :returns: dictionary with the elapsed time, the item counts and rates and the per-domain metrics
+        """
+        now = self.clock()
+        elapsed = now - self.started_at
+        interval = now - self.last_time
+        return {
+            'timestamp': time.time(),
+            'elapsed': elapsed,
+            'items': self.items,
+            'items_per_second': self.items / elapsed if elapsed > 0 else 0.0,
+            'interval_items_per_second': (self.items - self.last_items) / interval if interval > 0 else 0.0,
+            'domains': {domain: metrics.snapshot() for domain, metrics in self.domains.items()},
+        }
+
+    def start_interval(self) -> None:
+        """
+        Starts a new interval for the interval item rate, e.g. after a periodic export.
+        """
+        self.last_items, self.last_time = self.items, self.clock()
+
+    def to_prometheus(self, prefix: str = 'crawl') -> str:
+        """
+        Renders the metrics in the Prometheus text exposition format.
+
+        :param prefix: prefix of the metric names
+        :returns: the metrics as text
+        """
+        lines = [f'# TYPE {prefix}_items_total counter', f'{prefix}_items_total {self.items}']
+        for name, unit in (('latency', 'seconds'), ('callback_cpu_time', 'seconds'), ('response_size', 'bytes')):
+            metric = f'{prefix}_{name}_{unit}'
+            lines.append(f'# TYPE {metric} histogram')
+            for domain, metrics in self.domains.items():
+                histogram = getattr(metrics, name)
+                cumulative = 0
+                for bound, count in zip(list(histogram.bounds) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{domain="{domain}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{domain="{domain}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{domain="{domain}"}} {histogram.count}')
+        for name, total, label in (('statuses', 'responses', 'status'), ('failures', 'failures', 'failure')):
+            metric = f'{prefix}_{total}_total'
+            lines.append(f'# TYPE {metric} counter')
+            for domain, metrics in self.domains.items():
+                for value, count in getattr(metrics, name).items():
+                    lines.append(f'{metric}{{domain="{domain}",{label}="{value}"}} {count}')
+        return '\n'.join(lines) + '\n'
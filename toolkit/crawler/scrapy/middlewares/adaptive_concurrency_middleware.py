@@ -0,0 +1,91 @@
+from scrapy import signals
+from twisted.internet.error import TCPTimedOutError, TimeoutError
+
+from toolkit.crawler.scrapy.concurrency import AimdController
+from toolkit.logger import logger
+
+
+CONGESTION_HTTP_CODES = [429, 503]
+
+
+class AdaptiveConcurrencyMiddleware:
+    """
+    Downloader middleware that tunes the concurrency and delay of every download slot (one per
+    domain) with an AIMD controller fed by the download latency and the congestion signals of the
+    domain: statuses in ``ADAPTIVE_CONCURRENCY_CONGESTION_HTTP_CODES`` and timeouts. Other error
+    statuses (404, 410, ...) are answers like any other, and other download errors (DNS lookups,
+    refused connections) say nothing about the load of the domain, so they are not observed.
+
+    Settings (with defaults):
+
+    - ``ADAPTIVE_CONCURRENCY_MIN`` (1) / ``ADAPTIVE_CONCURRENCY_MAX`` (32): concurrency bounds
+    - ``ADAPTIVE_CONCURRENCY_START``: initial concurrency, ``CONCURRENT_REQUESTS_PER_DOMAIN`` by default
+    - ``ADAPTIVE_CONCURRENCY_TARGET_LATENCY`` (5.0): average latency in seconds treated as congestion
+    - ``ADAPTIVE_CONCURRENCY_LATENCY_FACTOR`` (2.0): ratio to a domain's lowest latency treated as congestion
+    - ``ADAPTIVE_CONCURRENCY_ERROR_THRESHOLD`` (0.2): average congestion signal rate treated as congestion
+    - ``ADAPTIVE_CONCURRENCY_CONGESTION_HTTP_CODES`` ([429, 503]): statuses treated as congestion signals
+    - ``ADAPTIVE_CONCURRENCY_DECREASE_FACTOR`` (0.5): multiplicative decrease on congestion
+    - ``ADAPTIVE_CONCURRENCY_MAX_DELAY`` (30.0) / ``ADAPTIVE_CONCURRENCY_DELAY_STEP`` (0.25): delay bounds
+
+    ``CONCURRENT_REQUESTS`` still caps the total, so it should be at least a few times
+    ``ADAPTIVE_CONCURRENCY_MAX``. The controller is exposed on the spider as
+    ``spider.concurrency_controller`` and its per-domain snapshot is logged when the spider closes.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.congestion_http_codes = {int(code) for code in
+                                      settings.getlist('ADAPTIVE_CONCURRENCY_CONGESTION_HTTP_CODES',
+                                                       CONGESTION_HTTP_CODES)}
+        self.controller = AimdController(
+            min_concurrency=settings.getint('ADAPTIVE_CONCURRENCY_MIN', 1),
+            max_concurrency=settings.getint('ADAPTIVE_CONCURRENCY_MAX', 32),
+            start_concurrency=settings.getint('ADAPTIVE_CONCURRENCY_START',
+                                              settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')),
+            target_latency=settings.getfloat('ADAPTIVE_CONCURRENCY_TARGET_LATENCY', 5.0),
+            latency_factor=settings.getfloat('ADAPTIVE_CONCURRENCY_LATENCY_FACTOR', 2.0),
+            error_threshold=settings.getfloat('ADAPTIVE_CONCURRENCY_ERROR_THRESHOLD', 0.2),
+            decrease_factor=settings.getfloat('ADAPTIVE_CONCURRENCY_DECREASE_FACTOR', 0.5),
+            min_delay=settings.getfloat('DOWNLOAD_DELAY'),
+            max_delay=settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_DELAY', 30.0),
+            delay_step=settings.getfloat('ADAPTIVE_CONCURRENCY_DELAY_STEP', 0.25),
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_response(self, request, response, spider=None):
+        self._observe(request, request.meta.get('download_latency'), response.status in self.congestion_http_codes)
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        if isinstance(exception, (TimeoutError, TCPTimedOutError)):
+            self._observe(request, None, True)
+
+    def _observe(self, request, latency, bad):
+        """
+        Feeds one outcome to the controller and applies the new limits to the download slot.
+
+        :param request: the request the outcome belongs to
+        :param latency: the download latency in seconds, or None if unknown
+        :param bad: True if the outcome signals congestion
+        """
+        key = request.meta.get('download_slot')
+        if key is None:
+            return
+        self.controller.observe(key, latency, bad)
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is not None:
+            slot.concurrency = self.controller.get_concurrency(key)
+            slot.delay = self.controller.get_delay(key)
+
+    def spider_opened(self, spider):
+        spider.concurrency_controller = self.controller
+
+    def spider_closed(self, spider):
+        logger.info("Adaptive concurrency per domain: %s", self.controller.snapshot())
@@ -0,0 +1,119 @@
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.utils.httpobj import urlparse_cached
+
+from toolkit.crawler.scrapy.circuit_breaker import CircuitBreaker
+from toolkit.crawler.scrapy.failure import RETRY_HTTP_CODES, BackoffDelayedError, CircuitOpenError
+from toolkit.logger import logger
+
+
+class CircuitBreakerMiddleware:
+    """
+    Downloader middleware that applies the retry backoff requested by the FailureHandler and
+    short-circuits requests to hosts whose circuit is open.
+
+    Outcomes are recorded per host: responses with a status in ``FAILURE_RETRY_HTTP_CODES`` and
+    download exceptions count as failures, every other response counts as a success. The
+    breaker is configured with ``CIRCUIT_BREAKER_THRESHOLD`` and ``CIRCUIT_BREAKER_COOLDOWN`` and
+    exposed on the spider as ``spider.circuit_breaker``.
+
+    Enable it with a priority above the built-in RetryMiddleware (550) so it sees download
+    exceptions before they are retried, e.g. ``{'...CircuitBreakerMiddleware': 560}``.
+
+    Retries are not delayed inside the downloader, where they would each hold one of the
+    ``CONCURRENT_REQUESTS`` slots while sleeping: a request with a ``backoff_delay`` is dropped
+    with BackoffDelayedError (ignored by the FailureHandler) and handed back to the engine once
+    the delay elapsed. The spider is kept open while such retries are waiting.
+
+    A half-open probe that ends without an outcome (dropped with an IgnoreRequest, e.g. by the
+    DomainBudgetMiddleware) is released, so that the next request probes the host again.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.delayed_calls = set()
+        self.retry_http_codes = {int(code) for code in settings.getlist('FAILURE_RETRY_HTTP_CODES', RETRY_HTTP_CODES)}
+        self.breaker = CircuitBreaker(
+            threshold=settings.getint('CIRCUIT_BREAKER_THRESHOLD', 5),
+            cooldown=settings.getfloat('CIRCUIT_BREAKER_COOLDOWN', 300.0),
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.spider_idle, signal=signals.spider_idle)
+        return s
+
+    def process_request(self, request, spider=None):
+        delay = request.meta.pop('backoff_delay', None)
+        if delay:
+            self._delay(request, delay)
+            self.stats.inc_value('circuit_breaker/delayed')
+            raise BackoffDelayedError(f"Retry delayed by {delay:.2f} seconds: {request.url}")
+
+        host = urlparse_cached(request).hostname
+        # Retries copy the meta of the request, so the probe flag of an earlier attempt is reset
+        request.meta.pop('circuit_breaker_probe', None)
+        if not self.breaker.allow_request(host):
+            self.stats.inc_value('circuit_breaker/short_circuited')
+            raise CircuitOpenError(f"Circuit open for host: {host}")
+        if self.breaker.get_state(host) == CircuitBreaker.HALF_OPEN:
+            request.meta['circuit_breaker_probe'] = True
+
+    def process_response(self, request, response, spider=None):
+        host = urlparse_cached(request).hostname
+        request.meta.pop('circuit_breaker_probe', None)
+        if response.status in self.retry_http_codes:
+            self._record_failure(host)
+        else:
+            self.breaker.record_success(host)
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        host = urlparse_cached(request).hostname
+        is_probe = request.meta.pop('circuit_breaker_probe', False)
+        if not isinstance(exception, IgnoreRequest):
+            self._record_failure(host)
+        elif is_probe:
+            self.breaker.release_probe(host)
+
+    def _delay(self, request, delay):
+        """
+        Hands a request back to the engine after a delay.
+
+        :param request: the request
+        :param delay: the delay in seconds
+        """
+        from twisted.internet import reactor
+
+        def crawl():
+            self.delayed_calls.discard(call)
+            self.crawler.engine.crawl(request)
+
+        call = reactor.callLater(delay, crawl)
+        self.delayed_calls.add(call)
+
+    def _record_failure(self, host):
+        if self.breaker.record_failure(host):
+            self.stats.inc_value('circuit_breaker/trips')
+
+    def spider_opened(self, spider):
+        spider.circuit_breaker = self.breaker
+
+    def spider_idle(self, spider):
+        if self.delayed_calls:
+            raise DontCloseSpider
+
+    def spider_closed(self, spider):
+        for call in self.delayed_calls:
+            if call.active():
+                call.cancel()
+        self.delayed_calls.clear()
+        open_hosts = [host for host, state in self.breaker.snapshot().items()
+                      if state['state'] != CircuitBreaker.CLOSED]
+        logger.info("Circuit breaker closed with %d of %d hosts not closed: %s",
+                    len(open_hosts), len(self.breaker.hosts), open_hosts)
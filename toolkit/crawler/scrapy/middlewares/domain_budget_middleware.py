@@ -0,0 +1,65 @@
+from scrapy import signals
+from scrapy.utils.misc import build_from_crawler, load_object
+
+from toolkit.crawler.scrapy.domain_budget import DomainBudget, get_budget_domain
+from toolkit.crawler.scrapy.failure import BudgetExhaustedError
+from toolkit.logger import logger
+
+
+class DomainBudgetMiddleware:
+    """
+    Downloader middleware that ends the crawl of a domain once it downloaded
+    ``DOMAIN_BUDGET_MAX_PAGES`` pages (0, no limit) or once its ``DOMAIN_BUDGET_GOAL`` is reached.
+
+    The goal is a callable ``goal(response, state)``, or the import path of one; classes are
+    built with ``from_crawler`` when they define it. Built-in goals live in
+    ``toolkit.crawler.scrapy.domain_budget``: ``EmailsFoundGoal`` (``DOMAIN_BUDGET_GOAL_EMAILS``
+    same-domain emails reported by the spider with ``spider.record_emails(response, emails)``)
+    and ``ContactPageGoal``. Spiders can also end a domain themselves
+    with ``spider.domain_budget.mark_goal_reached(domain)``.
+
+    Scrapy's scheduler cannot remove queued requests, so the pending requests of a done domain
+    are dropped as they leave the scheduler, before they are downloaded, by raising
+    BudgetExhaustedError (ignored by the FailureHandler). The pages saved per domain are logged
+    when the spider closes.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.stats = crawler.stats
+        goal = settings.get('DOMAIN_BUDGET_GOAL')
+        if isinstance(goal, str):
+            goal = load_object(goal)
+        if isinstance(goal, type):
+            goal = build_from_crawler(goal, crawler) if hasattr(goal, 'from_crawler') else goal()
+        self.budget = DomainBudget(max_pages=settings.getint('DOMAIN_BUDGET_MAX_PAGES', 0), goal=goal)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider=None):
+        domain = get_budget_domain(request.url)
+        if not self.budget.allow_request(domain):
+            self.stats.inc_value('domain_budget/pages_saved')
+            raise BudgetExhaustedError(f"Crawl of {domain} is done: {request.url}")
+
+    def process_response(self, request, response, spider=None):
+        domain = get_budget_domain(request.url)
+        if self.budget.record_page(domain, response):
+            state = self.budget.domains[domain]
+            self.stats.inc_value(f"domain_budget/{state['done']}")
+            logger.info("Crawl of %s is done after %d pages (%s)", domain, state['pages'], state['done'])
+        return response
+
+    def spider_opened(self, spider):
+        spider.domain_budget = self.budget
+
+    def spider_closed(self, spider):
+        for domain, state in self.budget.snapshot().items():
+            if state['done']:
+                logger.info("Domain budget of %s: %d pages downloaded, %d pages saved (%s)",
+                            domain, state['pages'], state['pages_saved'], state['done'])
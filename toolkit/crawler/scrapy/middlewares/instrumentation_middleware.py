@@ -0,0 +1,166 @@
+import json
+import os
+import time
+
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet.task import LoopingCall
+
+from toolkit.crawler.scrapy.instrumentation import CrawlMetrics
+from toolkit.logger import logger
+
+
+class InstrumentationMiddleware:
+    """
+    Downloader middleware that records per-domain download latency, response size, status and
+    failure class into a CrawlMetrics, exposed on the spider as ``spider.crawl_metrics``, and
+    counts the scraped items. Add the CallbackTimingMiddleware to ``SPIDER_MIDDLEWARES`` to also
+    record the CPU time of the parse callbacks.
+
+    Every ``INSTRUMENTATION_EXPORT_INTERVAL`` seconds (60) the metrics are written to
+    ``INSTRUMENTATION_EXPORT_PATH``, either appended as a JSON line or, with
+    ``INSTRUMENTATION_EXPORT_FORMAT = 'prometheus'``, as a Prometheus text file. A summary is
+    logged when the spider closes.
+
+    The middleware is only loaded with ``INSTRUMENTATION_ENABLED = True``, so it costs nothing
+    when disabled.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.metrics = CrawlMetrics()
+        self.export_path = settings.get('INSTRUMENTATION_EXPORT_PATH')
+        self.export_format = settings.get('INSTRUMENTATION_EXPORT_FORMAT', 'jsonl')
+        self.export_interval = settings.getfloat('INSTRUMENTATION_EXPORT_INTERVAL', 60.0)
+        self.task = None
+        if self.export_format not in ('jsonl', 'prometheus'):
+            raise NotConfigured(f"Unknown INSTRUMENTATION_EXPORT_FORMAT: {self.export_format}")
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('INSTRUMENTATION_ENABLED', False):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
+        return s
+
+    def process_response(self, request, response, spider=None):
+        self.metrics.record_response(urlparse_cached(request).hostname, response.status, len(response.body),
+                                     request.meta.get('download_latency'))
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        if not isinstance(exception, IgnoreRequest):
+            self.metrics.record_failure(urlparse_cached(request).hostname, exception)
+
+    def item_scraped(self, item, spider):
+        self.metrics.record_item()
+
+    def export(self):
+        """
+        Writes the current metrics to the export file.
+        """
+        try:
+            if self.export_format == 'prometheus':
+                temp_path = f"{self.export_path}.tmp"
+                with open(temp_path, 'w') as file:
+                    file.write(self.metrics.to_prometheus())
+                os.replace(temp_path, self.export_path)
+            else:
+                with open(self.export_path, 'a') as file:
+                    file.write(json.dumps(self.metrics.snapshot()) + '\n')
+                self.metrics.start_interval()
+        except OSError as e:
+            logger.error("Could not export crawl metrics to %s: %s", self.export_path, e)
+
+    def spider_opened(self, spider):
+        spider.crawl_metrics = self.metrics
+        if self.export_path and self.export_interval > 0:
+            self.task = LoopingCall(self.export)
+            self.task.start(self.export_interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.task and self.task.running:
+            self.task.stop()
+        if self.export_path:
+            self.export()
+
+        snapshot = self.metrics.snapshot()
+        logger.info("Crawl metrics: %d items in %.1f seconds (%.2f items/s)",
+                    snapshot['items'], snapshot['elapsed'], snapshot['items_per_second'])
+        for domain, metrics in snapshot['domains'].items():
+            latency, cpu_time, size = metrics['latency'], metrics['callback_cpu_time'], metrics['response_size']
+            logger.info("Crawl metrics for %s: %d responses, latency p50 %s p95 %s s, callback CPU mean %s s, "
+                        "mean size %s bytes, statuses %s, failures %s",
+                        domain, size['count'], _round(latency['p50']), _round(latency['p95']), _round(cpu_time['mean']),
+                        _round(size['mean']), metrics['statuses'], metrics['failures'])
+        self.crawler.stats.set_value('instrumentation/items_per_second', snapshot['items_per_second'])
+
+
+class CallbackTimingMiddleware:
+    """
+    Spider middleware that records the CPU time spent in the parse callbacks into the
+    ``spider.crawl_metrics`` set by the InstrumentationMiddleware. The time spent producing each
+    output of a callback is measured, so generator callbacks are fully accounted for.
+
+    Enable it with a priority above every other spider middleware so it wraps the callback
+    output first, e.g. ``{'...CallbackTimingMiddleware': 950}``, and with
+    ``INSTRUMENTATION_ENABLED = True``.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('INSTRUMENTATION_ENABLED', False):
+            raise NotConfigured
+        return cls(crawler)
+
+    def _get_metrics(self):
+        return getattr(self.crawler.spider, 'crawl_metrics', None)
+
+    def process_spider_output(self, response, result, spider=None):
+        metrics = self._get_metrics()
+        if metrics is None:
+            yield from result
+            return
+        cpu_time = 0.0
+        iterator = iter(result)
+        while True:
+            start = time.process_time()
+            try:
+                output = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                cpu_time += time.process_time() - start
+            yield output
+        metrics.record_callback(urlparse_cached(response).hostname, cpu_time)
+
+    async def process_spider_output_async(self, response, result, spider=None):
+        metrics = self._get_metrics()
+        if metrics is None:
+            async for output in result:
+                yield output
+            return
+        cpu_time = 0.0
+        iterator = result.__aiter__()
+        while True:
+            start = time.process_time()
+            try:
+                output = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                cpu_time += time.process_time() - start
+            yield output
+        metrics.record_callback(urlparse_cached(response).hostname, cpu_time)
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
@@ -6,49 +6,94 @@
 from os import getenv
 
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.httpobj import urlparse_cached
 
+from toolkit.crawler.scrapy.proxy_pool import ProxyPool, get_proxy_name
 from toolkit.logger import logger
 
 
+# Deprecated: the ScraperAPI gateway is no longer configured here, list it in PROXY_LIST instead,
+# e.g. f'http://{PROXY_USER}:{PROXY_KEY}@{PROXY_HOST}'. Kept for existing imports.
 PROXY_USER = 'scraperapi'
 PROXY_KEY = getenv('SCRAPER_API_KEY')
 PROXY_HOST = 'proxy-server.scraperapi.com:8001'
 
+# Proxy-level signals only: 5xx statuses come from the target site, and counting them would
+# let one failing site eject every proxy of the pool
+PROXY_BAN_HTTP_CODES = [403, 407, 429]
+
 
 class ProxyMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the downloader middleware does not modify the
     # passed objects.
+    #
+    # Proxies are read from the PROXY_LIST setting (list of proxy URLs) or from
+    # the PROXY_LIST_FILE setting (one proxy URL per line). Without either, no
+    # proxy is assigned. Related settings: PROXY_MAX_FAILURES (3),
+    # PROXY_REPROBE_INTERVAL (120 seconds), PROXY_STICKY_SESSIONS (False) and
+    # PROXY_BAN_HTTP_CODES (statuses counted as proxy failures). Enable it with a
+    # priority below the built-in HttpProxyMiddleware (750) so the proxy it sets is used.
+
+    def __init__(self, pool=None, ban_http_codes=None, stats=None):
+        self.pool = pool or ProxyPool([])
+        self.ban_http_codes = set(ban_http_codes or PROXY_BAN_HTTP_CODES)
+        self.stats = stats
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        settings = crawler.settings
+        pool_kwargs = {
+            'max_failures': settings.getint('PROXY_MAX_FAILURES', 3),
+            'reprobe_interval': settings.getfloat('PROXY_REPROBE_INTERVAL', 120.0),
+            'sticky': settings.getbool('PROXY_STICKY_SESSIONS', False),
+        }
+        if settings.get('PROXY_LIST_FILE'):
+            pool = ProxyPool.from_file(settings.get('PROXY_LIST_FILE'), **pool_kwargs)
+        else:
+            pool = ProxyPool(settings.getlist('PROXY_LIST'), **pool_kwargs)
+        ban_http_codes = [int(code) for code in settings.getlist('PROXY_BAN_HTTP_CODES', PROXY_BAN_HTTP_CODES)]
+        s = cls(pool, ban_http_codes, crawler.stats)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
-    def process_request(self, request, spider):
-        # Select a random proxy
+    def process_request(self, request, spider=None):
+        # Select a proxy from the pool
         try:
-            if request.meta.get('url'):
+            if not request.meta.get('url'):
+                request.meta['url'] = request.url
+            # Requests with a proxy set by the caller keep it
+            if request.meta.get('proxy') and 'proxy_pool_proxy' not in request.meta:
                 return
-            proxy_url = f'http://{PROXY_USER}:{PROXY_KEY}@{PROXY_HOST}'
-            request.meta['url'] = request.url
-            # logger.info(f"Adding proxy: {proxy_url}")
-            # request.meta['proxy'] = proxy_url
+            proxy_url, is_probe = self.pool.acquire(urlparse_cached(request).hostname)
+            if proxy_url:
+                request.meta['proxy'] = proxy_url
+                request.meta['proxy_pool_proxy'] = proxy_url
+                # Retries copy the meta of the request, so the flag of an earlier attempt is overwritten
+                request.meta['proxy_pool_probe'] = is_probe
         except Exception as e:
             logger.exception(e)
 
-    def process_response(self, request, response, spider):
+    def process_response(self, request, response, spider=None):
         # Called with the response returned from the downloader.
 
         # Must either;
         # - return a Response object
         # - return a Request object
         # - or raise IgnoreRequest
+        proxy_url = request.meta.get('proxy_pool_proxy')
+        request.meta.pop('proxy_pool_probe', None)
+        if proxy_url:
+            if response.status in self.ban_http_codes:
+                self.pool.record_failure(proxy_url)
+            else:
+                self.pool.record_success(proxy_url, request.meta.get('download_latency'))
         return response
 
-    def process_exception(self, request, exception, spider):
+    def process_exception(self, request, exception, spider=None):
         # Called when a download handler or a process_request()
         # (from other downloader middleware) raises an exception.
 
@@ -56,7 +101,28 @@ class ProxyMiddleware:
         # - return None: continue processing this exception
         # - return a Response object: stops process_exception() chain
         # - return a Request object: stops process_exception() chain
-        pass
+        proxy_url = request.meta.get('proxy_pool_proxy')
+        is_probe = request.meta.pop('proxy_pool_probe', False)
+        if not proxy_url:
+            return
+        if not isinstance(exception, IgnoreRequest):
+            self.pool.record_failure(proxy_url)
+        elif is_probe:
+            # Dropped requests (e.g. CircuitOpenError, BudgetExhaustedError) tell nothing about the proxy
+            self.pool.release(proxy_url)
 
     def spider_opened(self, spider):
+        spider.proxy_pool = self.pool
         spider.logger.info("Spider opened: %s" % spider.name)
+
+    def spider_closed(self, spider):
+        name_counts = {}
+        for proxy_url, proxy_stats in self.pool.snapshot().items():
+            # Names hide passwords, proxies differing by their password only are numbered
+            name = get_proxy_name(proxy_url)
+            name_counts[name] = name_counts.get(name, 0) + 1
+            proxy_name = name if name_counts[name] == 1 else f"{name}#{name_counts[name]}"
+            logger.info("Proxy %s: %s", proxy_name, proxy_stats)
+            if self.stats:
+                for key in ('requests', 'successes', 'failures', 'ejections'):
+                    self.stats.set_value(f'proxy_pool/{proxy_name}/{key}', proxy_stats[key])
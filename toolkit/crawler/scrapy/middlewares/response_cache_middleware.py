@@ -0,0 +1,101 @@
+from scrapy import signals
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+
+from toolkit.crawler.scrapy.response_cache import ResponseCache
+from toolkit.logger import logger
+
+
+class ResponseCacheMiddleware:
+    """
+    Downloader middleware that keeps GET responses in a compressed on-disk ResponseCache and
+    revalidates them with conditional requests on recrawls.
+
+    A request with a cached entry is sent with ``If-None-Match`` / ``If-Modified-Since`` built from
+    the cached ETag / Last-Modified. A 304 answer is replaced by the cached response, and both
+    that response and a 200 whose body is identical to the cached one carry the 'unchanged' flag
+    (see ``BaseSpider.is_unchanged``) so spiders can skip re-parsing them. Requests with
+    ``meta['dont_cache']`` are left alone.
+
+    Settings: ``RESPONSE_CACHE_DIR`` ('.response_cache'), ``RESPONSE_CACHE_MAX_BYTES`` (1 GiB of
+    compressed bodies) and ``RESPONSE_CACHE_COMPRESSION_LEVEL`` (6). Enable it next to where the
+    built-in HttpCacheMiddleware sits (900) so it stores bodies before decompression, and keep
+    HTTPCACHE_ENABLED off.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.cache = ResponseCache(
+            settings.get('RESPONSE_CACHE_DIR', '.response_cache'),
+            max_bytes=settings.getint('RESPONSE_CACHE_MAX_BYTES', 1024 ** 3),
+            compression_level=settings.getint('RESPONSE_CACHE_COMPRESSION_LEVEL', 6),
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider=None):
+        if request.method != 'GET' or request.meta.get('dont_cache'):
+            return
+        fingerprint = self.crawler.request_fingerprinter.fingerprint(request).hex()
+        request.meta['response_cache_fingerprint'] = fingerprint
+        entry = self.cache.get(fingerprint)
+        if entry is None:
+            self._inc_stat('misses')
+            return
+        if entry['etag'] and b'If-None-Match' not in request.headers:
+            request.headers['If-None-Match'] = entry['etag']
+        if entry['last_modified'] and b'If-Modified-Since' not in request.headers:
+            request.headers['If-Modified-Since'] = entry['last_modified']
+
+    def process_response(self, request, response, spider=None):
+        fingerprint = request.meta.get('response_cache_fingerprint')
+        if fingerprint is None:
+            return response
+
+        entry = self.cache.get(fingerprint)
+        if response.status == 304 and entry:
+            body = self.cache.get_body(fingerprint, entry['body_hash'])
+            if body is None:
+                # The cached body is gone, fetch the page again without validators
+                retry_request = request.replace(dont_filter=True)
+                retry_request.headers.pop(b'If-None-Match', None)
+                retry_request.headers.pop(b'If-Modified-Since', None)
+                retry_request.meta['dont_cache'] = True
+                return retry_request
+            self._inc_stat('hits')
+            self._inc_stat('unchanged')
+            self._inc_stat('bytes_saved', len(body))
+            headers = Headers(entry['headers'])
+            response_cls = responsetypes.from_args(headers=headers, url=entry['url'], body=body)
+            return response_cls(url=entry['url'], status=entry['status'], headers=headers, body=body,
+                                flags=['cached', 'unchanged'], request=request)
+
+        if response.status == 200:
+            headers = {key.decode('latin-1'): [value.decode('latin-1') for value in values]
+                       for key, values in response.headers.items()}
+            body_hash = self.cache.store(fingerprint, response.url, response.status, headers, response.body)
+            if entry and entry['body_hash'] == body_hash:
+                self._inc_stat('unchanged')
+                return response.replace(flags=response.flags + ['unchanged'])
+        return response
+
+    def _inc_stat(self, key, count=1):
+        """
+        Increments a cache counter both on the cache and in the crawl stats.
+
+        :param key: the counter name
+        :param count: the increment
+        """
+        self.cache.stats[key] += count
+        self.crawler.stats.inc_value(f'response_cache/{key}', count)
+
+    def spider_closed(self, spider):
+        stats = dict(self.cache.stats, entries=len(self.cache), size=self.cache.get_size())
+        self.crawler.stats.set_value('response_cache/evictions', stats['evictions'])
+        logger.info("Response cache: %s", stats)
+        self.cache.close()
@@ -0,0 +1,110 @@
+import hashlib
+import re
+from typing import Optional
+
+import numpy as np
+
+SIMHASH_BITS = 64
+# Below this many words, pages (empty, JavaScript-only shells, soft errors) carry too little text to compare
+MIN_WORDS = 20
+_WORD_PATTERN = re.compile(r'\w+')
+
+
+def get_simhash(text: str, shingle_size: int = 3, min_words: int = MIN_WORDS) -> Optional[int]:
+    """
+    Computes the 64-bit SimHash of a text over its word shingles: texts that share most of their
+    shingles get fingerprints that differ in only a few bits.
+
+    :param text: the text
+    :param shingle_size: the number of words per shingle
+    :param min_words: the minimum number of words of a text to fingerprint
+    :returns: the SimHash as an unsigned 64-bit integer, or None if the text has fewer than min_words words
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if not words or len(words) < min_words:
+        return None
+    if len(words) < shingle_size:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    digests = b''.join(hashlib.blake2b(shingle.encode(), digest_size=8).digest() for shingle in shingles)
+    # One row of 64 bits per shingle, most significant bit first
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+    majority = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(majority).tobytes(), 'big')
+
+
+def get_hamming_distance(first: int, second: int) -> int:
+    """
+    Counts the bits that differ between two fingerprints.
+
+    :param first: the first fingerprint
+    :param second: the second fingerprint
+    :returns: the number of differing bits
+    """
+    return bin(first ^ second).count('1')
+
+
+class NearDuplicateIndex:
+    """
+    Per-domain index of page SimHashes answering "was a near-identical page of this domain seen
+    before?".
+
+    Fingerprints are split into ``max_distance + 1`` blocks: two fingerprints within
+    ``max_distance`` bits of each other agree on at least one whole block, so only the pages
+    sharing a block with the new one are compared, which keeps lookups in the microseconds.
+
+    :param max_distance: the largest Hamming distance between near-duplicate fingerprints
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        blocks = max_distance + 1
+        self.block_bits = [SIMHASH_BITS // blocks + (1 if i < SIMHASH_BITS % blocks else 0) for i in range(blocks)]
+        self.buckets = {}
+        self.stats = {'checked': 0, 'duplicates': 0}
+
+    def _get_keys(self, domain: str, simhash: int):
+        """
+        Yields the bucket keys of a fingerprint, one per block.
+
+        :param domain: the domain
+        :param simhash: the fingerprint
+        :returns: generator of bucket keys
+        """
+        shift = 0
+        for i, bits in enumerate(self.block_bits):
+            yield domain, i, (simhash >> shift) & ((1 << bits) - 1)
+            shift += bits
+
+    def find(self, domain: str, simhash: int) -> Optional[str]:
+        """
+        Looks a fingerprint up among the pages of a domain.
+
+        :param domain: the domain
+        :param simhash: the fingerprint
+        :returns: the key of a near-identical page, or None
+        """
+        for key in self._get_keys(domain, simhash):
+            for other_simhash, page_key in self.buckets.get(key, ()):
+                if get_hamming_distance(simhash, other_simhash) <= self.max_distance:
+                    return page_key
+        return None
+
+    def add(self, domain: str, simhash: int, page_key: str) -> Optional[str]:
+        """
+        Looks a page up and indexes it if it is not a near-duplicate.
+
+        :param domain: the domain
+        :param simhash: the fingerprint of the page
+        :param page_key: the key of the page, e.g. its URL
+        :returns: the key of an earlier near-identical page, or None if the page is new
+        """
+        self.stats['checked'] += 1
+        duplicate_of = self.find(domain, simhash)
+        if duplicate_of is not None:
+            self.stats['duplicates'] += 1
+            return duplicate_of
+        for key in self._get_keys(domain, simhash):
+            self.buckets.setdefault(key, []).append((simhash, page_key))
+        return None
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+from scrapy import signals
+from twisted.internet import defer
+
+from toolkit.logger import logger
+from toolkit.parsers.text import parse_emails
+from toolkit.parsers.web.text import remove_html_from_text
+
+
+def extract_emails(body: bytes, url: str, encoding: str) -> List[dict]:
+    """
+    Example extractor: cleans the page text with BeautifulSoup and extracts its emails.
+
+    :param body: the response body
+    :param url: the response URL
+    :param encoding: the response encoding
+    :returns: a list with one item holding the URL and its emails
+    """
+    text = remove_html_from_text(body.decode(encoding, errors='replace'), parse_with_bs=True)
+    return [{'url': url, 'emails': parse_emails(text)}]
+
+
+def _run_extractor(extractor: Callable, body: bytes, url: str, encoding: str) -> list:
+    """
+    Runs an extractor in a worker process.
+
+    :param extractor: the extractor
+    :param body: the response body
+    :param url: the response URL
+    :param encoding: the response encoding
+    :returns: the extracted items, as a list
+    """
+    return list(extractor(body, url, encoding) or [])
+
+
+class ParsePool:
+    """
+    Process pool that runs CPU-heavy extraction functions out of the Twisted reactor thread, so
+    that parsing big pages does not stall the downloads of every other domain.
+
+    Extractors are module-level functions ``extractor(body, url, encoding)`` returning a list of
+    items; they are pickled by reference, so they must be importable from the worker processes.
+    At most ``max_pending`` extractions are queued or running at once: further calls wait for a
+    free slot, which keeps the callbacks (and their responses) pending in Scrapy's scraper, whose
+    ``SCRAPER_SLOT_MAX_ACTIVE_SIZE`` then pauses downloads until the pool catches up.
+
+    Workers are started with the forkserver method (spawn where it is missing): forking the
+    multi-threaded Twisted process could copy a lock held by another thread and deadlock them.
+
+    Settings: ``PARSE_POOL_WORKERS`` (number of CPUs) and ``PARSE_POOL_MAX_PENDING`` (twice the
+    number of workers).
+
+    :param max_workers: the number of worker processes
+    :param max_pending: the maximum number of queued or running extractions
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+        self.executor = None
+        self.closed = False
+        self.semaphore = defer.DeferredSemaphore(self.max_pending)
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'waited': 0}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pool = cls(settings.getint('PARSE_POOL_WORKERS', 0) or None,
+                   settings.getint('PARSE_POOL_MAX_PENDING', 0) or None)
+        crawler.signals.connect(pool.close, signal=signals.spider_closed)
+        return pool
+
+    def submit(self, extractor: Callable, body: bytes, url: str, encoding: str = 'utf-8') -> defer.Deferred:
+        """
+        Runs an extractor in the pool, once a slot is free.
+
+        :param extractor: module-level function ``extractor(body, url, encoding)``
+        :param body: the response body
+        :param url: the response URL
+        :param encoding: the response encoding
+        :returns: a Deferred firing with the list of extracted items, or failing with CancelledError
+            if the pool is closed first
+        """
+        if self.semaphore.tokens == 0:
+            self.stats['waited'] += 1
+        return self.semaphore.run(self._submit, extractor, body, url, encoding)
+
+    def parse(self, extractor: Callable, response) -> defer.Deferred:
+        """
+        Runs an extractor on a response in the pool, see ``submit``.
+
+        :param extractor: module-level function ``extractor(body, url, encoding)``
+        :param response: the response
+        :returns: a Deferred firing with the list of extracted items
+        """
+        return self.submit(extractor, response.body, response.url, getattr(response, 'encoding', 'utf-8'))
+
+    def _submit(self, extractor, body, url, encoding):
+        if self.closed:
+            # Extractions still waiting for a slot when the pool was closed
+            self.stats['cancelled'] += 1
+            return defer.fail(defer.CancelledError(f"Parse pool closed before extracting {url}"))
+        if self.executor is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self.executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context(start_method))
+        self.stats['submitted'] += 1
+        deferred = defer.Deferred()
+        future = self.executor.submit(_run_extractor, extractor, body, url, encoding)
+        future.add_done_callback(lambda future: self._on_done(future, deferred, url))
+        return deferred
+
+    def _on_done(self, future, deferred, url):
+        from twisted.internet import reactor
+
+        # Called in an executor thread, or in the reactor thread for futures cancelled by close:
+        # hand the outcome back to the reactor thread. future.exception() raises for cancelled futures.
+        if future.cancelled():
+            reactor.callFromThread(self._cancelled, deferred, url)
+        elif future.exception() is not None:
+            reactor.callFromThread(self._failed, deferred, future.exception(), url)
+        else:
+            reactor.callFromThread(self._completed, deferred, future.result())
+
+    def _completed(self, deferred, items):
+        self.stats['completed'] += 1
+        deferred.callback(items)
+
+    def _failed(self, deferred, error, url):
+        self.stats['failed'] += 1
+        logger.error("Extraction failed for %s: %r", url, error)
+        deferred.errback(error)
+
+    def _cancelled(self, deferred, url):
+        self.stats['cancelled'] += 1
+        deferred.errback(defer.CancelledError(f"Parse pool closed before extracting {url}"))
+
+    def close(self, spider=None):
+        """
+        Shuts the worker processes down without blocking the reactor. Queued extractions are
+        cancelled and their Deferreds fail with CancelledError; running ones still complete.
+        """
+        self.closed = True
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        logger.info("Parse pool: %s", self.stats)
@@ -0,0 +1,51 @@
+import datetime
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from toolkit.file import ParquetAppender
+from toolkit.logger import logger
+
+
+class ParquetPipeline:
+    """
+    Item pipeline that writes the scraped items to a Parquet dataset through a ParquetAppender,
+    instead of a CSV file, see ``toolkit.file.read_parquet`` to reload them.
+
+    Settings: ``PARQUET_PATH`` (the dataset directory, required), ``PARQUET_PARTITION_BY`` (e.g.
+    ``['domain', 'crawl_date']``), ``PARQUET_SCHEMA`` (dictionary of column names to pyarrow type
+    aliases, inferred from the first items by default), ``PARQUET_BATCH_SIZE`` (10000),
+    ``PARQUET_FLUSH_INTERVAL`` (60 seconds) and ``PARQUET_COMPRESSION`` ('zstd'). When the
+    dataset is partitioned by ``crawl_date`` and an item has none, the current UTC date is used.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.get('PARQUET_PATH'):
+            raise NotConfigured("PARQUET_PATH is not set")
+        self.stats = crawler.stats
+        self.appender = ParquetAppender(settings.get('PARQUET_PATH'), schema=settings.getdict('PARQUET_SCHEMA') or None,
+                                        partition_by=settings.getlist('PARQUET_PARTITION_BY'),
+                                        batch_size=settings.getint('PARQUET_BATCH_SIZE', 10000),
+                                        flush_interval=settings.getfloat('PARQUET_FLUSH_INTERVAL', 60.0),
+                                        compression=settings.get('PARQUET_COMPRESSION', 'zstd'))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_item(self, item, spider=None):
+        row = ItemAdapter(item).asdict()
+        if 'crawl_date' in self.appender.partition_by and not row.get('crawl_date'):
+            row['crawl_date'] = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        self.appender.write(row)
+        self.stats.inc_value('parquet/items')
+        return item
+
+    def spider_closed(self, spider):
+        self.appender.close()
+        self.stats.set_value('parquet/files', self.appender.files_written)
+        logger.info("Wrote %d items to %s", self.appender.rows_written, self.appender.directory_path)
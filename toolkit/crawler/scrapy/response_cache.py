@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from typing import Optional
+
+from toolkit.logger import logger
+
+
+class ResponseCache:
+    """
+    Compressed, content-addressed on-disk store of HTTP responses.
+
+    Bodies are zlib-compressed and stored once per distinct content under their SHA-256 digest,
+    so identical pages served under different URLs share a single file. A SQLite index maps each
+    request fingerprint to the status, headers, validators (ETag / Last-Modified) and body digest
+    of its latest response. When the compressed bodies exceed ``max_bytes``, the least recently
+    used entries are evicted until the cache is back under the cap.
+
+    :param cache_dir: directory holding the index and the compressed bodies
+    :param max_bytes: cap on the total size of the compressed bodies
+    :param compression_level: zlib compression level (1-9)
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 ** 3, compression_level: int = 6):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        os.makedirs(os.path.join(cache_dir, 'bodies'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'), isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS entries (fingerprint TEXT PRIMARY KEY, url TEXT, status INTEGER, '
+            'headers TEXT, body_hash TEXT, etag TEXT, last_modified TEXT, stored_at REAL, accessed_at REAL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, size INTEGER, refs INTEGER)')
+        self.stats = {'hits': 0, 'misses': 0, 'unchanged': 0, 'stored': 0, 'evictions': 0, 'bytes_saved': 0}
+
+    def _get_body_path(self, body_hash: str) -> str:
+        """
+        Returns the path of a compressed body, sharded by the first two characters of its digest.
+
+        :param body_hash: SHA-256 hex digest of the body
+        :returns: path of the compressed body file
+        """
+        return os.path.join(self.cache_dir, 'bodies', body_hash[:2], body_hash)
+
+    def get(self, fingerprint: str) -> Optional[dict]:
+        """
+        Returns the cached entry of a request, without its body.
+
+        :param fingerprint: the request fingerprint
+        :returns: dictionary with url, status, headers, body_hash, etag and last_modified, or None
+        """
+        row = self.db.execute(
+            'SELECT url, status, headers, body_hash, etag, last_modified FROM entries WHERE fingerprint = ?',
+            (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body_hash, etag, last_modified = row
+        return {'url': url, 'status': status, 'headers': json.loads(headers), 'body_hash': body_hash,
+                'etag': etag, 'last_modified': last_modified}
+
+    def get_body(self, fingerprint: str, body_hash: str) -> Optional[bytes]:
+        """
+        Reads and decompresses a cached body and marks its entry as recently used.
+
+        :param fingerprint: the request fingerprint
+        :param body_hash: SHA-256 hex digest of the body
+        :returns: the body, or None if it is missing from the disk
+        """
+        try:
+            with open(self._get_body_path(body_hash), 'rb') as file:
+                body = zlib.decompress(file.read())
+        except (OSError, zlib.error):
+            logger.warning("Missing or corrupt cached body for %s", fingerprint)
+            return None
+        self.db.execute('UPDATE entries SET accessed_at = ? WHERE fingerprint = ?', (time.time(), fingerprint))
+        return body
+
+    def store(self, fingerprint: str, url: str, status: int, headers: dict, body: bytes) -> str:
+        """
+        Stores a response, replacing the previous entry of the request.
+
+        :param fingerprint: the request fingerprint
+        :param url: the response URL
+        :param status: the response status
+        :param headers: the response headers as a dictionary of lists of strings
+        :param body: the response body
+        :returns: SHA-256 hex digest of the body
+        """
+        body_hash = hashlib.sha256(body).hexdigest()
+        previous = self.get(fingerprint)
+        same_body = previous is not None and previous['body_hash'] == body_hash
+
+        row = self.db.execute('SELECT refs FROM bodies WHERE hash = ?', (body_hash,)).fetchone()
+        if row is None:
+            path = self._get_body_path(body_hash)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = zlib.compress(body, self.compression_level)
+            with open(path, 'wb') as file:
+                file.write(compressed)
+            self.db.execute('INSERT INTO bodies VALUES (?, ?, 0)', (body_hash, len(compressed)))
+
+        now = time.time()
+        self.db.execute('BEGIN')
+        if previous and not same_body:
+            self._release_body(previous['body_hash'])
+        self.db.execute(
+            'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (fingerprint, url, status, json.dumps(headers), body_hash,
+             _get_header(headers, 'ETag'), _get_header(headers, 'Last-Modified'), now, now)
+        )
+        if not same_body:
+            self.db.execute('UPDATE bodies SET refs = refs + 1 WHERE hash = ?', (body_hash,))
+        self.db.execute('COMMIT')
+        self.stats['stored'] += 1
+        self._evict()
+        return body_hash
+
+    def _release_body(self, body_hash: str) -> None:
+        """
+        Drops one reference to a body, deleting its file when no entry uses it anymore.
+
+        :param body_hash: SHA-256 hex digest of the body
+        """
+        self.db.execute('UPDATE bodies SET refs = refs - 1 WHERE hash = ?', (body_hash,))
+        row = self.db.execute('SELECT refs FROM bodies WHERE hash = ?', (body_hash,)).fetchone()
+        if row is not None and row[0] <= 0:
+            self.db.execute('DELETE FROM bodies WHERE hash = ?', (body_hash,))
+            try:
+                os.remove(self._get_body_path(body_hash))
+            except OSError:
+                pass
+
+    def get_size(self) -> int:
+        """
+        Returns the total size of the compressed bodies.
+
+        :returns: size in bytes
+        """
+        return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+
+    def _evict(self) -> None:
+        """
+        Evicts the least recently used entries while the cache exceeds its size cap.
+        """
+        size = self.get_size()
+        while size > self.max_bytes:
+            rows = self.db.execute(
+                'SELECT fingerprint, body_hash FROM entries ORDER BY accessed_at LIMIT 100'
+            ).fetchall()
+            if not rows:
+                break
+            self.db.execute('BEGIN')
+            for fingerprint, body_hash in rows:
+                self.db.execute('DELETE FROM entries WHERE fingerprint = ?', (fingerprint,))
+                self._release_body(body_hash)
+                self.stats['evictions'] += 1
+                size = self.get_size()
+                if size <= self.max_bytes:
+                    break
+            self.db.execute('COMMIT')
+
+    def __len__(self) -> int:
+        return self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Closes the index.
+        """
+        self.db.close()
+
+
+def _get_header(headers: dict, name: str) -> Optional[str]:
+    """
+    Returns the first value of a header, matched case-insensitively.
+
+    :param headers: the headers as a dictionary of lists of strings
+    :param name: the header name
+    :returns: the header value, or None if the header is missing
+    """
+    for key, values in headers.items():
+        if key.lower() == name.lower() and values:
+            return values[0]
+    return None
@@ -0,0 +1,173 @@
+import gzip
+from io import BytesIO
+from typing import BinaryIO, Iterator, Tuple
+from urllib.parse import urljoin, urlparse
+
+import scrapy
+from lxml import etree
+from scrapy.utils.sitemap import sitemap_urls_from_robots
+
+from toolkit.crawler.scrapy.spider import BaseSpider
+from toolkit.logger import logger
+from toolkit.url import get_page_category
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def iter_sitemap(file: BinaryIO) -> Iterator[Tuple[str, str]]:
+    """
+    Stream-parses a sitemap or a sitemap index in constant memory: every entry is discarded
+    from the tree once it was read.
+
+    :param file: binary file object of the uncompressed sitemap
+    :returns: generator of ('sitemap', url) for sitemap index entries and ('url', url) for pages
+    """
+    parser = etree.iterparse(file, events=('end',), tag=('{*}sitemap', '{*}url'),
+                             resolve_entities=False, no_network=True, huge_tree=True, recover=True)
+    try:
+        for _, element in parser:
+            kind = etree.QName(element).localname
+            for child in element:
+                if isinstance(child.tag, str) and etree.QName(child).localname == 'loc' and child.text:
+                    yield 'url' if kind == 'url' else 'sitemap', child.text.strip()
+                    break
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        logger.warning("Invalid sitemap: %s", e)
+
+
+def iter_sitemap_body(body: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Stream-parses a downloaded sitemap body, decompressing it on the fly if it is gzipped
+    (``sitemap.xml.gz``), see ``iter_sitemap``.
+
+    :param body: the sitemap body, gzip-compressed or not
+    :returns: generator of (kind, url) tuples
+    """
+    file = BytesIO(body)
+    if body[:2] == GZIP_MAGIC:
+        file = gzip.GzipFile(fileobj=file)
+    return iter_sitemap(file)
+
+
+class SitemapDiscoverySpider(BaseSpider):
+    """
+    Spider that discovers the high-value pages of every site in ``start_urls`` from its sitemaps
+    before falling back to link following.
+
+    For every site, robots.txt is fetched and the sitemaps it lists (``/sitemap.xml`` if none)
+    are stream-parsed, following sitemap indexes up to ``sitemap_max_sitemaps`` sitemaps. Page
+    URLs whose ``toolkit.url.get_page_category`` is in ``sitemap_categories`` are sent to
+    ``parse``, at most ``sitemap_max_urls`` per site, in the order of the categories. When no
+    sitemap yields such a URL, the home page is crawled instead: it is passed to ``parse`` and
+    its links in ``sitemap_categories`` are followed.
+    """
+
+    sitemap_categories = ('contact', 'about')
+    sitemap_max_urls = 20
+    sitemap_max_sitemaps = 20
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sites = {}
+
+    async def start(self):
+        for url in self.start_urls:
+            parsed = urlparse(url)
+            site = parsed.netloc
+            self.sites[site] = {'home_url': url, 'pending': 1, 'sitemaps': 1, 'seen_sitemaps': set(), 'urls': {}}
+            yield scrapy.Request(f"{parsed.scheme}://{site}/robots.txt", callback=self.parse_robots,
+                                 errback=self.sitemap_failed, meta={'sitemap_site': site}, dont_filter=True)
+
+    def parse_robots(self, response):
+        site = response.meta['sitemap_site']
+        sitemap_urls = list(sitemap_urls_from_robots(response.body, base_url=response.url)) \
+            if response.status == 200 else []
+        yield from self._follow_sitemaps(site, sitemap_urls or [urljoin(response.url, '/sitemap.xml')])
+        yield from self._finish(site)
+
+    def parse_sitemap(self, response):
+        site = response.meta['sitemap_site']
+        state = self.sites[site]
+        sitemap_urls = []
+        if response.status == 200:
+            for kind, url in iter_sitemap_body(response.body):
+                if kind == 'sitemap':
+                    sitemap_urls.append(url)
+                    continue
+                category = get_page_category(url)
+                if category in self.sitemap_categories:
+                    state['urls'].setdefault(url, category)
+        yield from self._follow_sitemaps(site, sitemap_urls)
+        yield from self._finish(site)
+
+    def sitemap_failed(self, failure):
+        site = failure.request.meta['sitemap_site']
+        logger.info("Sitemap discovery request failed for %s: %s", failure.request.url, failure.value)
+        if failure.request.callback == self.parse_robots:
+            # Without robots.txt, still try the conventional sitemap location
+            yield from self._follow_sitemaps(site, [urljoin(failure.request.url, '/sitemap.xml')])
+        yield from self._finish(site)
+
+    def _follow_sitemaps(self, site, sitemap_urls):
+        """
+        Requests sitemaps of a site, up to ``sitemap_max_sitemaps`` per site, each once.
+
+        Sitemap requests bypass the dupefilter and the offsite middleware: a dropped request
+        would fire neither its callback nor its errback, and the site would never be seeded.
+
+        :param site: the site
+        :param sitemap_urls: the sitemap URLs
+        :returns: generator of sitemap requests
+        """
+        state = self.sites[site]
+        for url in sitemap_urls:
+            if url in state['seen_sitemaps']:
+                continue
+            if state['sitemaps'] > self.sitemap_max_sitemaps:
+                logger.info("Reached the sitemap limit of %s", site)
+                break
+            state['seen_sitemaps'].add(url)
+            state['pending'] += 1
+            state['sitemaps'] += 1
+            yield scrapy.Request(url, callback=self.parse_sitemap, errback=self.sitemap_failed, dont_filter=True,
+                                 meta={'sitemap_site': site, 'handle_httpstatus_all': True, 'allow_offsite': True})
+
+    def _finish(self, site):
+        """
+        Marks a sitemap request of a site as done; once all are, seeds the high-value pages of
+        the site, or falls back to its home page.
+
+        :param site: the site
+        :returns: generator of page requests
+        """
+        state = self.sites[site]
+        state['pending'] -= 1
+        if state['pending'] > 0:
+            return
+        urls = sorted(state['urls'], key=lambda url: self.sitemap_categories.index(state['urls'][url]))
+        urls = urls[:self.sitemap_max_urls]
+        self.crawler.stats.inc_value('sitemap/sites_with_urls' if urls else 'sitemap/sites_fallback')
+        if not urls:
+            logger.info("No high-value page in the sitemaps of %s, crawling its home page", site)
+            yield scrapy.Request(state['home_url'], callback=self.parse_home, errback=self.handle_failure)
+            return
+        logger.info("Found %d high-value pages in the sitemaps of %s", len(urls), site)
+        for url in urls:
+            yield scrapy.Request(url, callback=self.parse, errback=self.handle_failure)
+
+    def parse_home(self, response):
+        """
+        Parses the home page of a site without usable sitemap and follows its high-value links.
+
+        :param response: the home page response
+        :returns: generator of the ``parse`` results and of requests to the high-value pages
+        """
+        yield from self.parse(response) or []
+        links = response.css('a::attr(href)').getall() if hasattr(response, 'css') else []
+        for link in links:
+            url = response.urljoin(link)
+            if get_page_category(url) in self.sitemap_categories:
+                yield scrapy.Request(url, callback=self.parse, errback=self.handle_failure)
@@ -1,14 +1,132 @@
 import scrapy
+from scrapy.utils.httpobj import urlparse_cached
 
+from toolkit.crawler.scrapy.domain_budget import get_budget_domain
 from toolkit.crawler.scrapy.failure import FailureHandler
+from toolkit.lazy import LazyModule
 from toolkit.logger import logger
 
+# Imported on first use, only spiders looking for near-duplicates or parsing in a pool need them
+near_duplicates = LazyModule('toolkit.crawler.scrapy.near_duplicates')
+parse_pools = LazyModule('toolkit.crawler.scrapy.parse_pool')
+w3lib_html = LazyModule('w3lib.html')
+
 
 class BaseSpider(scrapy.Spider):
     """
     Base spider class with common methods for handling HTTP responses and failures.
     """
 
+    # Per-host circuit breaker, set by the CircuitBreakerMiddleware when it is enabled
+    circuit_breaker = None
+    # Per-domain AIMD controller, set by the AdaptiveConcurrencyMiddleware when it is enabled
+    concurrency_controller = None
+    # Health-scored proxy pool, set by the ProxyMiddleware
+    proxy_pool = None
+    # Per-domain crawl metrics, set by the InstrumentationMiddleware when it is enabled
+    crawl_metrics = None
+    # Per-domain page budget and goal, set by the DomainBudgetMiddleware when it is enabled
+    domain_budget = None
+    # Process pool for CPU-heavy extraction, created on the first call to parse_in_pool
+    parse_pool = None
+    # Per-domain SimHash index, created on the first call to get_near_duplicate
+    near_duplicate_index = None
+
+    def get_circuit_breaker_stats(self):
+        """
+        Returns the circuit state and counters of every host seen during the crawl.
+
+        :returns: a dictionary of per-host counters, empty if the CircuitBreakerMiddleware is not enabled
+        """
+        return self.circuit_breaker.snapshot() if self.circuit_breaker else {}
+
+    def get_concurrency_stats(self):
+        """
+        Returns the concurrency, delay, average latency and bad-status rate of every domain.
+
+        :returns: a dictionary of per-domain values, empty if the AdaptiveConcurrencyMiddleware is not enabled
+        """
+        return self.concurrency_controller.snapshot() if self.concurrency_controller else {}
+
+    def get_crawl_metrics(self):
+        """
+        Returns the latency, callback CPU time, response size, status and failure metrics of every
+        domain, and the item rate.
+
+        :returns: a dictionary of crawl metrics, empty if the InstrumentationMiddleware is not enabled
+        """
+        return self.crawl_metrics.snapshot() if self.crawl_metrics else {}
+
+    def get_domain_budget_stats(self):
+        """
+        Returns the pages downloaded, the pages saved and the end reason of every domain.
+
+        :returns: a dictionary of per-domain counters, empty if the DomainBudgetMiddleware is not enabled
+        """
+        return self.domain_budget.snapshot() if self.domain_budget else {}
+
+    def record_emails(self, response, emails):
+        """
+        Reports the emails extracted from a response to the DomainBudgetMiddleware, whose
+        EmailsFoundGoal counts them instead of parsing every page again.
+
+        :param response: the HTTP response object
+        :param emails: the emails found on the page
+        :returns: True if these emails ended the crawl of the domain, False otherwise
+        """
+        if self.domain_budget is None:
+            return False
+        domain = get_budget_domain(response.url)
+        if not self.domain_budget.record_emails(domain, emails):
+            return False
+        self.crawler.stats.inc_value('domain_budget/goal_reached')
+        logger.info("Crawl of %s is done after %d pages (goal_reached)",
+                    domain, self.domain_budget.domains[domain]['pages'])
+        return True
+
+    def parse_in_pool(self, extractor, response):
+        """
+        Runs a CPU-heavy extraction function on a response in a process pool instead of the
+        reactor thread, e.g. from an ``async def parse`` callback::
+
+            items = await maybe_deferred_to_future(self.parse_in_pool(extract_emails, response))
+
+        :param extractor: module-level function ``extractor(body, url, encoding)`` returning a list of items
+        :param response: the HTTP response object
+        :returns: a Deferred firing with the list of extracted items
+        """
+        if self.parse_pool is None:
+            self.parse_pool = parse_pools.ParsePool.from_crawler(self.crawler)
+        return self.parse_pool.parse(extractor, response)
+
+    def get_near_duplicate(self, response, text=None):
+        """
+        Checks if a near-identical page of the same domain was seen before (print views, tracking
+        variants, duplicated templates, ...), so that its extraction can be skipped or linked to
+        the earlier result. Near-duplicates are counted in the ``near_duplicates/*`` crawl stats.
+        Pages with fewer than ``NEAR_DUPLICATE_MIN_WORDS`` (20) words are neither indexed nor
+        compared: empty pages, JavaScript-only shells and soft errors would all match each other.
+
+        :param response: the HTTP response object
+        :param text: the extracted text of the page, by default the body without its tags
+        :returns: the URL of the earlier near-identical page, or None if the page is new
+        """
+        if self.near_duplicate_index is None:
+            self.near_duplicate_index = near_duplicates.NearDuplicateIndex(
+                self.settings.getint('NEAR_DUPLICATE_MAX_DISTANCE', 3))
+        if text is None:
+            text = w3lib_html.remove_tags(w3lib_html.remove_tags_with_content(response.text, ('script', 'style')))
+        min_words = self.settings.getint('NEAR_DUPLICATE_MIN_WORDS', near_duplicates.MIN_WORDS)
+        simhash = near_duplicates.get_simhash(text, min_words=min_words)
+        if simhash is None:
+            self.crawler.stats.inc_value('near_duplicates/too_short')
+            return None
+        duplicate_of = self.near_duplicate_index.add(urlparse_cached(response).hostname, simhash, response.url)
+        self.crawler.stats.inc_value('near_duplicates/checked')
+        if duplicate_of is not None:
+            self.crawler.stats.inc_value('near_duplicates/found')
+        return duplicate_of
+
     @staticmethod
     def is_bad_status(response):
         """
@@ -29,6 +147,17 @@ class BaseSpider(scrapy.Spider):
         """
         return response.status
 
+    @staticmethod
+    def is_unchanged(response):
+        """
+        Checks if the response body is unchanged since the previous crawl, as flagged by the
+        ResponseCacheMiddleware, so that parsing it again can be skipped.
+
+        :param response: the HTTP response object
+        :returns: True if the body is the same as the cached one, False otherwise
+        """
+        return 'unchanged' in response.flags
+
     def handle_failure(self, failure):
         """
         Delegates failure handling to the FailureHandler class.
@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta
-import dateutil.parser
 import sys
+from toolkit.lazy import LazyModule
 from toolkit.logger import logger
 
+dateutil_parser = LazyModule('dateutil.parser')
+
 
 def unique_timestamp() -> str:
     """
@@ -54,7 +56,7 @@ def remove_timezone(date_string: str) -> str:
     date_string = date_string.lower()
     matching_timezone = [t for t in timezones if t in date_string]
     if matching_timezone:
-        logger.info("Found time zone: {}".format(matching_timezone))
+        logger.debug("Found time zone: %s", matching_timezone)
         ind = date_string.rfind(matching_timezone[0])
         date_string = date_string[:ind].strip()
     return date_string
@@ -73,13 +75,13 @@ def parse_date_string(date_string: str) -> datetime:
 
     if "tomorrow" in date_string:
         date_string = handle_tomorrow(date_string)
-        return dateutil.parser.parse(date_string) + timedelta(days=1)
+        return dateutil_parser.parse(date_string) + timedelta(days=1)
 
     if "yesterday" in date_string:
         date_string = handle_yesterday(date_string)
-        return dateutil.parser.parse(date_string) - timedelta(days=1)
+        return dateutil_parser.parse(date_string) - timedelta(days=1)
 
-    return dateutil.parser.parse(date_string)
+    return dateutil_parser.parse(date_string)
 
 
 def handle_tomorrow(date_string: str) -> str:
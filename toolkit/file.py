@@ -1,7 +1,122 @@
+from __future__ import annotations
+
+import bz2
+import concurrent.futures
+import csv
+import glob
+import gzip
+import hashlib
+import heapq
+import importlib.util
+import io
+import itertools
+import json
+import lzma
+import math
+import mmap
 import os
-from typing import List, Optional
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from toolkit.lazy import LazyModule
+from toolkit.logger import logger
+
+# Imported on first use: most helpers of this module need neither
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+COMPRESSION_MAGIC_BYTES = {b'\x1f\x8b': 'gzip', b'BZh': 'bz2', b'\xfd7zXZ\x00': 'xz', b'\x28\xb5\x2f\xfd': 'zstd'}
+# Levels trading a little ratio for much faster writes than the module defaults (gzip's is 9)
+DEFAULT_COMPRESSION_LEVELS = {'gzip': 6, 'bz2': 9, 'xz': 6, 'zstd': 3}
+# Names of the compression level argument of pandas, per method
+_PANDAS_LEVEL_ARGUMENTS = {'gzip': 'compresslevel', 'bz2': 'compresslevel', 'xz': 'preset', 'zstd': 'level'}
+
+
+def get_compression(file_path: str, mode: str = 'r') -> Optional[str]:
+    """
+    Detect the compression of a file from the magic bytes of an existing file read or appended
+    to, or else from its extension (.gz, .bz2, .xz, .zst)
+
+    :param file_path: Path to the file
+    :param mode: Open mode; the content of the file is not sniffed when it is overwritten
+    :return: 'gzip', 'bz2', 'xz', 'zstd' or None for plain files
+    """
+    if 'w' not in mode and 'x' not in mode and os.path.isfile(file_path):
+        with open(file_path, 'rb') as file:
+            head = file.read(6)
+        for magic, compression in COMPRESSION_MAGIC_BYTES.items():
+            if head.startswith(magic):
+                return compression
+        if head:
+            return None
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+
 
-import pandas as pd
+def open_file(file_path: str, mode: str = 'r', compression: Optional[str] = 'infer',
+              compression_level: Optional[int] = None, **kwargs):
+    """
+    Open a file like open(), compressing or decompressing it on the fly
+
+    Appending to a compressed file adds a new compressed stream, which all readers chain.
+
+    :param file_path: Path to the file
+    :param mode: Open mode, e.g. 'r', 'rb', 'w', 'a'; text by default like open()
+    :param compression: 'infer' (see get_compression), 'gzip', 'bz2', 'xz', 'zstd' or None
+    :param compression_level: Compression level of writes, DEFAULT_COMPRESSION_LEVELS by default
+    :param kwargs: Text mode arguments of open(), e.g. encoding or newline
+    :return: The file object
+    """
+    if compression == 'infer':
+        compression = get_compression(file_path, mode)
+    if compression is None:
+        return open(file_path, mode, **kwargs)
+    binary_mode = mode.replace('t', '').replace('b', '') + 'b'
+    level = DEFAULT_COMPRESSION_LEVELS[compression] if compression_level is None else compression_level
+    writing = binary_mode[0] in 'wax'
+    if compression == 'gzip':
+        file = gzip.open(file_path, binary_mode, **({'compresslevel': level} if writing else {}))
+    elif compression == 'bz2':
+        file = bz2.open(file_path, binary_mode, **({'compresslevel': level} if writing else {}))
+    elif compression == 'xz':
+        file = lzma.open(file_path, binary_mode, **({'preset': level} if writing else {}))
+    elif compression == 'zstd':
+        if importlib.util.find_spec('zstandard') is None:
+            raise ImportError("zstandard must be installed to read or write .zst files: pip install zstandard")
+        import zstandard
+        file = zstandard.open(file_path, binary_mode, **({'cctx': zstandard.ZstdCompressor(level=level)}
+                                                          if writing else {}))
+    else:
+        raise ValueError(f"Unknown compression {compression!r}")
+    if 'b' in mode:
+        return file
+    return io.TextIOWrapper(file, **kwargs)
+
+
+def get_pandas_compression(file_path: str, mode: str = 'r', compression_level: Optional[int] = None):
+    """
+    Build the compression argument of pd.read_csv and DataFrame.to_csv for a file, see get_compression
+
+    :param file_path: Path to the file
+    :param mode: Open mode
+    :param compression_level: Compression level of writes, DEFAULT_COMPRESSION_LEVELS by default
+    :return: None for plain files, otherwise a pandas compression dictionary
+    """
+    compression = get_compression(file_path, mode)
+    if compression is None:
+        return None
+    options = {'method': compression}
+    if 'r' not in mode or '+' in mode:
+        level = DEFAULT_COMPRESSION_LEVELS[compression] if compression_level is None else compression_level
+        options[_PANDAS_LEVEL_ARGUMENTS[compression]] = level
+    return options
 
 
 def remove_duplicates(
@@ -9,12 +124,33 @@ def remove_duplicates(
         input_df: Optional[pd.DataFrame] = None,
         unique_columns: List[str] = None,
         columns_to_prioritize: Optional[List[str]] = None,
-        rewrite: bool = False
+        rewrite: bool = False,
+        output_csv_path: Optional[str] = None,
+        out_of_core: bool = False,
+        memory_budget: int = 512 * 2 ** 20,
+        spill_dir: Optional[str] = None,
+        engine: str = 'argmax',
+        categorical_keys: bool = False,
+        compression_level: Optional[int] = None
 ) -> Optional[pd.DataFrame]:
     """
     Removes duplicates from the provided CSV or DataFrame, prioritizing rows with non-empty values
     in the specified columns. If columns_to_prioritize is not provided or is empty, keeps rows that
-    have the most columns filled. Uses unique_columns to identify duplicates.
+    have the most columns filled. Uses unique_columns to identify duplicates. Rows that tie keep
+    their original order, so the first of equally good duplicates is kept.
+
+    The default 'argmax' engine scores every row vectorially, picks the best row of every key
+    with a group-wise argmax and slices the DataFrame once, sorting only the kept rows; the 'sort'
+    engine sorts and copies the whole DataFrame, then drops the duplicates. Both return the same
+    rows in the same order.
+
+    With out_of_core, a CSV larger than the memory is deduplicated in bounded memory: its rows are
+    hash-partitioned by unique_columns into spill files, every partition is deduplicated on its
+    own and the survivors are merged back in priority order, which gives the same output as the
+    in-memory path.
+
+    Compressed inputs and outputs are read and written transparently, see open_file; a rewritten
+    file keeps the compression of the input.
 
     :param input_csv_path: Path to the input CSV file. Used if input_df is not provided.
     :param input_df: A pandas DataFrame to process directly. Takes priority over input_csv_path.
@@ -24,61 +160,420 @@ def remove_duplicates(
                                   If None or empty, prioritizes rows with the most filled columns.
     :param rewrite: If True, rewrites the original CSV file (if input_csv_path is provided) after
                     removing duplicates. If False, returns the cleaned DataFrame.
-    :returns: Cleaned DataFrame with duplicates removed if rewrite is False, otherwise None.
+    :param output_csv_path: If provided, writes the cleaned rows to this CSV file instead of returning them.
+    :param out_of_core: If True, deduplicates input_csv_path in bounded memory. Requires rewrite or output_csv_path.
+    :param memory_budget: Approximate memory in bytes the out-of-core mode may use.
+    :param spill_dir: Directory of the out-of-core spill files, the system temporary directory by default.
+    :param engine: 'argmax' or 'sort', see above.
+    :param categorical_keys: If True, the argmax engine hashes every unique column once, as a
+                             categorical, instead of hashing the rows of all unique columns.
+    :param compression_level: Compression level of a compressed output, DEFAULT_COMPRESSION_LEVELS by default.
+    :returns: Cleaned DataFrame with duplicates removed if rewrite is False and no output_csv_path
+              is provided, otherwise None.
     """
+    # Ensure unique_columns is provided
+    if unique_columns is None or not unique_columns:
+        raise ValueError("unique_columns must be provided to identify duplicates.")
+    if engine not in ('argmax', 'sort'):
+        raise ValueError(f"Unknown engine {engine!r}, expected 'argmax' or 'sort'.")
+
+    if out_of_core:
+        if input_csv_path is None:
+            raise ValueError("input_csv_path must be provided to remove duplicates out of core.")
+        if output_csv_path is None and not rewrite:
+            raise ValueError("rewrite or output_csv_path must be provided to remove duplicates out of core.")
+        _remove_duplicates_out_of_core(input_csv_path, output_csv_path or input_csv_path, unique_columns,
+                                       columns_to_prioritize, memory_budget, spill_dir, compression_level)
+        return None
+
     # Ensure that either input_csv_path or input_df is provided
     if input_df is not None:
-        df = input_df.copy()
+        df = input_df
     elif input_csv_path is not None:
-        df = pd.read_csv(input_csv_path)
+        df = pd.read_csv(input_csv_path, compression=get_pandas_compression(input_csv_path))
     else:
         raise ValueError("Either input_csv_path or input_df must be provided.")
 
-    # Ensure unique_columns is provided
-    if unique_columns is None or not unique_columns:
-        raise ValueError("unique_columns must be provided to identify duplicates.")
-
-    # If columns_to_prioritize is None or empty, prioritize rows with the most non-NA values
-    if not columns_to_prioritize:
-        # Sort by the number of non-NA values across all columns
-        df['non_na_count'] = df.notna().sum(axis=1)
-        df = df.sort_values(by='non_na_count', ascending=False)
-        df = df.drop(columns=['non_na_count'])  # Drop helper column
+    # Drop duplicates, based on the unique columns
+    if engine == 'argmax':
+        df_cleaned = df.iloc[_select_best_rows(df, unique_columns, columns_to_prioritize, categorical_keys)]
     else:
-        # Sort by the columns to prioritize, ensuring rows with values in those columns come first
-        df = df.sort_values(by=columns_to_prioritize, ascending=False, na_position='last')
+        df_cleaned = _sort_by_priority(df, columns_to_prioritize).drop_duplicates(subset=unique_columns,
+                                                                                 keep='first')
 
-    # Drop duplicates, based on the unique columns
-    df_cleaned = df.drop_duplicates(subset=unique_columns, keep='first')
+    if output_csv_path is not None:
+        df_cleaned.to_csv(output_csv_path, index=False,
+                          compression=get_pandas_compression(output_csv_path, 'w', compression_level))
+        return None
 
     # Optionally rewrite the CSV if input_csv_path is provided and rewrite flag is True
     if rewrite and input_csv_path is not None:
-        df_cleaned.to_csv(input_csv_path, index=False)
+        df_cleaned.to_csv(input_csv_path, index=False,
+                          compression=get_pandas_compression(input_csv_path, 'r+', compression_level))
         return None
 
     return df_cleaned
 
 
-def read_csvs_from_directory(directory_path) -> pd.DataFrame:
+def _sort_by_priority(df: pd.DataFrame, columns_to_prioritize: Optional[List[str]]) -> pd.DataFrame:
+    """
+    Sorts rows from the best to the worst duplicate, keeping the order of the rows that tie.
+
+    :param df: The DataFrame.
+    :param columns_to_prioritize: Columns whose non-empty, greatest values come first. If None or
+                                  empty, rows with the most non-NA values come first.
+    :returns: The sorted DataFrame.
+    """
+    if not columns_to_prioritize:
+        # Sort by the number of non-NA values across all columns
+        non_na_counts = df.notna().sum(axis=1).to_numpy()
+        return df.iloc[np.argsort(-non_na_counts, kind='stable')]
+    # Sort by the columns to prioritize, ensuring rows with values in those columns come first
+    return df.sort_values(by=columns_to_prioritize, ascending=False, na_position='last', kind='stable')
+
+
+def _get_dense_ranks(column: pd.Series) -> np.ndarray:
+    """
+    Ranks the values of a column: equal values share a rank, greater values get greater ranks.
+
+    :param column: The column.
+    :returns: An int64 array with the rank of every value, from 1, and 0 for missing values.
+    """
+    values = column.to_numpy()
+    # Sorting the values of a single column is much cheaper than sorting the uniques of factorize
+    order = column.reset_index(drop=True).sort_values(kind='stable', na_position='first').index.to_numpy()
+    sorted_values = values[order]
+    missing = pd.isna(sorted_values)
+    changed = np.ones(len(order), dtype=bool)
+    changed[1:] = sorted_values[1:] != sorted_values[:-1]
+    sorted_ranks = np.cumsum(changed & ~missing)
+    sorted_ranks[missing] = 0
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = sorted_ranks
+    return ranks
+
+
+def _get_priority_scores(df: pd.DataFrame, columns_to_prioritize: Optional[List[str]]) -> np.ndarray:
+    """
+    Scores every row so that better duplicates get higher scores, in the order of ``_sort_by_priority``.
+
+    Every column to prioritize is ranked on its own (0 for missing values) and the ranks of the
+    columns are combined into a single integer, in mixed radix, without sorting the rows.
+
+    :param df: The DataFrame.
+    :param columns_to_prioritize: See ``_sort_by_priority``.
+    :returns: An int64 array with the score of every row.
+    """
+    if not columns_to_prioritize:
+        return df.notna().sum(axis=1).to_numpy(dtype=np.int64)
+    scores = np.zeros(len(df), dtype=np.int64)
+    radix_total = 1
+    for column in columns_to_prioritize:
+        ranks = _get_dense_ranks(df[column])
+        radix = int(ranks.max(initial=0)) + 1
+        if radix_total * radix >= 2 ** 62:
+            # Densify the scores so far, which keeps them below the number of rows
+            scores, score_uniques = pd.factorize(scores, sort=True)
+            radix_total = len(score_uniques)
+        scores = scores * radix + ranks
+        radix_total *= radix
+    return scores
+
+
+def _get_group_ids(df: pd.DataFrame, unique_columns: List[str], categorical_keys: bool = False) -> np.ndarray:
+    """
+    Numbers the distinct keys of the rows, treating missing values as equal like drop_duplicates.
+
+    :param df: The DataFrame.
+    :param unique_columns: Columns identifying duplicates.
+    :param categorical_keys: If True, convert every column to categorical codes (reusing the codes
+                             of categorical columns) and combine the codes, instead of hashing
+                             the rows of all the columns together.
+    :returns: An int64 array with the key number of every row.
+    """
+    if not categorical_keys:
+        return df.groupby(unique_columns, sort=False, dropna=False).ngroup().to_numpy(dtype=np.int64)
+    group_ids = np.zeros(len(df), dtype=np.int64)
+    groups = 1
+    for column in unique_columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            codes = df[column].cat.codes.to_numpy(dtype=np.int64)
+        else:
+            # The codes of an unordered categorical, without sorting its categories
+            codes = pd.factorize(df[column])[0].astype(np.int64)
+        categories = int(codes.max(initial=-1)) + 2
+        if groups * categories >= 2 ** 62:
+            group_ids, uniques = pd.factorize(group_ids)
+            groups = len(uniques)
+        group_ids = group_ids * categories + (codes + 1)
+        groups *= categories
+    return group_ids
+
+
+def _select_best_rows(df: pd.DataFrame, unique_columns: List[str], columns_to_prioritize: Optional[List[str]],
+                      categorical_keys: bool = False) -> np.ndarray:
+    """
+    Finds the best row of every key without sorting the DataFrame: the positions of the rows
+    whose score is the maximum of their key, first occurrence first.
+
+    :param df: The DataFrame.
+    :param unique_columns: Columns identifying duplicates.
+    :param columns_to_prioritize: See ``_sort_by_priority``.
+    :param categorical_keys: See ``_get_group_ids``.
+    :returns: The positions of the kept rows, from the best to the worst score, ties in row order.
+    """
+    scores = _get_priority_scores(df, columns_to_prioritize)
+    group_ids = _get_group_ids(df, unique_columns, categorical_keys)
+    best_scores = pd.Series(scores).groupby(group_ids).transform('max').to_numpy()
+    candidates = np.flatnonzero(scores == best_scores)
+    positions = candidates[~pd.Series(group_ids[candidates]).duplicated().to_numpy()]
+    return positions[np.argsort(-scores[positions], kind='stable')]
+
+
+class _Descending:
+    """
+    Wraps a value so that it sorts in descending order.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _get_priority_keys(df: pd.DataFrame, columns_to_prioritize: Optional[List[str]]) -> list:
+    """
+    Computes the sort key of every row, in the order of ``_sort_by_priority``, with the row
+    number (the index) breaking ties.
+
+    :param df: The DataFrame, indexed by row number.
+    :param columns_to_prioritize: See ``_sort_by_priority``.
+    :returns: A list of comparable keys, one per row.
+    """
+    row_numbers = df.index.tolist()
+    if not columns_to_prioritize:
+        return list(zip((-df.notna().sum(axis=1)).tolist(), row_numbers))
+    columns = []
+    for column in columns_to_prioritize:
+        missing = df[column].isna().tolist()
+        values = df[column].tolist()
+        columns.append([(True, None) if is_missing else (False, _Descending(value))
+                        for is_missing, value in zip(missing, values)])
+    return [(*values, row_number) for *values, row_number in zip(*columns, row_numbers)]
+
+
+def _combine_dtypes(first, second):
+    """
+    Returns the dtype of a column read as a whole from the dtypes of two of its chunks.
+
+    :param first: The dtype of the first chunk.
+    :param second: The dtype of the second chunk.
+    :returns: The combined dtype.
+    """
+    if first == second:
+        return first
+    if all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in (first, second)):
+        return np.result_type(first, second)
+    return np.dtype(object)
+
+
+def _dump_frames(file_path: str, frames: Iterable[pd.DataFrame]) -> None:
+    """
+    Appends DataFrames to a spill file.
+
+    :param file_path: Path to the spill file.
+    :param frames: The DataFrames.
+    """
+    with open(file_path, 'ab') as file:
+        for frame in frames:
+            pickle.dump(frame, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_frames(file_path: str) -> Iterator[pd.DataFrame]:
+    """
+    Reads the DataFrames of a spill file back, one at a time.
+
+    :param file_path: Path to the spill file.
+    :returns: Generator of DataFrames.
+    """
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, 'rb') as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+
+def _estimate_memory_per_row(input_csv_path: str, sample_rows: int = 1000) -> tuple:
+    """
+    Estimates the in-memory and on-disk size of a CSV row from the first rows of the file.
+
+    :param input_csv_path: Path to the CSV file.
+    :param sample_rows: Number of rows to sample.
+    :returns: A (bytes in memory, bytes on disk) tuple, per row.
+    """
+    sample = pd.read_csv(input_csv_path, nrows=sample_rows, compression=get_pandas_compression(input_csv_path))
+    with open_file(input_csv_path, 'rb') as file:
+        lines = [line for _, line in zip(range(len(sample) + 1), file)]
+    rows = max(len(sample), 1)
+    disk_bytes = sum(len(line) for line in lines[1:]) / rows or 1
+    memory_bytes = sample.memory_usage(index=True, deep=True).sum() / rows or 1
+    return memory_bytes, disk_bytes
+
+
+def _estimate_uncompressed_size(file_path: str, sample_size: int = 4 * 2 ** 20) -> float:
+    """
+    Estimates the uncompressed size of a file from the compression ratio of its beginning.
+
+    :param file_path: Path to the file.
+    :param sample_size: Number of uncompressed bytes sampled.
+    :returns: The estimated size in bytes, the size of the file if it is not compressed.
+    """
+    size = os.path.getsize(file_path)
+    compression = get_compression(file_path)
+    if compression is None:
+        return size
+    with open(file_path, 'rb') as raw_file:
+        with open_file(raw_file, 'rb', compression=compression) as file:
+            uncompressed = len(file.read(sample_size))
+        return size * uncompressed / max(raw_file.tell(), 1)
+
+
+def _remove_duplicates_out_of_core(input_csv_path: str, output_csv_path: str, unique_columns: List[str],
+                                   columns_to_prioritize: Optional[List[str]], memory_budget: int,
+                                   spill_dir: Optional[str], compression_level: Optional[int] = None) -> None:
+    """
+    Deduplicates a CSV file in bounded memory, see ``remove_duplicates``.
+
+    Pass 1 reads the file in chunks and appends every row to the spill file of its partition,
+    chosen by a hash of its unique_columns, so that all the duplicates of a row end up in the
+    same partition. Pass 2 deduplicates every partition in memory and spills its survivors in
+    priority order. Pass 3 merges the sorted survivors of all partitions into the output.
+
+    :param input_csv_path: Path to the input CSV file.
+    :param output_csv_path: Path to the output CSV file, may be the input file.
+    :param unique_columns: Columns identifying duplicates.
+    :param columns_to_prioritize: Columns to prioritize, see ``remove_duplicates``.
+    :param memory_budget: Approximate memory budget in bytes.
+    :param spill_dir: Directory of the spill files.
+    :param compression_level: Compression level of a compressed output.
+    """
+    # DataFrame operations (concatenation, sorting, slicing) hold a few copies of the data at once
+    memory_bytes, disk_bytes = _estimate_memory_per_row(input_csv_path)
+    chunk_size = max(int(memory_budget / (4 * memory_bytes)), 100)
+    estimated_rows = _estimate_uncompressed_size(input_csv_path) / disk_bytes
+    input_compression = get_pandas_compression(input_csv_path)
+    # A rewritten input keeps its compression, a new output gets the compression of its extension
+    output_compression = get_compression(output_csv_path, 'r+' if output_csv_path == input_csv_path else 'w')
+    partitions = max(math.ceil(estimated_rows / chunk_size), 1)
+    logger.debug("Removing duplicates of %s in %d partitions of ~%d rows", input_csv_path, partitions, chunk_size)
+
+    with tempfile.TemporaryDirectory(dir=spill_dir, prefix='remove_duplicates_') as directory:
+        # Pass 1: hash-partition the rows, remembering the column dtypes of the whole file
+        columns, dtypes = None, {}
+        with pd.read_csv(input_csv_path, chunksize=chunk_size, compression=input_compression) as reader:
+            for chunk in reader:
+                columns = chunk.columns
+                for column, dtype in chunk.dtypes.items():
+                    dtypes[column] = _combine_dtypes(dtypes.get(column, dtype), dtype)
+                # Numbers are hashed as floats so that 5 and 5.0 of differently typed chunks match
+                keys = chunk[unique_columns].apply(
+                    lambda column: column.astype(float) if pd.api.types.is_numeric_dtype(column) else column)
+                partition_ids = pd.util.hash_pandas_object(keys, index=False).to_numpy() % partitions
+                for partition_id, partition in chunk.groupby(partition_ids, sort=False):
+                    _dump_frames(os.path.join(directory, f'{partition_id}.pkl'), [partition])
+        if columns is None:
+            columns = pd.read_csv(input_csv_path, nrows=0, compression=input_compression).columns
+
+        # Pass 2: deduplicate every partition, spilling its survivors in priority order
+        survivor_chunk_size = max(chunk_size // partitions, 1)
+        for partition_id in range(partitions):
+            frames = list(_load_frames(os.path.join(directory, f'{partition_id}.pkl')))
+            if not frames:
+                continue
+            partition = pd.concat(frames).sort_index().astype(dtypes)
+            survivors = partition.iloc[_select_best_rows(partition, unique_columns, columns_to_prioritize)]
+            _dump_frames(os.path.join(directory, f'{partition_id}.sorted.pkl'),
+                         (survivors.iloc[i:i + survivor_chunk_size]
+                          for i in range(0, len(survivors), survivor_chunk_size)))
+            os.remove(os.path.join(directory, f'{partition_id}.pkl'))
+
+        # Pass 3: k-way merge of the sorted partitions into the output
+        def iter_partition(partition_id):
+            for frame in _load_frames(os.path.join(directory, f'{partition_id}.sorted.pkl')):
+                for key in _get_priority_keys(frame, columns_to_prioritize):
+                    yield key, frame
+
+        temporary_path = os.path.join(directory, 'output.csv')
+        merged = heapq.merge(*(iter_partition(partition_id) for partition_id in range(partitions)),
+                             key=lambda item: item[0])
+        with open_file(temporary_path, 'w', compression=output_compression, compression_level=compression_level,
+                       newline='', encoding='utf-8') as output_file:
+            pd.DataFrame(columns=columns).to_csv(output_file, index=False)
+            while True:
+                batch = list(itertools.islice(merged, chunk_size))
+                if not batch:
+                    break
+                # Slice the rows of the batch out of their chunks, then put them in merge order
+                rows_by_frame = {}
+                for key, frame in batch:
+                    rows_by_frame.setdefault(id(frame), (frame, []))[1].append(key[-1])
+                output = pd.concat([frame.loc[rows] for frame, rows in rows_by_frame.values()])
+                output = output.loc[[key[-1] for key, _ in batch], columns]
+                output.to_csv(output_file, header=False, index=False)
+        shutil.move(temporary_path, output_csv_path)
+
+
+def read_csvs_from_directory(directory_path, pattern: str = '*.csv', recursive: bool = False,
+                             max_workers: Optional[int] = None, use_processes: bool = False,
+                             usecols: Optional[List[str]] = None, engine: Optional[str] = None,
+                             lazy: bool = False, include_compressed: bool = True
+                             ) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
     """
     Reads all CSV files from the specified directory and combines them into a single Pandas DataFrame.
 
+    Files are read in parallel by a thread pool, or a process pool with use_processes. Empty
+    files are skipped and compressed files are decompressed on the fly, see open_file.
+
     :param directory_path: Path to the directory containing the CSV files.
-    :returns: A single Pandas DataFrame containing the data from all CSVs.
+    :param pattern: Glob pattern of the files to read.
+    :param recursive: If True, also read the matching files of the subdirectories.
+    :param max_workers: Number of parallel reads, the executor default if None.
+    :param use_processes: If True, read with a process pool instead of a thread pool.
+    :param usecols: Columns to read; columns missing from a file are left out of its frame.
+    :param engine: pd.read_csv parser engine, e.g. 'pyarrow' if installed.
+    :param lazy: If True, return an iterator of the DataFrames of the files as they are read,
+                 in completion order, instead of concatenating them.
+    :param include_compressed: If True, also read the compressed files matching the pattern, e.g. 'x.csv.gz'.
+    :returns: A single Pandas DataFrame containing the data from all CSVs, or an iterator of DataFrames if lazy.
+              The DataFrame is empty if no file of the directory matches.
+    :raises FileNotFoundError: If the directory does not exist.
     """
-    all_dataframes = []
+    if not os.path.isdir(directory_path):
+        raise FileNotFoundError(f"Directory not found: {directory_path}")
+    if engine == 'pyarrow' and importlib.util.find_spec('pyarrow') is None:
+        logger.warning("pyarrow is not installed, reading CSVs with the default engine")
+        engine = None
 
-    # Loop through all files in the directory
-    for filename in os.listdir(directory_path):
-        # Check if the file is a CSV
-        if filename.endswith(".csv"):
-            file_path = os.path.join(directory_path, filename)
-            # Read the CSV file into a DataFrame
-            try:
-                df = pd.read_csv(file_path)
-                all_dataframes.append(df)
-            except pd.errors.EmptyDataError:
-                pass
+    patterns = [pattern] + ([pattern + extension for extension in COMPRESSION_EXTENSIONS] if include_compressed else [])
+    file_paths = set()
+    for pattern in patterns:
+        if recursive:
+            file_paths.update(glob.glob(os.path.join(glob.escape(directory_path), '**', pattern), recursive=True))
+        else:
+            file_paths.update(glob.glob(os.path.join(glob.escape(directory_path), pattern)))
+    file_paths = sorted(file_paths)
+    if lazy:
+        return _iter_csv_files(file_paths, max_workers, use_processes, usecols, engine, ordered=False)
+
+    all_dataframes = list(_iter_csv_files(file_paths, max_workers, use_processes, usecols, engine))
 
     # Concatenate all DataFrames into one
     if all_dataframes:
@@ -89,76 +584,1263 @@ def read_csvs_from_directory(directory_path) -> pd.DataFrame:
     return combined_df
 
 
-def write_list_to_text_file(file_path, data, mode="w"):
+def _iter_csv_files(file_paths: List[str], max_workers: Optional[int], use_processes: bool,
+                    usecols: Optional[List[str]], engine: Optional[str],
+                    ordered: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    Reads CSV files in parallel and yields their DataFrames.
+
+    At most twice as many reads as workers are in flight: the next file is submitted as each
+    DataFrame is yielded, so memory grows with that window rather than with the directory.
+    Closing the generator early cancels the reads not started yet.
+
+    :param file_paths: Paths of the CSV files.
+    :param max_workers: Number of parallel reads.
+    :param use_processes: If True, read with a process pool instead of a thread pool.
+    :param usecols: Columns to read.
+    :param engine: pd.read_csv parser engine.
+    :param ordered: If True, yield the DataFrames in the order of the files, otherwise as they are read.
+    :returns: Generator of the non-empty DataFrames.
+    """
+    if not file_paths:
+        return
+    executor_class = concurrent.futures.ProcessPoolExecutor if use_processes else concurrent.futures.ThreadPoolExecutor
+    executor = executor_class(max_workers)
+    paths = iter(file_paths)
+    window = 2 * (max_workers or os.cpu_count() or 1)
+    futures = [executor.submit(_read_csv_file, file_path, usecols, engine)
+               for file_path in itertools.islice(paths, window)]
+    try:
+        while futures:
+            if ordered:
+                future = futures.pop(0)
+            else:
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                future = done.pop()
+                futures.remove(future)
+            df = future.result()
+            future = None
+            for file_path in itertools.islice(paths, 1):
+                futures.append(executor.submit(_read_csv_file, file_path, usecols, engine))
+            if df is not None:
+                yield df
+                df = None
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _read_csv_file(file_path: str, usecols: Optional[List[str]], engine: Optional[str]) -> Optional[pd.DataFrame]:
+    """
+    Reads a CSV file, keeping only the requested columns that it has.
+
+    :param file_path: Path to the CSV file.
+    :param usecols: Columns to read, all of them if None.
+    :param engine: pd.read_csv parser engine.
+    :returns: The DataFrame, or None if the file is empty.
+    """
+    kwargs = {'engine': engine} if engine else {}
+    kwargs['compression'] = get_pandas_compression(file_path)
+    try:
+        if usecols is not None:
+            columns = set(usecols)
+            kwargs['usecols'] = lambda column: column in columns
+            if engine == 'pyarrow':
+                # The pyarrow engine needs a list of columns that all exist
+                kwargs['usecols'] = [column for column in read_column_names_from_csv(file_path) if column in columns]
+        return pd.read_csv(file_path, **kwargs)
+    except pd.errors.EmptyDataError:
+        return None
+
+
+def write_list_to_text_file(file_path, data, mode="w", compression_level: Optional[int] = None):
     """
     Write list to text file in splitting elements to new line
 
     :param mode: Write mode ('w' for write, 'a' for append)
-    :param file_path: Path to the text file
+    :param file_path: Path to the text file, compressed if its extension is .gz, .bz2, .xz or .zst
     :param data:
+    :param compression_level: Compression level of a compressed file, DEFAULT_COMPRESSION_LEVELS by default
     :return:
     """
-    if mode == 'a' and os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        data.insert(0, "")
+    if mode == 'a' and not data:
+        return
+    separator = ""
+    if mode == 'a' and os.path.exists(file_path) and os.path.getsize(file_path) > 0 \
+            and not _ends_with_newline(file_path):
+        separator = "\n"
 
-    with open(file_path, mode) as file:
-        file.write("\n".join(data))
+    with open_file(file_path, mode, compression_level=compression_level) as file:
+        file.write(separator + "\n".join(data))
 
 
-def read_list_from_text_file(file_path) -> list:
+def _ends_with_newline(file_path: str) -> bool:
+    """
+    Check if a non-empty file ends with a newline, e.g. as LineStore leaves it
+
+    :param file_path: Path to the file, decompressed on the fly if compressed
+    :return: True if the last character is a newline
+    """
+    if get_compression(file_path) is None:
+        with open(file_path, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+    last_block = b''
+    with open_file(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(2 ** 20), b''):
+            last_block = block
+    return last_block.endswith(b'\n')
+
+
+def read_list_from_text_file(file_path, strip_newlines: bool = False) -> list:
     """
 
     Check if file exists then read list from text file
 
-    :param file_path:
+    :param file_path: Path to the text file, decompressed on the fly if it is compressed
+    :param strip_newlines: If True, remove the trailing newline of every line
     :return:
     """
     if not os.path.exists(file_path):
         return []
 
-    with open(file_path, "r") as file:
+    with open_file(file_path, "r") as file:
+        if strip_newlines:
+            return file.read().splitlines()
         data = file.readlines()
     return data
 
 
-def read_from_csv(file_path: str): # -> Generator[Dict[str, str], None, None]:
+class LineStore:
+    """
+    Append-only text file of one entry per line, e.g. a list of seen URLs or done domains, that
+    scales to millions of lines.
+
+    Iteration maps the file in memory and yields its lines lazily, without their newlines and
+    skipping blank lines. Appends never rewrite the file: a batch of lines is written with a
+    single ``O_APPEND`` write, so appenders sharing the file do not interleave within a batch.
+    Files written by write_list_to_text_file, without a final newline, are read and appended to.
+
+    Membership (``line in store``) uses:
+
+    - ``index=None``: a scan of the mapped file, no memory but O(size of the file);
+    - ``index='set'``: a set of the lines, loaded on open, O(1) but the lines are kept in memory;
+    - ``index='sorted'``: a SQLite index of 64-bit line hashes to line offsets next to the file
+      (``<file_path>.index``), a sorted B-tree giving O(log n) lookups from disk, confirmed
+      against the file. It is updated on append and catches up with lines appended by others.
+
+    With ``dedupe``, appended lines already in the store, or repeated in the batch, are skipped.
+
+    :param file_path: Path to the text file
+    :param index: None, 'set' or 'sorted', see above
+    :param dedupe: If True, skip appended lines already in the store
+    :param encoding: Encoding of the file
+    """
+
+    def __init__(self, file_path: str, index: Optional[str] = None, dedupe: bool = False, encoding: str = 'utf-8'):
+        if index not in (None, 'set', 'sorted'):
+            raise ValueError(f"Unknown index {index!r}, expected None, 'set' or 'sorted'")
+        if get_compression(file_path, 'a'):
+            raise ValueError(f"LineStore needs an uncompressed file, got {file_path}")
+        self.file_path = file_path
+        self.index = index
+        self.dedupe = dedupe
+        self.encoding = encoding
+        self.fd = os.open(file_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self.lines = None
+        self.db = None
+        self.indexed_size = 0
+        if index == 'set':
+            self.lines = set(self)
+            self.indexed_size = os.fstat(self.fd).st_size
+        elif index == 'sorted':
+            self.db = sqlite3.connect(f'{file_path}.index', isolation_level=None)
+            self.db.execute('CREATE TABLE IF NOT EXISTS lines (hash INTEGER, offset INTEGER, '
+                            'PRIMARY KEY (hash, offset)) WITHOUT ROWID')
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+            row = self.db.execute("SELECT value FROM meta WHERE name = 'size'").fetchone()
+            self.indexed_size = row[0] if row else 0
+
+    def __enter__(self) -> 'LineStore':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[str]:
+        size = os.fstat(self.fd).st_size
+        if not size:
+            return
+        with mmap.mmap(self.fd, size, access=mmap.ACCESS_READ) as mapped:
+            # Decode and split blocks of lines at once, a line at a time is several times slower
+            start = 0
+            while start < size:
+                block_end = min(start + 2 ** 20, size)
+                end = block_end if block_end == size else mapped.rfind(b'\n', start, block_end) + 1
+                if end <= start:
+                    # A line longer than the block
+                    end = mapped.find(b'\n', block_end) + 1 or size
+                text = mapped[start:end].decode(self.encoding)
+                lines = text.split('\n')
+                if '\r' in text:
+                    lines = [line.rstrip('\r') for line in lines]
+                yield from filter(None, lines)
+                start = end
+
+    def _iter_lines(self, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yields the lines of the mapped file from a byte offset.
+
+        :param start: Byte offset of a line start
+        :return: Generator of (byte offset, encoded line) tuples, blank lines skipped
+        """
+        size = os.fstat(self.fd).st_size
+        if size <= start:
+            return
+        with mmap.mmap(self.fd, size, access=mmap.ACCESS_READ) as mapped:
+            mapped.seek(start)
+            offset = start
+            for line in iter(mapped.readline, b''):
+                text = line.rstrip(b'\r\n')
+                if text:
+                    yield offset, text
+                offset += len(line)
+
+    @staticmethod
+    def _hash(line: bytes) -> int:
+        # Two cheap checksums make a 64-bit hash; collisions only cost a check against the file
+        return (zlib.crc32(line) << 32 | zlib.adler32(line)) - 2 ** 63
+
+    def _catch_up(self) -> None:
+        """
+        Indexes the lines appended to the file since it was last indexed, rebuilding the index
+        if the file shrank.
+        """
+        size = os.fstat(self.fd).st_size
+        if size == self.indexed_size:
+            return
+        if size < self.indexed_size:
+            logger.info("%s was rewritten, rebuilding its index", self.file_path)
+            self.indexed_size = 0
+            if self.lines is not None:
+                self.lines.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM lines')
+        if self.indexed_size:
+            # Resume after the last complete line that was indexed
+            self.indexed_size = self._get_line_start(self.indexed_size)
+        new_lines = self._iter_lines(self.indexed_size)
+        if self.lines is not None:
+            self.lines.update(line.decode(self.encoding) for _, line in new_lines)
+        else:
+            entries = np.array([(self._hash(line), offset) for offset, line in new_lines], dtype=np.int64)
+            # Inserting in key order keeps the B-tree writes sequential
+            entries = entries[np.lexsort(entries.T[::-1])] if len(entries) else entries
+            self.db.execute('BEGIN')
+            self.db.executemany('INSERT OR IGNORE INTO lines VALUES (?, ?)', entries.tolist())
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('size', ?)", (size,))
+            self.db.execute('COMMIT')
+        self.indexed_size = size
+
+    def _get_line_start(self, offset: int) -> int:
+        """
+        Returns the offset of the start of the line containing the byte before an offset.
+        """
+        previous = os.pread(self.fd, min(offset, 65536), max(offset - 65536, 0))
+        if previous.endswith(b'\n'):
+            return offset
+        return offset - len(previous) + previous.rfind(b'\n') + 1 if b'\n' in previous else 0
+
+    def __contains__(self, line: str) -> bool:
+        if self.index is None:
+            return self._scan_for(line.encode(self.encoding))
+        self._catch_up()
+        if self.lines is not None:
+            return line in self.lines
+        encoded = line.encode(self.encoding)
+        for offset, in self.db.execute('SELECT offset FROM lines WHERE hash = ?', (self._hash(encoded),)):
+            # Confirm the hash hit against the file
+            if os.pread(self.fd, len(encoded) + 2, offset).rstrip(b'\r\n').split(b'\n')[0] == encoded:
+                return True
+        return False
+
+    def _scan_for(self, line: bytes) -> bool:
+        size = os.fstat(self.fd).st_size
+        if not size or not line:
+            return False
+        with mmap.mmap(self.fd, size, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(line) + 1].rstrip(b'\r\n') == line:
+                return True
+            position = mapped.find(b'\n' + line)
+            while position != -1:
+                end = position + 1 + len(line)
+                if end == size or mapped[end:end + 1] in (b'\n', b'\r'):
+                    return True
+                position = mapped.find(b'\n' + line, position + 1)
+        return False
+
+    def append(self, line: str) -> bool:
+        """
+        Appends a line.
+
+        :param line: The line, without newline
+        :return: True if the line was appended, False if it was skipped by dedupe
+        """
+        return self.extend([line]) == 1
+
+    def extend(self, lines: Iterable[str]) -> int:
+        """
+        Appends lines in a single write.
+
+        :param lines: The lines, without newlines
+        :return: The number of lines appended
+        """
+        batch, seen = [], set()
+        for line in lines:
+            if self.dedupe:
+                if line in seen or line in self:
+                    continue
+                seen.add(line)
+            batch.append(line)
+        if not batch:
+            return 0
+        data = ''.join(f'{line}\n' for line in batch).encode(self.encoding)
+        size = os.fstat(self.fd).st_size
+        if size and os.pread(self.fd, 1, size - 1) != b'\n':
+            # The file was written by write_list_to_text_file, without a final newline
+            data = b'\n' + data
+        written = 0
+        while written < len(data):
+            written += os.write(self.fd, data[written:])
+        if self.index is not None:
+            self._catch_up()
+        return len(batch)
+
+    def close(self) -> None:
+        """
+        Closes the file and the index.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def read_from_csv(file_path: str, chunk_size: int = 10000, usecols: Optional[List[str]] = None,
+                  dtype: Optional[Dict] = None, skip_rows: int = 0, batches: bool = False):
     """
     Read CSV file and yield each row as a dictionary
 
+    The file is read in chunks of chunk_size rows, so memory stays flat whatever the file size.
+    Compressed files are decompressed on the fly, see open_file.
+
     :param file_path: Path to the CSV file
-    :return:
+    :param chunk_size: Number of rows read at once
+    :param usecols: Columns to read, all of them by default
+    :param dtype: Column types, e.g. {'phone': str}, inferred by default
+    :param skip_rows: Number of data rows to skip, e.g. to resume after the rows already processed
+    :param batches: If True, yield one DataFrame per chunk instead of one dictionary per row
+    :return: Generator of row dictionaries, or of DataFrames if batches is True
     """
-    df = pd.read_csv(file_path)
+    # pandas turns a range of rows to skip into a set of every row number, a callable stays flat
+    reader = pd.read_csv(file_path, chunksize=chunk_size, usecols=usecols, dtype=dtype,
+                         compression=get_pandas_compression(file_path),
+                         skiprows=(lambda row: 0 < row <= skip_rows) if skip_rows else None)
+    with reader:
+        for chunk in reader:
+            if batches:
+                yield chunk
+            else:
+                yield from chunk.to_dict('records')
 
-    # Iterate over the DataFrame rows and yield each row as a dictionary
-    for index, row in df.iterrows():
-        yield row.to_dict()
 
-def read_column_names_from_csv(file_path: str) -> list[str]:
+def read_column_names_from_csv(file_path: str, encoding: str = 'utf-8') -> list[str]:
     """
-    Read CSV file and yield each row as a dictionary
+    Read the column names of a CSV file from its header line, without reading the rows
 
     :param file_path: Path to the CSV file
-    :return:
+    :param encoding: Encoding of the file
+    :return: The column names, an empty list for an empty file
     """
-    df = pd.read_csv(file_path)
-    return df.columns.tolist()
+    with open_file(file_path, 'rb') as file:
+        for _, record in _iter_csv_records(file):
+            values = _parse_csv_record(record, encoding)
+            if values:
+                # Excel and other tools start UTF-8 files with a byte order mark
+                values[0] = values[0].lstrip('\ufeff')
+                return values
+    return []
 
-def write_to_csv(file_path, input_dict, headers=None, mode='a'):
+
+def write_to_csv(file_path, input_dict, headers=None, mode='a', compression_level: Optional[int] = None):
     """
     Write dictionary to CSV file
 
+    For many rows, prefer a long-lived CsvAppender, which keeps the file open and buffers rows.
+
     :param file_path: Path to the CSV file
     :param input_dict: Dictionary to write to the CSV file
     :param headers: List of headers to include in the CSV file
     :param mode: Write mode ('w' for write, 'a' for append)
+    :param compression_level: Compression level of a compressed file, see CsvAppender
     :return:
     """
-    if headers:
-        input_dict = {key: input_dict.get(key, None) for key in headers}
+    with CsvAppender(file_path, headers=headers or list(input_dict), mode=mode, write_header=(mode == 'w'),
+                     compression_level=compression_level) as appender:
+        appender.write(input_dict)
+
+
+class CsvAppender:
+    """
+    Long-lived CSV writer that keeps the file open and buffers rows, flushing them through the
+    csv module every ``buffer_size`` rows or every ``flush_interval`` seconds, whichever comes
+    first. Writes are serialized by a lock, so one appender can be shared by several threads or
+    Scrapy item pipelines.
+
+    The header is fixed once: from ``headers``, from the header line of the file being appended
+    to, or from the keys of the first row. Keys missing from a row are written as empty values
+    and keys not in the header are ignored.
+
+    Files ending in .gz, .bz2, .xz or .zst are compressed, and appending to a compressed file keeps
+    its compression, see open_file.
+
+    Usage::
+
+        with CsvAppender('items.csv') as appender:
+            for item in items:
+                appender.write(item)
+
+    :param file_path: Path to the CSV file
+    :param headers: List of headers, in column order
+    :param mode: Write mode ('w' for write, 'a' for append)
+    :param write_header: If True, write the header line; by default, only when the file is new or empty
+    :param buffer_size: Number of buffered rows that triggers a flush
+    :param flush_interval: Seconds after which buffered rows are flushed on the next write
+    :param encoding: Encoding of the file
+    :param compression_level: Compression level of a compressed file, DEFAULT_COMPRESSION_LEVELS by default
+    """
+
+    def __init__(self, file_path: str, headers: Optional[List[str]] = None, mode: str = 'a',
+                 write_header: Optional[bool] = None, buffer_size: int = 1000, flush_interval: float = 5.0,
+                 encoding: str = 'utf-8', compression_level: Optional[int] = None):
+        is_empty = mode == 'w' or not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        if headers is None and not is_empty:
+            with open_file(file_path, newline='', encoding=encoding) as file:
+                headers = next(csv.reader(file), None)
+            if headers:
+                # Excel and other tools start UTF-8 files with a byte order mark
+                headers[0] = headers[0].lstrip('\ufeff')
+        self.file_path = file_path
+        self.headers = list(headers) if headers else None
+        self.write_header = is_empty if write_header is None else write_header
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.rows_written = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.file = open_file(file_path, mode, compression_level=compression_level, newline='', encoding=encoding)
+        self.writer = None
+
+    def __enter__(self) -> 'CsvAppender':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, row: Dict) -> None:
+        """
+        Buffers a row, flushing the buffer if it is full or old enough.
+
+        :param row: Dictionary to write to the CSV file
+        """
+        with self.lock:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.buffer_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def write_rows(self, rows: Iterable[Dict]) -> None:
+        """
+        Buffers several rows, see write.
+
+        :param rows: Dictionaries to write to the CSV file
+        """
+        for row in rows:
+            self.write(row)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows to the file.
+        """
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.writer is None and (self.headers or self.buffer):
+            if self.headers is None:
+                self.headers = list(self.buffer[0])
+            self.writer = csv.DictWriter(self.file, fieldnames=self.headers, extrasaction='ignore', lineterminator='\n')
+            if self.write_header:
+                self.writer.writeheader()
+        if self.buffer:
+            # Missing values are written as empty cells, as DataFrame.to_csv does
+            self.writer.writerows({key: '' if _is_missing_value(value) else value for key, value in row.items()}
+                                  for row in self.buffer)
+            self.rows_written += len(self.buffer)
+            self.buffer = []
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """
+        Flushes the buffered rows and closes the file.
+        """
+        with self.lock:
+            if self.file.closed:
+                return
+            self._flush()
+            self.file.close()
+
+
+def _is_missing_value(value) -> bool:
+    """
+    Check if a value is missing: None, NaN, or pandas' NA and NaT, e.g. in rows read by read_from_csv
+
+    :param value: The value
+    :return: True if the value is missing
+    """
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return value != value
+    return type(value).__name__ in ('NAType', 'NaTType')
+
+
+def _import_pyarrow():
+    """
+    Import pyarrow, an optional dependency needed by the Parquet functions
+
+    :return: The pyarrow module
+    """
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ImportError("pyarrow must be installed to read or write Parquet files: pip install pyarrow")
+    import pyarrow
+    import pyarrow.dataset
+    import pyarrow.parquet
+    return pyarrow
+
+
+def get_arrow_schema(schema):
+    """
+    Build an Arrow schema from a column to type dictionary, e.g. {'domain': 'string', 'crawled_at': 'timestamp[s]'}
+
+    :param schema: A pyarrow.Schema, or a dictionary of column names to pyarrow types or type aliases
+    :return: The pyarrow.Schema
+    """
+    pa = _import_pyarrow()
+    if schema is None or isinstance(schema, pa.Schema):
+        return schema
+    return pa.schema([(name, pa.type_for_alias(data_type) if isinstance(data_type, str) else data_type)
+                      for name, data_type in schema.items()])
+
+
+def _rows_to_arrow_table(rows: List[Dict], schema=None):
+    """
+    Convert rows to an Arrow table, casting values that do not convert directly, e.g. ISO date strings
+    of a timestamp column
+
+    :param rows: The rows
+    :param schema: The pyarrow.Schema, inferred from the rows if None
+    :return: The pyarrow.Table
+    """
+    pa = _import_pyarrow()
+    if schema is None:
+        table = pa.Table.from_pylist(rows)
+        # Columns without any value in the first rows are typed as text rather than null
+        return table.cast(pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                                     for field in table.schema]))
+    arrays = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array(values).cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ParquetAppender:
+    """
+    Columnar counterpart of CsvAppender: buffers rows and writes them as Parquet files, typed by a
+    declared or inferred schema, to a dataset directory, optionally partitioned Hive-style by some
+    columns (``domain=example.com/crawl_date=2024-01-01/part-....parquet``).
+
+    Every flush of ``batch_size`` rows (or of the rows buffered for ``flush_interval`` seconds)
+    writes one file per partition, so downstream readers get typed columns and can skip
+    partitions and row groups, see read_parquet. Without a declared schema, the schema is
+    inferred from the first flushed rows and kept for the next ones; declare date columns (e.g.
+    'timestamp[s]' or 'date32') to store them as dates, ISO strings are converted. Keys not in
+    the schema are ignored.
+
+    Requires the optional pyarrow dependency.
+
+    Usage::
+
+        with ParquetAppender('items', partition_by=['domain']) as appender:
+            for item in items:
+                appender.write(item)
+
+    :param directory_path: Path to the dataset directory
+    :param schema: pyarrow.Schema or dictionary of column names to types, see get_arrow_schema
+    :param partition_by: Columns partitioning the dataset
+    :param batch_size: Number of buffered rows that triggers a flush
+    :param flush_interval: Seconds after which buffered rows are flushed on the next write
+    :param compression: Parquet compression codec, e.g. 'zstd', 'snappy' or 'gzip'
+    """
+
+    def __init__(self, directory_path: str, schema=None, partition_by: Optional[List[str]] = None,
+                 batch_size: int = 10000, flush_interval: float = 60.0, compression: str = 'zstd'):
+        _import_pyarrow()
+        self.directory_path = directory_path
+        self.schema = get_arrow_schema(schema)
+        self.partition_by = list(partition_by or [])
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.buffer = []
+        self.rows_written = 0
+        self.files_written = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        os.makedirs(directory_path, exist_ok=True)
+
+    def __enter__(self) -> 'ParquetAppender':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, row: Dict) -> None:
+        """
+        Buffers a row, flushing the buffer if it is full or old enough.
+
+        :param row: Dictionary to write
+        """
+        with self.lock:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def write_rows(self, rows: Iterable[Dict]) -> None:
+        """
+        Buffers several rows, see write.
+
+        :param rows: Dictionaries to write
+        """
+        for row in rows:
+            self.write(row)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows to the dataset.
+        """
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        pa = _import_pyarrow()
+        table = _rows_to_arrow_table(self.buffer, self.schema)
+        if self.schema is None:
+            self.schema = table.schema
+        # A unique file name per flush, so that flushes and appenders never overwrite each other
+        basename = f'part-{time.time_ns()}-{os.getpid()}-{self.files_written}-{{i}}.parquet'
+        pa.parquet.write_to_dataset(table, self.directory_path, partition_cols=self.partition_by or None,
+                                    basename_template=basename, existing_data_behavior='overwrite_or_ignore',
+                                    compression=self.compression)
+        self.files_written += 1
+        self.rows_written += len(self.buffer)
+        self.buffer = []
+
+    def close(self) -> None:
+        """
+        Flushes the buffered rows.
+        """
+        with self.lock:
+            self._flush()
+
+
+def read_parquet(path: str, columns: Optional[List[str]] = None, filters=None,
+                 batch_size: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    Read a Parquet file or dataset directory, e.g. written by ParquetAppender
+
+    Only the requested columns are read, and filters are pushed down: partitions whose directory
+    values do not match are skipped, and so are row groups whose statistics rule them out.
+
+    :param path: Path to the Parquet file or dataset directory
+    :param columns: Columns to read, all of them by default
+    :param filters: Row filters, e.g. [('domain', '=', 'example.com'), ('status', 'in', [200, 301])]
+    :param batch_size: If provided, yield DataFrames of up to batch_size rows instead of returning one DataFrame
+    :return: DataFrame of the matching rows, or a generator of DataFrames if batch_size is provided
+    """
+    pa = _import_pyarrow()
+    dataset = pa.dataset.dataset(path, format='parquet', partitioning='hive')
+    expression = pa.parquet.filters_to_expression(filters) if filters else None
+    if batch_size is None:
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+    return (batch.to_pandas() for batch in dataset.to_batches(columns=columns, filter=expression,
+                                                                batch_size=batch_size))
+
+
+def _iter_csv_records(file: BinaryIO, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """
+    Splits a binary CSV file into records without parsing them: a record ends at the first line
+    break outside of a quoted field, so that multiline fields stay in their record.
+
+    :param file: The CSV file, opened in binary mode
+    :param start: Byte offset of the first record to read
+    :return: Generator of (byte offset, raw record) tuples
+    """
+    file.seek(start)
+    offset = record_start = start
+    lines, quotes = [], 0
+    for line in file:
+        if not lines:
+            record_start = offset
+        lines.append(line)
+        quotes += line.count(b'"')
+        offset += len(line)
+        if quotes % 2 == 0:
+            yield record_start, b''.join(lines)
+            lines, quotes = [], 0
+    if lines:
+        yield record_start, b''.join(lines)
+
+
+def _parse_csv_record(record: bytes, encoding: str = 'utf-8') -> List[str]:
+    """
+    Parses a raw CSV record
+
+    :param record: The raw record, see _iter_csv_records
+    :param encoding: Encoding of the file
+    :return: The values of the record, an empty list for a blank line
+    """
+    if b'"' not in record:
+        line = record.decode(encoding).rstrip('\r\n')
+        return line.split(',') if line else []
+    return next(csv.reader(io.StringIO(record.decode(encoding), newline='')), [])
+
+
+def _find_record_offsets(file: BinaryIO, block_size: int = 16 * 2 ** 20) -> np.ndarray:
+    """
+    Finds the byte offsets of the CSV records of a file, like _iter_csv_records but vectorized:
+    a record starts after every line break preceded by an even number of quotes. Blank lines are
+    skipped.
+
+    :param file: The CSV file, opened in binary mode
+    :param block_size: Number of bytes scanned at once
+    :return: int64 array of the offsets of the records, header included
+    """
+    line_breaks, after_carriage_return = [], []
+    position, quotes, previous_byte = 0, 0, 0
+    while True:
+        block = file.read(block_size)
+        if not block:
+            break
+        data = np.frombuffer(block, dtype=np.uint8)
+        breaks = np.flatnonzero(data == ord('\n'))
+        quote_positions = np.flatnonzero(data == ord('"'))
+        if len(quote_positions):
+            # Quotes are rare: count the quotes before every line break by binary search
+            quotes_before = np.searchsorted(quote_positions, breaks) + quotes
+            breaks = breaks[quotes_before % 2 == 0]
+            quotes += len(quote_positions)
+        elif quotes % 2:
+            # The whole block is inside a quoted field
+            breaks = breaks[:0]
+        preceding = np.concatenate(([previous_byte], data))[breaks]
+        line_breaks.append(breaks.astype(np.int64) + position)
+        after_carriage_return.append(preceding == ord('\r'))
+        previous_byte = data[-1]
+        position += len(block)
+    line_breaks = np.concatenate(line_breaks) if line_breaks else np.zeros(0, dtype=np.int64)
+    after_carriage_return = np.concatenate(after_carriage_return) if after_carriage_return else np.zeros(0, bool)
+
+    # A record starts at the file start and after every line break; it is a blank line if the
+    # next line break follows right away, possibly after a carriage return
+    starts = np.concatenate(([0], line_breaks + 1))
+    lengths = np.diff(line_breaks, prepend=-1)
+    blank = (lengths == 1) | ((lengths == 2) & after_carriage_return)
+    blank = np.append(blank, False)
+    keep = ~blank & (starts < position)
+    return starts[keep]
+
+
+def read_csv_range(file_path: str, start: int, end: int, columns: List[str], encoding: str = 'utf-8',
+                   **kwargs) -> pd.DataFrame:
+    """
+    Read the rows of a byte range of a CSV file, e.g. a split of CsvCatalog.split in a worker
+
+    :param file_path: Path to the CSV file
+    :param start: Byte offset of the first row, at a record boundary
+    :param end: Byte offset after the last row, at a record boundary
+    :param columns: The column names, see CsvCatalog.columns
+    :param encoding: Encoding of the file
+    :param kwargs: Other pd.read_csv arguments, e.g. usecols or dtype
+    :return: DataFrame of the rows of the range
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    if not data.strip():
+        return pd.DataFrame(columns=kwargs.get('usecols') or columns)
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns, encoding=encoding, **kwargs)
+
+
+class CsvCatalog:
+    """
+    Metadata and random access for a large CSV file, without loading it.
+
+    ``columns`` reads the header line only. The first operation needing rows builds an index of
+    the byte offset of every row, quote-aware so that multiline fields stay in their row, and
+    caches it in a sidecar file (``<file_path>.offsets.npz`` by default); the sidecar is rebuilt
+    when the size or the modification time of the CSV changed. The index gives ``len()``, random
+    row access and byte ranges that workers can read independently with ``read_csv_range``.
+    Byte offsets need an uncompressed file; ``columns`` also reads compressed ones.
+
+    Usage::
+
+        catalog = CsvCatalog('contacts.csv')
+        print(len(catalog), catalog.columns, catalog[123456])
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            futures = [executor.submit(read_csv_range, catalog.file_path, start, end, catalog.columns)
+                       for start, end in catalog.split(8)]
+
+    :param file_path: Path to the CSV file
+    :param index_path: Path to the sidecar index, ``<file_path>.offsets.npz`` by default
+    :param encoding: Encoding of the file
+    """
+
+    def __init__(self, file_path: str, index_path: Optional[str] = None, encoding: str = 'utf-8'):
+        self.file_path = file_path
+        self.index_path = index_path or f'{file_path}.offsets.npz'
+        self.encoding = encoding
+        self._columns = None
+        self._offsets = None
+        self._file_state = None
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        The column names, read from the header line.
+        """
+        if self._columns is None:
+            self._columns = read_column_names_from_csv(self.file_path, self.encoding)
+        return self._columns
+
+    def _get_file_state(self) -> List[int]:
+        stat = os.stat(self.file_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """
+        The byte offsets of the rows, header excluded, followed by the size of the file.
+        """
+        file_state = self._get_file_state()
+        if self._offsets is None or self._file_state != file_state:
+            self._columns = None
+            self._offsets = self._load_index(file_state)
+            if self._offsets is None:
+                self._offsets = self.build_index()
+            self._file_state = file_state
+        return self._offsets
+
+    def _load_index(self, file_state: List[int]) -> Optional[np.ndarray]:
+        """
+        Loads the sidecar index if it matches the file.
+
+        :param file_state: Size and modification time of the file
+        :return: The offsets, or None if the sidecar is missing or stale
+        """
+        try:
+            with np.load(self.index_path) as index:
+                if index['file_state'].tolist() == file_state:
+                    return index['offsets']
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def build_index(self) -> np.ndarray:
+        """
+        Scans the file for the offsets of its rows and saves them to the sidecar index.
+
+        :return: The offsets, see ``offsets``
+        """
+        if get_compression(self.file_path):
+            raise ValueError(f"CsvCatalog needs an uncompressed file to index rows, got {self.file_path}")
+        file_state = self._get_file_state()
+        with open(self.file_path, 'rb') as file:
+            offsets = np.append(_find_record_offsets(file)[1:], file_state[0])
+        # Write and rename, so that readers never see a partial index
+        temporary_path = f'{self.index_path}.{os.getpid()}.tmp.npz'
+        np.savez(temporary_path, offsets=offsets, file_state=np.array(file_state, dtype=np.int64))
+        os.replace(temporary_path, self.index_path)
+        logger.debug("Indexed %d rows of %s", len(offsets) - 1, self.file_path)
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row_number: int) -> Dict[str, str]:
+        """
+        Reads a row.
+
+        :param row_number: The row number, from 0, negative from the end
+        :return: Dictionary of the row values, as text
+        """
+        offsets = self.offsets
+        if row_number < 0:
+            row_number += len(offsets) - 1
+        if not 0 <= row_number < len(offsets) - 1:
+            raise IndexError(f"row {row_number} out of range")
+        with open(self.file_path, 'rb') as file:
+            file.seek(offsets[row_number])
+            record = file.read(offsets[row_number + 1] - offsets[row_number])
+        return dict(zip(self.columns, _parse_csv_record(record, self.encoding)))
+
+    def read_rows(self, start: int, stop: int, **kwargs) -> pd.DataFrame:
+        """
+        Reads a range of rows.
+
+        :param start: The first row number
+        :param stop: The row number after the last row
+        :param kwargs: Other pd.read_csv arguments
+        :return: DataFrame of the rows, indexed by row number
+        """
+        offsets = self.offsets
+        start, stop, _ = slice(start, stop).indices(len(offsets) - 1)
+        stop = max(start, stop)
+        df = read_csv_range(self.file_path, int(offsets[start]), int(offsets[stop]), self.columns,
+                            self.encoding, **kwargs)
+        df.index = pd.RangeIndex(start, start + len(df))
+        return df
+
+    def split(self, parts: int) -> List[Tuple[int, int]]:
+        """
+        Splits the rows into byte ranges of about the same size, at row boundaries.
+
+        :param parts: The number of ranges
+        :return: Up to ``parts`` non-empty (start, end) byte ranges covering all rows, for ``read_csv_range``
+        """
+        offsets = self.offsets
+        targets = np.linspace(offsets[0], offsets[-1], parts + 1)
+        bounds = offsets[np.searchsorted(offsets, targets[1:-1])]
+        bounds = np.unique(np.concatenate(([offsets[0]], bounds, [offsets[-1]])))
+        return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class CsvDedupIndex:
+    """
+    Sidecar index that keeps an append-only CSV file free of duplicates as batches are merged
+    into it, in O(batch) time instead of rerunning remove_duplicates over the whole file.
+
+    The index is a SQLite file next to the CSV (``<file_path>.dedup`` by default) that maps a
+    hash of the ``unique_columns`` values of every kept row to its priority score and byte offset.
+    A merged row is appended if its key is new, appended and replaces the kept row if it is
+    better by the remove_duplicates rule (``columns_to_prioritize``, or the most filled columns),
+    and dropped otherwise; ties keep the earlier row. Replaced rows stay in the file as tombstones
+    until ``compact`` rewrites it, after which the file holds the rows remove_duplicates would
+    keep, in file order.
+
+    The index is rebuilt from the CSV when it is missing, was built with other columns, or the
+    CSV was changed by another writer (its size or modification time differ). Values are
+    compared as the text written to the file: empty values are missing, and numeric values are
+    compared, and hashed, as numbers.
 
-    # Convert the input dictionary to a DataFrame
-    df = pd.DataFrame([input_dict])
+    Usage::
 
-    # Write the DataFrame to the CSV file based on the mode provided (e.g., 'w' or 'a')
-    df.to_csv(file_path, mode=mode, header=(mode == 'w'), index=False, columns=headers)
+        with CsvDedupIndex('contacts.csv', unique_columns=['domain'], columns_to_prioritize=['email']) as index:
+            index.merge_rows(batch)
+            index.compact()
+
+    :param file_path: Path to the CSV file
+    :param unique_columns: Columns identifying duplicates
+    :param columns_to_prioritize: Columns to prioritize, see remove_duplicates
+    :param headers: Headers of a new file, the keys of the first merged row by default
+    :param index_path: Path to the index file, ``<file_path>.dedup`` by default
+    :param encoding: Encoding of the CSV file
+    """
+
+    def __init__(self, file_path: str, unique_columns: List[str], columns_to_prioritize: Optional[List[str]] = None,
+                 headers: Optional[List[str]] = None, index_path: Optional[str] = None, encoding: str = 'utf-8'):
+        if not unique_columns:
+            raise ValueError("unique_columns must be provided to identify duplicates.")
+        if get_compression(file_path, 'a'):
+            raise ValueError(f"CsvDedupIndex needs an uncompressed file, got {file_path}")
+        self.file_path = file_path
+        self.unique_columns = list(unique_columns)
+        self.columns_to_prioritize = list(columns_to_prioritize or [])
+        self.headers = list(headers) if headers else None
+        self.index_path = index_path or f'{file_path}.dedup'
+        self.encoding = encoding
+        self.db = sqlite3.connect(self.index_path, isolation_level=None)
+        self.db.execute('CREATE TABLE IF NOT EXISTS keys '
+                        '(key BLOB PRIMARY KEY, score TEXT, offset INTEGER) WITHOUT ROWID')
+        self.db.execute('CREATE TABLE IF NOT EXISTS tombstones (offset INTEGER PRIMARY KEY)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self._refresh()
+
+    def __enter__(self) -> 'CsvDedupIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _get_meta(self, name: str):
+        row = self.db.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, name: str, value) -> None:
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (name, json.dumps(value)))
+
+    def _get_file_state(self) -> Optional[List[int]]:
+        if not os.path.exists(self.file_path):
+            return None
+        stat = os.stat(self.file_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _refresh(self) -> None:
+        """
+        Rebuilds the index if it does not match the CSV file or the columns.
+        """
+        columns = [self.unique_columns, self.columns_to_prioritize]
+        if self._get_meta('columns') != columns or self._get_meta('file_state') != self._get_file_state():
+            self.rebuild()
+        else:
+            self.file_header = self._get_meta('header')
+
+    def rebuild(self) -> None:
+        """
+        Rebuilds the index from the CSV file, tombstoning the duplicates it already holds.
+        """
+        self.db.execute('BEGIN')
+        self.db.execute('DELETE FROM keys')
+        self.db.execute('DELETE FROM tombstones')
+        self.file_header = None
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'rb') as file:
+                records = ((offset, _parse_csv_record(record, self.encoding))
+                           for offset, record in _iter_csv_records(file))
+                records = ((offset, values) for offset, values in records if values)
+                for offset, values in records:
+                    self.file_header = values
+                    break
+                while True:
+                    batch = list(itertools.islice(records, 10000))
+                    if not batch:
+                        break
+                    self._merge_batch([dict(zip(self.file_header, values)) for _, values in batch],
+                                      [offset for offset, _ in batch])
+        self._set_meta('columns', [self.unique_columns, self.columns_to_prioritize])
+        self._set_meta('header', self.file_header)
+        self._set_meta('file_state', self._get_file_state())
+        self.db.execute('COMMIT')
+
+    def _get_key(self, row: Dict[str, str]) -> bytes:
+        values = [_normalize_csv_value(row.get(column, '')) for column in self.unique_columns]
+        return hashlib.blake2b('\x1f'.join(repr(value) for value in values).encode(), digest_size=16).digest()
+
+    def _get_score(self, row: Dict[str, str]) -> list:
+        if not self.columns_to_prioritize:
+            return [sum(1 for value in row.values() if value not in ('', None))]
+        values = [_normalize_csv_value(row.get(column, '')) for column in self.columns_to_prioritize]
+        return [[0, None] if value is None else [1, value] for value in values]
+
+    def _resolve_batch(self, rows: List[Dict[str, str]]) -> Tuple[List[str], Dict, list]:
+        """
+        Decides which rows of a batch are kept, looking the keys of the batch up at once.
+
+        :param rows: The rows, as written to the file
+        :return: The action of every row ('inserted', 'replaced' or 'dropped'), the kept row of
+                 every changed key as (score, row number) and the replaced or dropped rows, as
+                 file offsets (int) or row numbers of the batch (tuple)
+        """
+        keys = [self._get_key(row) for row in rows]
+        kept = {}
+        unique_keys = list(set(keys))
+        for i in range(0, len(unique_keys), 500):
+            chunk = unique_keys[i:i + 500]
+            query = f"SELECT key, score, offset FROM keys WHERE key IN ({','.join('?' * len(chunk))})"
+            for key, score, offset in self.db.execute(query, chunk):
+                kept[key] = (json.loads(score), offset)
+
+        actions, changed, removed = [], {}, []
+        for row_number, (key, row) in enumerate(zip(keys, rows)):
+            score = self._get_score(row)
+            existing = kept.get(key)
+            if existing is None:
+                actions.append('inserted')
+            elif _is_better_score(score, existing[0]):
+                actions.append('replaced')
+                removed.append(existing[1])
+            else:
+                actions.append('dropped')
+                removed.append((row_number,))
+                continue
+            kept[key] = changed[key] = (score, (row_number,))
+        return actions, changed, removed
+
+    def _merge_batch(self, rows: List[Dict[str, str]], offsets: List[Optional[int]]) -> None:
+        """
+        Indexes a batch of rows of the file.
+
+        :param rows: The rows, as written to the file
+        :param offsets: Byte offset of every row in the file, None for rows not written
+        """
+        actions, changed, removed = self._resolve_batch(rows)
+        self._apply_batch(changed, removed, offsets)
+
+    def _apply_batch(self, changed: Dict, removed: list, offsets: List[Optional[int]]) -> None:
+        """
+        Writes the decisions of _resolve_batch to the index.
+
+        :param changed: The kept row of every changed key
+        :param removed: The replaced or dropped rows
+        :param offsets: Byte offset of every row of the batch, None for rows not written
+        """
+        def get_offset(location):
+            return offsets[location[0]] if isinstance(location, tuple) else location
+
+        self.db.executemany('INSERT OR REPLACE INTO keys VALUES (?, ?, ?)',
+                            [(key, json.dumps(score), get_offset(location))
+                             for key, (score, location) in changed.items()])
+        tombstones = (get_offset(location) for location in removed)
+        self.db.executemany('INSERT INTO tombstones VALUES (?)',
+                            [(offset,) for offset in tombstones if offset is not None])
+
+    def merge_rows(self, rows: Iterable[Dict]) -> Dict[str, int]:
+        """
+        Merges rows into the CSV file: new and better rows are appended, worse rows are dropped.
+
+        :param rows: Dictionaries to merge; keys not in the header are ignored
+        :return: The number of rows 'inserted', 'replaced' and 'dropped'
+        """
+        self._refresh()
+        rows = list(rows)
+        counts = {'inserted': 0, 'replaced': 0, 'dropped': 0}
+        if not rows:
+            return counts
+        chunks = []
+        if self.file_header is None:
+            self.file_header = self.headers or list(rows[0])
+            chunks.append(self._format_row(self.file_header))
+        offset = (self._get_file_state() or [0])[0] + sum(len(chunk) for chunk in chunks)
+
+        rows = [{column: '' if row.get(column) is None else str(row[column]) for column in self.file_header}
+                for row in rows]
+        actions, changed, removed = self._resolve_batch(rows)
+        offsets = []
+        for row, action in zip(rows, actions):
+            counts[action] += 1
+            if action == 'dropped':
+                offsets.append(None)
+                continue
+            chunk = self._format_row(list(row.values()))
+            chunks.append(chunk)
+            offsets.append(offset)
+            offset += len(chunk)
+
+        self.db.execute('BEGIN')
+        try:
+            self._apply_batch(changed, removed, offsets)
+            # The file is written before the index commits: if this fails, the index is rebuilt
+            with open(self.file_path, 'ab') as file:
+                file.write(b''.join(chunks))
+            self._set_meta('header', self.file_header)
+            self._set_meta('file_state', self._get_file_state())
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+        return counts
+
+    def _format_row(self, values: List[str]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerow(values)
+        return buffer.getvalue().encode(self.encoding)
+
+    def compact(self) -> int:
+        """
+        Rewrites the CSV file without its tombstoned rows and rebuilds the index.
+
+        :return: The number of rows removed
+        """
+        self._refresh()
+        tombstones = {offset for offset, in self.db.execute('SELECT offset FROM tombstones')}
+        if not tombstones:
+            return 0
+        temporary_path = f'{self.file_path}.compacting'
+        with open(self.file_path, 'rb') as source, open(temporary_path, 'wb') as target:
+            for offset, record in _iter_csv_records(source):
+                if offset not in tombstones:
+                    target.write(record)
+        os.replace(temporary_path, self.file_path)
+        self.rebuild()
+        return len(tombstones)
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        :return: The number of kept rows and of tombstoned rows waiting for compaction
+        """
+        return {
+            'rows': self.db.execute('SELECT COUNT(*) FROM keys').fetchone()[0],
+            'tombstones': self.db.execute('SELECT COUNT(*) FROM tombstones').fetchone()[0],
+        }
+
+    def close(self) -> None:
+        """
+        Closes the index file.
+        """
+        self.db.close()
+
+
+_FLOAT_WORDS = {'nan', 'inf', 'infinity'}
+
+
+def _normalize_csv_value(value: Optional[str]):
+    """
+    Normalizes a CSV value for comparisons: empty values become None and numbers become floats.
+
+    :param value: The value as written to the file
+    :return: None, a float or the value
+    """
+    if value is None or value == '':
+        return None
+    if value[0].isalpha() and value.lower() not in _FLOAT_WORDS:
+        # Cheap check for text, parsing it as a float would raise
+        return value
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return None if math.isnan(number) else number
+
+
+def _is_better_score(score: list, other: list) -> bool:
+    """
+    Tells if a row with a score is a better duplicate than a row with another score.
+
+    :param score: The score of the row
+    :param other: The score of the other row
+    :return: True if the row is strictly better
+    """
+    try:
+        return score > other
+    except TypeError:
+        # A column holding both numbers and text: compare it as text
+        return [[filled, str(value)] for filled, value in score] > [[filled, str(value)] for filled, value in other]
@@ -1,13 +1,274 @@
+import json
+import os
+import re
+import sqlite3
+import time
 import urllib.parse
+import urllib.request
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-def get_google_search_url(query):
+from lxml import html as lxml_html
+from lxml.etree import ParserError, XPath
+
+from toolkit.lazy import LazyModule
+from toolkit.logger import logger
+
+# Imported on first use, it loads the public suffix list
+tldextract = LazyModule('tldextract')
+
+RESULTS_PER_PAGE = 10
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) ' \
+             'Chrome/120.0.0.0 Safari/537.36'
+
+# Organic results are links wrapping a <h3> title; the snippet sits next to them in the result block
+_RESULT_LINKS = XPath('//a[@href][.//h3]')
+_RESULT_TITLE = XPath('normalize-space(.//h3)')
+_RESULT_COUNT = XPath('count(.//a[@href][.//h3])')
+_RESULT_SNIPPET = XPath('.//*[@data-sncf or contains(concat(" ", normalize-space(@class), " "), " VwiC3b ")]')
+_RESULT_TEXT_BLOCKS = XPath('.//div[not(.//div)] | .//span[not(.//span)]')
+
+
+def get_google_search_url(query, page=0, results_per_page=RESULTS_PER_PAGE):
     """
     Generates a Google search URL for a given search query.
 
     :param query: The search query string (e.g., 'site:linkedin.com company-name').
+    :param page: The zero-based results page.
+    :param results_per_page: The number of results per page.
     :returns: The complete Google search URL.
     """
     base_url = "https://www.google.com/search"
     params = {'q': query}
+    if results_per_page != RESULTS_PER_PAGE:
+        params['num'] = results_per_page
+    if page:
+        params['start'] = page * results_per_page
     query_string = urllib.parse.urlencode(params)
     return f"{base_url}?{query_string}"
+
+
+def format_google_search_queries(template: str, rows: Iterable[Dict]) -> List[str]:
+    """
+    Builds search queries from a template, e.g. 'site:{site} "{company}" contact'.
+
+    :param template: The query template, formatted with the keys of every row.
+    :param rows: The values of the template placeholders, one dictionary per query.
+    :returns: The queries, in the order of the rows.
+    """
+    return [template.format_map(row) for row in rows]
+
+
+def get_google_search_urls(queries: Iterable[str], pages: int = 1, results_per_page: int = RESULTS_PER_PAGE,
+                           site: Optional[str] = None) -> List[Tuple[str, int, str]]:
+    """
+    Generates the Google search URLs of several queries and result pages.
+
+    :param queries: The search queries.
+    :param pages: The number of result pages per query.
+    :param results_per_page: The number of results per page.
+    :param site: If provided, restricts every query to this site with 'site:<site>'.
+    :returns: A list of (query, page, url) tuples.
+    """
+    urls = []
+    for query in queries:
+        if site:
+            query = f"site:{site} {query}"
+        for page in range(pages):
+            urls.append((query, page, get_google_search_url(query, page, results_per_page)))
+    return urls
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a search query so that queries differing only in case or spacing share a cache entry.
+
+    :param query: The search query.
+    :returns: The normalized query.
+    """
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+def parse_google_results(page_html: str, page: int = 0, results_per_page: int = RESULTS_PER_PAGE) -> List[Dict]:
+    """
+    Parses the organic results of a Google results page.
+
+    :param page_html: The HTML of the results page.
+    :param page: The zero-based results page, used to compute the rank.
+    :param results_per_page: The number of results per page, used to compute the rank.
+    :returns: A list of records with url, title, snippet and rank, in page order.
+    """
+    try:
+        tree = lxml_html.fromstring(page_html)
+    except (ParserError, ValueError):
+        return []
+
+    results, seen = [], set()
+    for link in _RESULT_LINKS(tree):
+        url = _unwrap_google_url(link.get('href'))
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        title = _RESULT_TITLE(link)
+        results.append({
+            'url': url,
+            'title': title,
+            'snippet': _get_snippet(_get_result_block(link), title),
+            'rank': page * results_per_page + len(results) + 1,
+        })
+    return results
+
+
+def _unwrap_google_url(href: Optional[str]) -> Optional[str]:
+    """
+    Returns the target of a result link, unwrapping Google redirect links ('/url?q=...').
+
+    :param href: The href of the result link.
+    :returns: The absolute target URL, or None for links to Google itself.
+    """
+    if not href:
+        return None
+    if href.startswith('/url?'):
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(href).query)
+        href = (params.get('q') or params.get('url') or [None])[0]
+    if not href or not href.startswith(('http://', 'https://')):
+        return None
+    # Registered domain check: matches google.co.uk or maps.google.com, not notgoogle.com
+    if tldextract.extract(href).domain == 'google':
+        return None
+    return href
+
+
+def _get_result_block(link):
+    """
+    Returns the largest element around a result link that contains no other result.
+
+    :param link: The result link element.
+    :returns: The result block element.
+    """
+    block = link
+    parent = link.getparent()
+    while parent is not None and _RESULT_COUNT(parent) <= 1:
+        block, parent = parent, parent.getparent()
+    return block
+
+
+def _get_snippet(block, title: str) -> str:
+    """
+    Extracts the snippet of a result block.
+
+    :param block: The result block element.
+    :param title: The result title, excluded from the snippet candidates.
+    :returns: The snippet, or an empty string if none was found.
+    """
+    snippets = _RESULT_SNIPPET(block)
+    if snippets:
+        return ' '.join(snippets[0].text_content().split())
+    # Unknown markup: fall back to the longest text block that is not the title or the URL
+    candidates = [' '.join(element.text_content().split()) for element in _RESULT_TEXT_BLOCKS(block)]
+    candidates = [text for text in candidates if text and text != title and not text.startswith('http')]
+    return max(candidates, key=len, default='')
+
+
+def _fetch_url(url: str, timeout: float = 30.0) -> str:
+    """
+    Downloads a page with a browser user agent.
+
+    :param url: The URL to download.
+    :param timeout: The timeout in seconds.
+    :returns: The page HTML.
+    """
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode(response.headers.get_content_charset() or 'utf-8', errors='replace')
+
+
+class SerpCache:
+    """
+    On-disk cache of parsed search results, keyed by normalized query, page and page size: the
+    ranks of the results depend on the page size.
+
+    :param cache_path: Path of the SQLite cache file.
+    :param ttl: Time to live of the cached results in seconds.
+    """
+
+    def __init__(self, cache_path: str, ttl: float = 7 * 24 * 3600):
+        self.ttl = ttl
+        if os.path.dirname(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.db = sqlite3.connect(cache_path, isolation_level=None)
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(results)')]
+        if columns and 'results_per_page' not in columns:
+            # Caches written before the page size was part of the key cannot tell their page sizes apart
+            self.db.execute('DROP TABLE results')
+        self.db.execute('CREATE TABLE IF NOT EXISTS results (query TEXT, page INTEGER, results_per_page INTEGER, '
+                        'results TEXT, fetched_at REAL, PRIMARY KEY (query, page, results_per_page))')
+
+    def get(self, query: str, page: int = 0, results_per_page: int = RESULTS_PER_PAGE) -> Optional[List[Dict]]:
+        """
+        Returns the cached results of a query page if they are fresh.
+
+        :param query: The search query.
+        :param page: The zero-based results page.
+        :param results_per_page: The number of results per page.
+        :returns: The cached results, or None if they are missing or expired.
+        """
+        row = self.db.execute('SELECT results, fetched_at FROM results '
+                              'WHERE query = ? AND page = ? AND results_per_page = ?',
+                              (normalize_query(query), page, results_per_page)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def set(self, query: str, page: int, results: List[Dict], results_per_page: int = RESULTS_PER_PAGE) -> None:
+        """
+        Caches the results of a query page.
+
+        :param query: The search query.
+        :param page: The zero-based results page.
+        :param results: The parsed results.
+        :param results_per_page: The number of results per page.
+        """
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                        (normalize_query(query), page, results_per_page, json.dumps(results), time.time()))
+
+    def close(self) -> None:
+        """
+        Closes the cache file.
+        """
+        self.db.close()
+
+
+def run_google_searches(queries: Iterable[str], pages: int = 1, results_per_page: int = RESULTS_PER_PAGE,
+                        site: Optional[str] = None, cache: Optional[SerpCache] = None,
+                        fetch: Optional[Callable[[str], str]] = None, delay: float = 0.0) -> Dict[str, List[Dict]]:
+    """
+    Runs Google searches and parses their results, serving repeated queries from the cache.
+
+    :param queries: The search queries.
+    :param pages: The number of result pages per query.
+    :param results_per_page: The number of results per page.
+    :param site: If provided, restricts every query to this site with 'site:<site>'.
+    :param cache: The cache of parsed results; without one, every query is fetched.
+    :param fetch: Callable downloading a URL and returning its HTML, urllib by default.
+    :param delay: The pause in seconds between two downloads.
+    :returns: A dictionary mapping every query (with its 'site:' prefix) to its results in rank order.
+    """
+    fetch = fetch or _fetch_url
+    results, fetched = {}, False
+    for query, page, url in get_google_search_urls(queries, pages, results_per_page, site):
+        query_results = results.setdefault(query, [])
+        page_results = cache.get(query, page, results_per_page) if cache else None
+        if page_results is None:
+            if fetched and delay:
+                time.sleep(delay)
+            try:
+                page_results = parse_google_results(fetch(url), page, results_per_page)
+            except Exception as e:
+                logger.error("Google search failed for %s: %s", query, e)
+                continue
+            fetched = True
+            # Empty pages are usually blocks or captchas, so they are not cached
+            if cache and page_results:
+                cache.set(query, page, page_results, results_per_page)
+        query_results.extend(page_results)
+    return results
@@ -0,0 +1,37 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access, so that importing a toolkit
+    module does not pay for heavy dependencies of functions that are never called::
+
+        pd = LazyModule('pandas')
+
+    Once imported, the attributes of the module are copied to the stand-in, so later accesses
+    cost a plain attribute lookup.
+
+    :param name: The module name, e.g. 'pandas' or 'dateutil.parser'
+    """
+
+    def __init__(self, name: str):
+        self.__name = name
+        self.__module = None
+
+    def _load(self):
+        """
+        Imports the module and copies its attributes.
+
+        :returns: the module
+        """
+        module = importlib.import_module(self.__name)
+        self.__dict__.update(module.__dict__)
+        self.__module = module
+        return module
+
+    def __getattr__(self, attr):
+        module = self.__module or self._load()
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self.__name!r}>"
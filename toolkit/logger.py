@@ -1,12 +1,17 @@
+import atexit
+import copy
 import logging
-import logging.config
+import threading
+import time
+import warnings
 
 # Global logsuffix which can be dynamically modified if needed
 logsuffix = []
 
 LOGGING_DEFAULT = {
     'version': 1,
-    'disable_existing_loggers': True,
+    # Logging is configured on first use, possibly after other libraries created their loggers
+    'disable_existing_loggers': False,
     'formatters': {
         'standard': {
             'class': 'logging.Formatter',
@@ -31,10 +36,25 @@ LOGGING_DEFAULT = {
     }
 }
 
+_configured = False
+# Options of the applied configuration, and whether it was applied implicitly, on first use
+_configured_with = None
+_configured_implicitly = False
+_configure_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_queued_handlers = []
+
 
 class SuffixAdder(logging.LoggerAdapter):
     """
     Logger adapter to add suffix information to log messages.
+
+    Logging calls also accept ``every=n``, to log only one call in n, and ``per_second=n``, to
+    log at most n calls per second; both count per message template, i.e. per call site, and the
+    next logged message tells how many were skipped. They keep per-item logs in hot paths cheap::
+
+        logger.info("Handling failure for request: %s", url, per_second=10)
     """
 
     def __init__(self, logger, extra_suffix=None):
@@ -46,36 +66,212 @@ class SuffixAdder(logging.LoggerAdapter):
         """
         super(SuffixAdder, self).__init__(logger, {})
         self.extra_suffix = extra_suffix if extra_suffix else []
+        self.samples = {}
+        self.samples_lock = threading.Lock()
 
-    def process(self, msg, kwargs):
+    def process(self, msg, kwargs, args=()):
         """
         Process the log message and add suffixes if provided.
 
         :param msg: Original log message.
         :param kwargs: Additional arguments for logging.
+        :param args: Arguments merged into the message.
         :return: Modified message with suffixes appended.
         """
         # Add global logsuffix and any local suffix from kwargs
-        combined_suffix = self.extra_suffix + logsuffix + kwargs.pop("suffix", [])
+        combined_suffix = [*self.extra_suffix, *logsuffix, *(kwargs.pop("suffix", None) or [])]
 
-        # Append suffixes to the log message
+        # Append suffixes to the log message, escaped when the arguments are merged into it
         if combined_suffix:
-            msg = f"{msg} | {' | '.join(map(str, combined_suffix))}"
+            suffix = ' | '.join(map(str, combined_suffix))
+            msg = f"{msg} | {suffix.replace('%', '%%') if args else suffix}"
 
         return msg, kwargs
 
+    def isEnabledFor(self, level):
+        """
+        Check whether a level is enabled, configuring logging on first use, see configure_logging.
+
+        :param level: Logging level.
+        :return: True if messages of the level are logged.
+        """
+        if not _configured:
+            _configure_on_first_use()
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level, msg, *args, **kwargs):
+        """
+        Log a message if the level is enabled and the message is not sampled out.
+
+        :param level: Logging level.
+        :param msg: Log message.
+        :param args: Arguments merged into the message.
+        :param kwargs: Additional arguments for logging, including every and per_second.
+        """
+        if not self.isEnabledFor(level):
+            return
+        every = kwargs.pop('every', None)
+        per_second = kwargs.pop('per_second', None)
+        if every or per_second:
+            skipped = self._sample(msg, every, per_second)
+            if skipped is None:
+                return
+            if skipped:
+                kwargs['suffix'] = [*kwargs.get('suffix', []), f"{skipped} similar messages skipped"]
+        msg, kwargs = self.process(msg, kwargs, args)
+        # Report the caller of the adapter rather than this method
+        kwargs['stacklevel'] = kwargs.get('stacklevel', 1) + 1
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def _sample(self, msg, every, per_second):
+        """
+        Count a call of a sampled message.
+
+        :param msg: Message template, identifying the call site.
+        :param every: Log one call in every calls.
+        :param per_second: Log at most per_second calls per second.
+        :return: None if the call is skipped, else the number of calls skipped since the last logged one.
+        """
+        with self.samples_lock:
+            state = self.samples.get(msg)
+            if state is None:
+                # Calls, calls skipped since the last logged one, start of the second and calls logged in it
+                state = self.samples[msg] = [0, 0, 0.0, 0]
+            state[0] += 1
+            if every and (state[0] - 1) % every:
+                state[1] += 1
+                return None
+            if per_second:
+                now = time.monotonic()
+                if now - state[2] >= 1:
+                    state[2], state[3] = now, 0
+                if state[3] >= per_second:
+                    state[1] += 1
+                    return None
+                state[3] += 1
+            skipped, state[1] = state[1], 0
+            return skipped
+
+
+def configure_logging(config=None, use_queue: bool = False, force: bool = False) -> None:
+    """
+    Apply the logging configuration, once. The module logger applies the default configuration
+    on its first use, so importing toolkit modules leaves logging untouched, and a later call with
+    a config or use_queue replaces that implicit configuration. Calls without options do nothing
+    once logging is configured; calls asking for other options than an explicit configuration
+    already applied are ignored with a RuntimeWarning unless force is True.
+
+    With use_queue, the handlers of the root logger are moved behind a QueueHandler and run by a
+    QueueListener thread, so that logging calls only enqueue their record and the I/O happens
+    off the calling thread. Queued records are flushed by stop_queue_logging, called at exit.
+
+    :param config: dictConfig configuration, LOGGING_DEFAULT by default.
+    :param use_queue: If True, write the log records from a background thread.
+    :param force: If True, apply the configuration even if logging was already configured.
+    """
+    requested = config is not None or use_queue
+    with _configure_lock:
+        if _configured and not force:
+            if not requested or _configured_with == (config or LOGGING_DEFAULT, use_queue):
+                return
+            if not _configured_implicitly:
+                warnings.warn("Logging is already configured, configure_logging options ignored: "
+                              "pass force=True to apply them", RuntimeWarning, stacklevel=2)
+                return
+        _apply_configuration(config, use_queue, implicit=False)
+
+
+def _configure_on_first_use() -> None:
+    """
+    Apply the default configuration on the first use of a logger, leaving it replaceable by an
+    explicit call to configure_logging.
+    """
+    with _configure_lock:
+        if not _configured:
+            _apply_configuration(None, False, implicit=True)
+
+
+def _apply_configuration(config, use_queue: bool, implicit: bool) -> None:
+    """
+    Apply a logging configuration, with _configure_lock held.
+
+    :param config: dictConfig configuration, LOGGING_DEFAULT if None.
+    :param use_queue: If True, write the log records from a background thread.
+    :param implicit: If True, the configuration is applied on first use rather than asked for.
+    """
+    global _configured, _configured_with, _configured_implicitly
+    import logging.config
+
+    stop_queue_logging()
+    logging.config.dictConfig(config or LOGGING_DEFAULT)
+    if use_queue:
+        _start_queue_logging()
+    _configured = True
+    _configured_with = (config or LOGGING_DEFAULT, use_queue)
+    _configured_implicitly = implicit
+
+
+def _start_queue_logging() -> None:
+    """
+    Move the handlers of the root logger behind a queue, run by a listener thread.
+    """
+    global _listener, _queue_handler, _queued_handlers
+    import logging.handlers
+    import queue
+
+    class LocalQueueHandler(logging.handlers.QueueHandler):
+        def prepare(self, record):
+            # Only merge the arguments, which may change once the logging call returns, and leave
+            # the formatting to the listener thread
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+            return record
+
+    root = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    _queued_handlers = root.handlers[:]
+    for handler in _queued_handlers:
+        root.removeHandler(handler)
+    _queue_handler = LocalQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *_queued_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_queue_logging() -> None:
+    """
+    Write the queued log records, stop the listener thread and give the handlers back to the root
+    logger. Does nothing if logging is not queued.
+    """
+    global _listener, _queue_handler, _queued_handlers
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    for handler in _queued_handlers:
+        root.addHandler(handler)
+    _listener, _queue_handler, _queued_handlers = None, None, []
+
+
+atexit.register(stop_queue_logging)
+
 
 def get_logger(extra_suffix=None) -> SuffixAdder:
     """
     Get a logger instance wrapped with the SuffixAdder to handle suffixes.
 
+    Logging is configured on the first call only, see configure_logging.
+
     :param extra_suffix: Optional list of additional suffixes to be included with each log.
     :return: Logger instance wrapped in SuffixAdder.
     """
-    logging.config.dictConfig(LOGGING_DEFAULT)
+    if not _configured:
+        _configure_on_first_use()
     logger = logging.getLogger()
     return SuffixAdder(logger, extra_suffix)
 
 
-# Example usage of the logger
-logger = get_logger()
+# Example usage of the logger: configured on its first use rather than at import
+logger = SuffixAdder(logging.getLogger())
@@ -1,7 +1,11 @@
-from typing import List, Optional, Union
-from scrapy.http import Response
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional, Union
 from urllib.parse import urljoin, urlparse
 
+if TYPE_CHECKING:
+    from scrapy.http import Response
+
 
 def parse_attr(response: Optional[Response], xpaths: Optional[List[str]] = None,
                attr: str = 'href', _abs: bool = True,
@@ -1,10 +1,16 @@
-from w3lib.html import remove_tags, remove_tags_with_content
-from scrapy.http import Request, HtmlResponse
-from bs4 import BeautifulSoup
+from __future__ import annotations
+
 import html
-from scrapy.http import Response
+from typing import TYPE_CHECKING, List, Optional, Union
+
+from toolkit.lazy import LazyModule
 
-from typing import List, Optional, Union
+if TYPE_CHECKING:
+    from scrapy.http import HtmlResponse, Request, Response
+
+# Imported on first use, so that importing the parsers does not load Scrapy or BeautifulSoup
+bs4 = LazyModule('bs4')
+w3lib_html = LazyModule('w3lib.html')
 
 
 def text_to_html_response(text: str, url: str = "https://abc.com", encoding: str = "utf-8",
@@ -19,6 +25,8 @@ def text_to_html_response(text: str, url: str = "https://abc.com", encoding: str
 
     :returns: HTML response object.
     """
+    from scrapy.http import HtmlResponse, Request
+
     request = request or Request(url=url, meta={'url': url})
     return HtmlResponse(url=url, body=text, encoding=encoding, request=request)
 
@@ -43,9 +51,9 @@ def _clean_text_with_bs(text: str) -> str:
 
     :return: Cleaned text.
     """
-    cleaned_text = BeautifulSoup(text, 'html.parser').get_text()
+    cleaned_text = bs4.BeautifulSoup(text, 'html.parser').get_text()
     while True:
-        new_soup = BeautifulSoup(cleaned_text, 'html.parser')
+        new_soup = bs4.BeautifulSoup(cleaned_text, 'html.parser')
         if new_soup.find_all():
             cleaned_text = new_soup.get_text()
         else:
@@ -83,8 +91,8 @@ def _extract_text_with_response(response: Response, xpath: str, nav_child: bool,
 
     html_text = response.xpath(xpath).extract()
     if filtered_tags:
-        html_text = [remove_tags_with_content(text=h, which_ones=filtered_tags) for h in html_text]
-    return [remove_tags(h) for h in html_text if h]
+        html_text = [w3lib_html.remove_tags_with_content(text=h, which_ones=filtered_tags) for h in html_text]
+    return [w3lib_html.remove_tags(h) for h in html_text if h]
 
 
 def parse_text(response: Optional[Response], xpaths: Optional[List[str]] = (),
@@ -139,9 +147,9 @@ def _extract_all_text(response: Response, nav_child: bool, filtered_tags: tuple)
 
     # Filter out unwanted tags if specified
     if filtered_tags:
-        all_text = [remove_tags_with_content(text=h, which_ones=filtered_tags) for h in all_text]
+        all_text = [w3lib_html.remove_tags_with_content(text=h, which_ones=filtered_tags) for h in all_text]
 
-    return [remove_tags(h) for h in all_text if h]
+    return [w3lib_html.remove_tags(h) for h in all_text if h]
 
 
 
@@ -1,5 +1,9 @@
 from urllib.parse import urlparse
-import tldextract
+
+from toolkit.lazy import LazyModule
+
+# Imported on first use, it loads the public suffix list
+tldextract = LazyModule('tldextract')
 
 
 def parse_domain(url):
@@ -65,4 +69,47 @@ def is_about_or_contact_page(url: str) -> bool:
     :return: True if the URL suggests it's an "About Us" or "Contact Us" page, False otherwise.
     """
     # Normalize URL and extract path
-    return  is_about_page(url) or is_contact_page(url)
\ No newline at end of file
+    return  is_about_page(url) or is_contact_page(url)
+
+
+def is_low_value_page(url: str) -> bool:
+    """
+    Check if the given URL is likely a page that rarely leads to contact details,
+    such as blog posts, archives, listings, product pages or static files.
+
+    :param url: The URL to check.
+
+    :return: True if the URL suggests a low-value page, False otherwise.
+    """
+    path = urlparse(url).path.lower()
+    segments = [segment for segment in path.split('/') if segment]
+
+    # Define path segments that indicate a low-value page
+    low_value_segments = ['blog', 'blogs', 'news', 'article', 'articles', 'post', 'posts', 'tag', 'tags',
+                          'category', 'categories', 'archive', 'archives', 'author', 'page', 'feed',
+                          'product', 'products', 'shop', 'store', 'cart', 'checkout', 'login', 'wp-content',
+                          'wp-json', 'events', 'press', 'careers', 'jobs']
+
+    # Define file extensions that are never pages
+    excluded_extensions = ['.css', '.js', '.jpg', '.jpeg', '.png', '.gif', '.pdf', '.svg', '.zip', '.xml']
+
+    if any(path.endswith(ext) for ext in excluded_extensions):
+        return True
+    return any(segment in low_value_segments for segment in segments)
+
+
+def get_page_category(url: str) -> str:
+    """
+    Classify the given URL as a "contact", "about", "low" (see is_low_value_page) or "other" page.
+
+    :param url: The URL to classify.
+
+    :return: The category of the page.
+    """
+    if is_contact_page(url):
+        return 'contact'
+    if is_about_page(url):
+        return 'about'
+    if is_low_value_page(url):
+        return 'low'
+    return 'other'